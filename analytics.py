@@ -0,0 +1,105 @@
+"""Attendance analytics over the daily rollups.
+
+Each rollup row is one student's attendance in one room on one day: the
+number of sessions, total minutes, first login and last logout. The
+functions here take those rows as a DataFrame (see COLUMNS) and answer
+with grouped, vectorized pandas operations, so their cost depends on
+students x rooms x days and not on how many sessions were recorded.
+"""
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['student_id', 'room_code', 'day', 'sessions', 'minutes', 'first_login', 'last_logout']
+PERIODS = {'day': 'D', 'week': 'W', 'month': 'M'}
+
+
+def rollup_frame(rows):
+    """DataFrame of rollup rows given as (student_id, room_code, day, ...) tuples"""
+    frame = pd.DataFrame.from_records(rows, columns=COLUMNS)
+    frame['day'] = pd.to_datetime(frame['day'])
+    frame['first_login'] = pd.to_datetime(frame['first_login'])
+    frame['last_logout'] = pd.to_datetime(frame['last_logout'])
+    frame['minutes'] = frame['minutes'].astype(float)
+    return frame
+
+
+def records(frame):
+    """JSON-ready list of dicts, with dates as YYYY-MM-DD and numbers rounded"""
+    frame = frame.copy()
+    for column in frame.columns:
+        if pd.api.types.is_datetime64_any_dtype(frame[column]):
+            frame[column] = frame[column].dt.strftime('%Y-%m-%d')
+        elif pd.api.types.is_float_dtype(frame[column]):
+            frame[column] = frame[column].round(2)
+    return frame.to_dict(orient='records')
+
+
+def student_minutes(frame):
+    """Total sessions, minutes and days attended per student and room"""
+    totals = frame.groupby(['student_id', 'room_code'], as_index=False).agg(
+        days=('day', 'nunique'),
+        sessions=('sessions', 'sum'),
+        minutes=('minutes', 'sum')
+    )
+    return totals.sort_values(['room_code', 'minutes'], ascending=[True, False], ignore_index=True)
+
+
+def attendance_rates(frame, period='week'):
+    """Attendance rate per room and period.
+
+    A room's roster is every student seen in it within the data, and its class
+    days are the days anyone attended. The rate is the share of roster x class
+    days on which the student was there, as a percentage.
+    """
+    frame = frame.assign(period=frame['day'].dt.to_period(PERIODS[period]).dt.start_time)
+    roster = frame.groupby('room_code')['student_id'].nunique().rename('roster')
+    rates = frame.groupby(['room_code', 'period']).agg(
+        students=('student_id', 'nunique'),
+        class_days=('day', 'nunique'),
+        student_days=('day', 'size')
+    ).join(roster, on='room_code').reset_index()
+    rates['rate'] = 100.0 * rates['student_days'] / (rates['roster'] * rates['class_days'])
+    return rates
+
+
+def late_arrivals(frame, late_after=10):
+    """Late arrivals per student and room.
+
+    A room's class starts at the first login in it that day; a student who
+    first logged in more than late_after minutes later arrived late.
+    """
+    start = frame.groupby(['room_code', 'day'])['first_login'].transform('min')
+    minutes_late = (frame['first_login'] - start).dt.total_seconds().to_numpy() / 60.0
+    late = minutes_late > late_after
+    frame = frame.assign(late=late, minutes_late=np.where(late, minutes_late, np.nan))
+    summary = frame.groupby(['student_id', 'room_code'], as_index=False).agg(
+        days=('day', 'size'),
+        late_days=('late', 'sum'),
+        mean_minutes_late=('minutes_late', 'mean')
+    )
+    summary['late_rate'] = 100.0 * summary['late_days'] / summary['days']
+    summary['mean_minutes_late'] = summary['mean_minutes_late'].fillna(0.0)
+    return summary.sort_values(['room_code', 'late_days'], ascending=[True, False], ignore_index=True)
+
+
+def duration_distribution(frame, bins):
+    """Histogram and percentiles of minutes attended per student and day, for each room.
+
+    bins are the histogram edges in minutes; longer days fall in the last bin.
+    """
+    edges = np.asarray(bins, dtype=float)
+    distributions = []
+    for room_code, minutes in frame.groupby('room_code')['minutes']:
+        values = minutes.to_numpy()
+        counts, _ = np.histogram(np.minimum(values, edges[-1]), bins=edges)
+        p50, p90 = np.percentile(values, [50, 90])
+        distributions.append({
+            'room_code': room_code,
+            'student_days': int(len(values)),
+            'mean': round(float(values.mean()), 2),
+            'p50': round(float(p50), 2),
+            'p90': round(float(p90), 2),
+            'bins': [{'from': float(low), 'to': float(high), 'count': int(count)}
+                     for low, high, count in zip(edges[:-1], edges[1:], counts)]
+        })
+    return distributions
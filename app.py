@@ -1,44 +1,288 @@
-from flask import Flask, render_template, session, redirect, url_for, flash, request, jsonify, send_file
-import subprocess
-import re
+from flask import Flask, render_template, session, redirect, url_for, flash, request, jsonify, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
-import csv
 from datetime import datetime, timedelta
 import numpy as np
-import cv2
 import base64
 import os
-from ultralytics import YOLO
 from flask_session import Session
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from face_engine import FaceInferenceEngine
+from face_index import FaceEmbedder, FaceEmbeddingIndex, average_templates
+from face_quality import QualityGate
+from blobs import BlobStore
+from face_service import FaceServiceClient
+from preprocess import decode_data_url, decode_reduced, Letterbox
+import model_export
+from bssid import BSSIDProvider, create_backend
+from roster import RECONNECT, RosterBroadcaster, format_event
+from heartbeat import HeartbeatBuffer
+from sqlalchemy import update, insert, delete, bindparam, select, literal, and_, or_, func, text, case
+from export import stream_csv, stream_parquet
+import migrations
+from database import configure_database, bind_key, minutes_between, day_of
+from metrics import Metrics, SharedDirectory, SlowRequestProfiler
+from presence import PresenceRegistry
+from reaper import SessionReaper
+from session_store import create_session_interface
+from passwords import PasswordHasher, PasswordPoolBusy
+from pools import BoundedExecutor, PoolBusy
+import click
+import atexit
+import queue
+import threading
+import time
+import secrets
 
-# Create directory for storing face images if it doesn't exist
-os.makedirs('face_data', exist_ok=True)
+app = Flask(__name__)
 
-# Load YOLOv8 face detection model
-face_model = YOLO('yolov8n.pt')  # Ensure you have the YOLOv8 face model
+# Database backend: the per-bind SQLite files (admin.db, students.db, rooms.db)
+# by default, or a single database such as PostgreSQL when DATABASE_URL is set
+app.config['DATABASE_URL'] = os.environ.get('DATABASE_URL')
+app.config['DB_POOL_SIZE'] = 10
+app.config['DB_MAX_OVERFLOW'] = 20
+app.config['DB_POOL_TIMEOUT'] = 30  # Seconds to wait for a pooled connection
+app.config['DB_POOL_RECYCLE'] = 1800  # Seconds before a pooled connection is replaced
+app.config['SQLITE_JOURNAL_MODE'] = 'WAL'  # Readers don't block the writer
+app.config['SQLITE_SYNCHRONOUS'] = 'NORMAL'  # Safe with WAL, avoids an fsync per commit
+app.config['SQLITE_BUSY_TIMEOUT'] = 5000  # Milliseconds to wait for the write lock
+configure_database(app)
 
-app = Flask(__name__)
+app.config['SECRET_KEY'] = 'supersecretkey'
+# Session storage: 'cookie' (signed, nothing kept on the server), 'memory' (single worker only),
+# 'sql' (table with indexed expiry) or 'filesystem' (Flask-Session, one file per session)
+app.config['SESSION_BACKEND'] = os.environ.get('SESSION_BACKEND', 'cookie')
+app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=12)  # Server-side sessions expire this long after last use
+app.config['SESSION_MEMORY_MAX_ENTRIES'] = 10000
+app.config['SESSION_PURGE_INTERVAL'] = 300  # Seconds between deletes of expired 'sql' sessions
+app.config['SESSION_PURGE_BATCH_SIZE'] = 1000
 
-# Provide a default database URI (required for SQLAlchemy to work)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///default.db'
+# bcrypt cost factor for new hashes, stored hashes with another cost are rehashed on their next login
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+app.config['PASSWORD_HASH_WORKERS'] = 4  # Threads running bcrypt next to the request threads
+app.config['PASSWORD_HASH_MAX_PENDING'] = 64  # Hashes queued or running before logins are turned away
 
-# Define multiple database bindings
-app.config['SQLALCHEMY_BINDS'] = {
-    'admin_db': 'sqlite:///admin.db',
-    'student_db': 'sqlite:///students.db',
-    'room_db': 'sqlite:///rooms.db'  # New database for room management
-}
+# Student logins posted with async=1 return a job id at once, the result is polled at /login_status/<job_id>
+app.config['LOGIN_PIPELINE_WORKERS'] = 8  # Threads running the face and password checks of login jobs
+app.config['LOGIN_PIPELINE_MAX_PENDING'] = 128  # Login jobs queued or running before logins are turned away
+app.config['LOGIN_JOB_TTL'] = 300  # Seconds before a login job nobody polled is deleted
+
+# YOLOv8 face detection model, loaded on first use (or up front with PRELOAD_FACE_MODELS=1,
+# e.g. in the gunicorn master so forked workers share it copy-on-write)
+app.config['FACE_MODEL_PATH'] = 'yolov8n.pt'  # Ensure you have the YOLOv8 face model
+app.config['PRELOAD_FACE_MODELS'] = os.environ.get('PRELOAD_FACE_MODELS') == '1'
+
+# Start the background threads (BSSID refresh, heartbeat flush, presence resync, idle reaper) on
+# import. gunicorn.conf.py turns this off and starts them in each worker after fork instead
+app.config['START_BACKGROUND_SERVICES'] = os.environ.get('START_BACKGROUND_SERVICES', '1') == '1'
+
+# Detector runtime: 'pytorch', 'onnx' or 'openvino' (export first with `flask export-face-model`)
+app.config['FACE_MODEL_RUNTIME'] = os.environ.get('FACE_MODEL_RUNTIME', 'pytorch')
+app.config['FACE_MODEL_INT8'] = os.environ.get('FACE_MODEL_INT8') == '1'
+
+# Run face inference in a separate face_service.py process instead of in each web worker
+app.config['FACE_SERVICE_SOCKET'] = os.environ.get('FACE_SERVICE_SOCKET')
+
+# Face inference batching (concurrent logins are detected together)
+app.config['FACE_BATCH_MAX_SIZE'] = 16
+app.config['FACE_BATCH_MAX_WAIT'] = 0.01  # Seconds to wait for a batch to fill
+app.config['FACE_INFERENCE_WORKERS'] = 1  # Batches handed out at once, model calls themselves run one at a time
+
+# Face embeddings (cosine similarity between enrolled and captured face)
+app.config['FACE_MATCH_THRESHOLD'] = 0.5
+app.config['FACE_DETECT_SIZE'] = 640  # Model input side, large JPEGs are decoded at reduced scale down to this
+app.config['ROLL_CALL_MAX_FRAMES'] = 8  # Frames sampled from a roll call video clip
+
+# Multi-shot enrollment: the registration page sends a burst of frames, poor ones are dropped
+# and the embeddings of the rest are averaged into the enrolled template
+app.config['ENROLLMENT_BURST_SIZE'] = 5  # Frames captured by the registration page
+app.config['ENROLLMENT_MIN_FRAMES'] = 3  # Good frames needed to enroll
+app.config['FACE_MIN_SHARPNESS'] = 50.0  # Variance of the Laplacian of the 64x64 grey crop
+app.config['FACE_MIN_SYMMETRY'] = 0.85  # Left/right likeness of the crop, lower when the head is turned
+app.config['FACE_MIN_SIZE'] = 80  # Pixels, shorter side of the face box in the detector input
+
+# Enrolled face crops and embeddings, stored by content hash and referenced from the Student row
+app.config['FACE_BLOB_DIR'] = os.environ.get('FACE_BLOB_DIR', 'face_data')
+app.config['FACE_BLOB_MMAP'] = os.environ.get('FACE_BLOB_MMAP') == '1'  # Map blobs instead of reading them
+
+# BSSID lookup: 'auto', 'wext' (Linux ioctl), 'subprocess' (iwconfig/netsh) or 'stub'
+app.config['BSSID_BACKEND'] = os.environ.get('BSSID_BACKEND', 'auto')
+app.config['BSSID_CACHE_TTL'] = 10  # Seconds before a request re-reads the BSSID itself
+app.config['BSSID_REFRESH_INTERVAL'] = 2  # Seconds between background refreshes
+
+# Signed room network tokens handed out by admins to students in the room
+app.config['NETWORK_TOKEN_MAX_AGE'] = 300  # Seconds
+
+# Live roster pushed to admin dashboards
+app.config['STUDENT_INACTIVE_AFTER'] = 120  # Seconds without a heartbeat before a student is shown as inactive
+app.config['ROSTER_KEEPALIVE'] = 15  # Seconds between keepalives / inactivity checks on an idle stream
+app.config['ROSTER_SNAPSHOT_INTERVAL'] = 30  # Seconds between full snapshots, which carry other workers' changes, 0 to disable
+# Each open stream holds a worker thread, so streams end after a while and the dashboard reconnects
+app.config['ROSTER_STREAM_LIFETIME'] = 120  # Seconds, 0 for no limit
+app.config['ROSTER_RECONNECT_DELAY'] = 5  # Seconds the dashboard waits before reconnecting
+app.config['ROSTER_MAX_STREAMS'] = int(os.environ.get('ROSTER_MAX_STREAMS', 6))  # Per worker, keep below gunicorn's threads
+app.config['PRESENCE_RESYNC_INTERVAL'] = 30  # Seconds between reloads of who is in which room, 0 with a single worker
+
+# Heartbeats are buffered in memory and written to the database in batches
+app.config['HEARTBEAT_FLUSH_INTERVAL'] = 10  # Seconds, at most this much is lost on a crash
+
+# Students without a heartbeat for this long are logged out, as of their last heartbeat
+app.config['SESSION_IDLE_TIMEOUT'] = 600  # Seconds
+app.config['SESSION_REAP_INTERVAL'] = 60  # Seconds between checks, 0 disables the reaper
+app.config['SESSION_REAP_BATCH_SIZE'] = 500  # Students logged out per transaction
+
+# Attendance exports are streamed in chunks of this many rows
+app.config['EXPORT_CHUNK_SIZE'] = 1000
+
+# Attendance analytics, answered from per student, room and day rollups
+app.config['ANALYTICS_LATE_AFTER'] = 10  # Minutes after a room's first login that count as late
+app.config['ANALYTICS_DURATION_BINS'] = [0, 15, 30, 45, 60, 90, 120, 180]  # Histogram edges in minutes
+
+# Prometheus metrics at /metrics, and stack samples of slow requests for admins
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')  # Bearer token required to scrape, open if unset
+app.config['PROFILE_SLOW_REQUESTS'] = os.environ.get('PROFILE_SLOW_REQUESTS') == '1'
+app.config['SLOW_REQUEST_THRESHOLD'] = 1.0  # Seconds before a request's samples are kept
+app.config['PROFILER_INTERVAL'] = 0.005  # Seconds between stack samples
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')  # Shared by the worker processes, per process if unset
 
-app.config['SECRET_KEY'] = 'supersecretkey'
-app.config['SESSION_TYPE'] = 'filesystem'
-Session(app)
 db = SQLAlchemy(app)
 bcrypt = Bcrypt(app)
+passwords = PasswordHasher(
+    bcrypt,
+    rounds=app.config['BCRYPT_LOG_ROUNDS'],
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_pending=app.config['PASSWORD_HASH_MAX_PENDING']
+)
+login_pipeline = BoundedExecutor(
+    app.config['LOGIN_PIPELINE_WORKERS'],
+    app.config['LOGIN_PIPELINE_MAX_PENDING'],
+    name='login',
+    busy_message="Too many logins at once, please try again"
+)
+
+metrics_dir = SharedDirectory(app.config['METRICS_DIR']) if app.config['METRICS_DIR'] else None
+profiler = SlowRequestProfiler(
+    enabled=app.config['PROFILE_SLOW_REQUESTS'],
+    threshold=app.config['SLOW_REQUEST_THRESHOLD'],
+    interval=app.config['PROFILER_INTERVAL'],
+    directory=metrics_dir
+)
+metrics = Metrics(profiler, directory=metrics_dir)
+
+@app.before_request
+def start_request_timer():
+    metrics.begin_request(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+def stop_request_timer(response):
+    metrics.end_request(request.method, response.status_code)
+    return response
+
+@app.teardown_request
+def stop_failed_request_timer(exc):
+    # after_request is skipped when a view raises, this is a no-op otherwise
+    if exc is not None:
+        metrics.end_request(request.method, 500)
+
+_face_model = None
+_face_model_lock = threading.Lock()
+_face_model_call_lock = threading.Lock()  # The ultralytics predictor is not thread-safe
+
+def get_face_model():
+    """Load the YOLOv8 model (and ultralytics/torch with it) the first time it is needed"""
+    global _face_model
+    if _face_model is None:
+        with _face_model_lock:
+            if _face_model is None:
+                _face_model = model_export.load_detector(
+                    app.config['FACE_MODEL_PATH'], app.config['FACE_MODEL_RUNTIME'], app.config['FACE_MODEL_INT8']
+                )
+    return _face_model
+
+face_embedder = FaceEmbedder()
+face_service = FaceServiceClient(app.config['FACE_SERVICE_SOCKET']) if app.config['FACE_SERVICE_SOCKET'] else None
+
+def detect_faces(images):
+    """Face boxes for each image, as (N, 4) arrays of x1, y1, x2, y2"""
+    if face_service:
+        return face_service.detect(images)
+    model = get_face_model()
+    with _face_model_call_lock:
+        return [result.boxes.xyxy.cpu().numpy() for result in model(images)]
+
+def embed_faces(faces):
+    """Embeddings for a list of face crops, as an (N, dim) array"""
+    if face_service:
+        return face_service.embed(faces)
+    return face_embedder.embed(faces)
+
+face_engine = FaceInferenceEngine(
+    detect_faces,
+    max_batch_size=app.config['FACE_BATCH_MAX_SIZE'],
+    max_wait=app.config['FACE_BATCH_MAX_WAIT'],
+    workers=app.config['FACE_INFERENCE_WORKERS']
+)
+
+letterbox = Letterbox(app.config['FACE_DETECT_SIZE'])
+
+face_quality = QualityGate(
+    min_sharpness=app.config['FACE_MIN_SHARPNESS'],
+    min_symmetry=app.config['FACE_MIN_SYMMETRY'],
+    min_size=app.config['FACE_MIN_SIZE']
+)
+
+# Face embeddings go through the same batching engine as detection
+embedding_engine = FaceInferenceEngine(
+    embed_faces,
+    max_batch_size=app.config['FACE_BATCH_MAX_SIZE'],
+    max_wait=app.config['FACE_BATCH_MAX_WAIT'],
+    workers=app.config['FACE_INFERENCE_WORKERS']
+)
+
+face_blobs = BlobStore(app.config['FACE_BLOB_DIR'], use_mmap=app.config['FACE_BLOB_MMAP'])
+
+# Enrolled embeddings keyed by student_id, persisted under instance/
+face_index = FaceEmbeddingIndex(os.path.join(app.instance_path, 'face_index'))
+face_index.load()
+
+def warm_up_face_models():
+    """Load the detection and embedding models now instead of on the first request"""
+    get_face_model()
+    face_embedder.load()
+
+if app.config['PRELOAD_FACE_MODELS'] and not face_service:
+    warm_up_face_models()
+
+bssid_provider = BSSIDProvider(
+    create_backend(app.config['BSSID_BACKEND']),
+    ttl=app.config['BSSID_CACHE_TTL'],
+    refresh_interval=app.config['BSSID_REFRESH_INTERVAL']
+)
+
+network_tokens = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='room-network')
+
+roster = RosterBroadcaster(max_subscribers=app.config['ROSTER_MAX_STREAMS'])
+
+metrics.gauge('attendance_face_detect_queue_depth', 'Images waiting for face detection',
+              lambda: face_engine.stats()['queue_depth'])
+metrics.gauge('attendance_face_embed_queue_depth', 'Face crops waiting for embedding',
+              lambda: embedding_engine.stats()['queue_depth'])
+metrics.gauge('attendance_bssid_staleness_seconds', 'Age of the cached BSSID',
+              lambda: bssid_provider.staleness())
+metrics.gauge('attendance_password_hashes_pending', 'bcrypt hashes queued or running',
+              lambda: passwords.stats()['pending'])
+metrics.gauge('attendance_password_hashes_rejected', 'Logins turned away because the bcrypt pool was full',
+              lambda: passwords.stats()['rejected'])
+metrics.gauge('attendance_login_jobs_pending', 'Login jobs queued or running',
+              lambda: login_pipeline.stats()['pending'])
+metrics.gauge('attendance_reaper_sessions_closed', 'Idle sessions logged out by the reaper',
+              lambda: reaper.stats()['sessions_closed'])
+metrics.gauge('attendance_reaper_last_run_seconds', 'Duration of the last reaper run',
+              lambda: reaper.stats()['last_duration'])
 
 # Admin Table (Stored in admin.db)
 class Admin(db.Model):
-    __bind_key__ = 'admin_db'
+    __bind_key__ = bind_key('admin_db')
     id = db.Column(db.Integer, primary_key=True)
     idname = db.Column(db.String(50), nullable=False, unique=True)
     username = db.Column(db.String(50), nullable=False, unique=True)
@@ -48,7 +292,7 @@ class Admin(db.Model):
 
 # Room Table (Stored in room_db)
 class Room(db.Model):
-    __bind_key__ = 'room_db'
+    __bind_key__ = bind_key('room_db')
     id = db.Column(db.Integer, primary_key=True)
     room_code = db.Column(db.String(50), nullable=False, unique=True)
     admin_id = db.Column(db.Integer, nullable=False)  # ID of admin who created the room
@@ -56,22 +300,35 @@ class Room(db.Model):
     active = db.Column(db.Boolean, default=True)
     bssid = db.Column(db.String(100))  # Store the BSSID when room was created
 
-# Update the Student model with face_encoding field and room info
+    __table_args__ = (
+        db.Index('ix_room_admin', 'admin_id'),
+    )
+
+# Student accounts with their enrolled face and room info
 class Student(db.Model):
-    __bind_key__ = 'student_db'
+    __bind_key__ = bind_key('student_db')
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.String(50), nullable=False, unique=True)
     username = db.Column(db.String(50), nullable=False, unique=True)
     password = db.Column(db.String(100), nullable=False)
-    face_encoding = db.Column(db.Text)  # Store face encoding as base64 string
+    face_hash = db.Column(db.String(64))  # Face crop JPEG in face_blobs
+    embedding_hash = db.Column(db.String(64))  # Face embedding (.npy) in face_blobs
+    # Base64 JPEG from before face_blobs, emptied by `flask migrate-face-blobs`. Deferred so
+    # ordinary student queries never read it
+    face_encoding = db.deferred(db.Column(db.Text))
     current_room = db.Column(db.String(50))  # Store current room code
     
     is_logged_in = db.Column(db.Boolean, default=False)
     login_time = db.Column(db.DateTime)
     last_active_time = db.Column(db.DateTime)
 
+    __table_args__ = (
+        db.Index('ix_student_logged_in_room', 'is_logged_in', 'current_room'),
+        db.Index('ix_student_logged_in_active', 'is_logged_in', 'last_active_time'),
+    )
+
 class AttendanceRecord(db.Model):
-    __bind_key__ = 'student_db'
+    __bind_key__ = bind_key('student_db')
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.String(50), db.ForeignKey('student.student_id'))
     room_code = db.Column(db.String(50))  # Added room code to attendance record
@@ -79,99 +336,780 @@ class AttendanceRecord(db.Model):
     logout_time = db.Column(db.DateTime)
     active_duration = db.Column(db.Float)  # Duration in minutes
 
-# Create database tables
+    __table_args__ = (
+        db.Index('ix_attendance_student_login', 'student_id', 'login_time'),
+        db.Index('ix_attendance_room_login', 'room_code', 'login_time'),
+        db.Index('ix_attendance_login', 'login_time'),
+    )
+
+# Attendance per student, room and day, updated whenever attendance records are written
+class AttendanceRollup(db.Model):
+    __bind_key__ = bind_key('student_db')
+    student_id = db.Column(db.String(50), primary_key=True)
+    room_code = db.Column(db.String(50), primary_key=True)  # '' for records without a room
+    day = db.Column(db.Date, primary_key=True)  # Day of the login
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    minutes = db.Column(db.Float, nullable=False, default=0.0)
+    first_login = db.Column(db.DateTime)
+    last_logout = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_rollup_room_day', 'room_code', 'day'),
+        db.Index('ix_rollup_day', 'day'),
+    )
+
+# Outcome of a student login running in the background, polled by the browser
+class LoginJob(db.Model):
+    __bind_key__ = bind_key('student_db')
+    id = db.Column(db.String(32), primary_key=True)
+    student_pk = db.Column(db.Integer, nullable=False)
+    room_code = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending, success or failed
+    message = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_login_job_created', 'created_at'),
+    )
+
+# Server-side sessions for SESSION_BACKEND = 'sql' (in the default database)
+class WebSession(db.Model):
+    __tablename__ = 'web_session'
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_web_session_expires', 'expires_at'),
+    )
+
+if app.config['SESSION_BACKEND'] == 'filesystem':
+    app.config['SESSION_TYPE'] = 'filesystem'
+    Session(app)
+else:
+    app.session_interface = create_session_interface(
+        app.config['SESSION_BACKEND'],
+        engine_fn=lambda: db.engine,
+        table=WebSession.__table__,
+        max_entries=app.config['SESSION_MEMORY_MAX_ENTRIES'],
+        purge_interval=app.config['SESSION_PURGE_INTERVAL'],
+        purge_batch_size=app.config['SESSION_PURGE_BATCH_SIZE']
+    )
+
+# Create database tables and bring existing ones up to date
 with app.app_context():
     db.create_all()
+    migrations.upgrade(db)
+
+@app.cli.command('db-upgrade')
+def db_upgrade():
+    """Apply pending schema migrations"""
+    applied = migrations.upgrade(db)
+    click.echo(f"Applied: {', '.join(applied)}" if applied else "Database is up to date")
+
+@app.cli.command('export-face-model')
+@click.option('--runtime', type=click.Choice(model_export.RUNTIMES[1:]), default=lambda: app.config['FACE_MODEL_RUNTIME'])
+@click.option('--int8', is_flag=True, help="Quantize to int8, calibrated on enrolled face crops")
+@click.option('--calibration-size', default=200, help="Number of enrolled faces to calibrate on")
+def export_face_model(runtime, int8, calibration_size):
+    """Export the face detector to ONNX Runtime or OpenVINO"""
+    calibration_images = []
+    if int8:
+        import cv2
+        students = Student.query.filter(Student.face_hash.isnot(None)).limit(calibration_size).all()
+        for student in students:
+            stored_face_arr = np.frombuffer(face_blobs.get(student.face_hash), np.uint8)
+            calibration_images.append(cv2.imdecode(stored_face_arr, cv2.IMREAD_COLOR))
+        click.echo(f"Calibrating on {len(calibration_images)} enrolled faces")
+
+    path = model_export.export_model(
+        app.config['FACE_MODEL_PATH'], runtime, int8=int8,
+        calibration_images=calibration_images, imgsz=app.config['FACE_DETECT_SIZE']
+    )
+    click.echo(f"Exported {path}, use it with FACE_MODEL_RUNTIME={runtime}" + (" FACE_MODEL_INT8=1" if int8 else ""))
+
+@app.cli.command('migrate-face-blobs')
+@click.option('--batch-size', default=500, help="Students converted per transaction")
+@click.option('--vacuum', is_flag=True, help="Reclaim the freed space afterwards (SQLite)")
+def migrate_face_blobs(batch_size, vacuum):
+    """Move base64 face images out of the student table into the face blob store"""
+    migrated = 0
+    while True:
+        students = (
+            Student.query.options(db.undefer(Student.face_encoding))
+            .filter(Student.face_encoding.isnot(None))
+            .order_by(Student.id).limit(batch_size).all()
+        )
+        for student in students:
+            student.face_hash = face_blobs.put(base64.b64decode(student.face_encoding))
+            embedding = face_index.get(student.student_id)
+            if embedding is not None and not student.embedding_hash:
+                student.embedding_hash = face_blobs.put_array(embedding)
+            student.face_encoding = None
+        db.session.commit()
+        migrated += len(students)
+        if len(students) < batch_size:
+            break
+    click.echo(f"Moved {migrated} face images to {face_blobs.root}")
+
+    if vacuum:
+        engine = db.get_engine(bind_key=bind_key('student_db'))
+        if engine.dialect.name == 'sqlite':
+            with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                connection.execute(text('VACUUM'))
+            click.echo("Vacuumed the student database")
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups():
+    """Recompute the attendance rollups from every attendance record"""
+    db.session.execute(delete(AttendanceRollup.__table__), bind_arguments={'mapper': AttendanceRollup})
+    add_to_rollups(rollups_from_records(literal(True)))
+    db.session.commit()
+    count = db.session.execute(select(func.count()).select_from(AttendanceRollup.__table__),
+                               bind_arguments={'mapper': AttendanceRollup}).scalar()
+    click.echo(f"Rebuilt {count} rollup rows")
+
+@app.cli.command('bcrypt-rounds')
+@click.option('--target-ms', default=250, help="Longest acceptable time for one hash")
+def bcrypt_rounds(target_ms):
+    """Time bcrypt at each cost factor on this machine and suggest BCRYPT_LOG_ROUNDS"""
+    suggested = None
+    for rounds in range(10, 16):
+        start = time.perf_counter()
+        bcrypt.generate_password_hash('benchmark-password', rounds)
+        elapsed = (time.perf_counter() - start) * 1000
+        click.echo(f"{rounds} rounds: {elapsed:.0f} ms")
+        if elapsed <= target_ms:
+            suggested = rounds
+        else:
+            break
+    click.echo(f"Suggested BCRYPT_LOG_ROUNDS={suggested or 10} (configured: {app.config['BCRYPT_LOG_ROUNDS']})")
+
+@app.cli.command('check-query-plans')
+def check_query_plans():
+    """Fail if any hot query needs a full table scan"""
+    failures = migrations.unindexed_queries(db)
+    for description, plan in failures:
+        click.echo(f"Full table scan in {description}: {'; '.join(plan)}")
+    if failures:
+        raise SystemExit(1)
+    click.echo(f"All {len(migrations.HOT_QUERIES)} hot queries use an index")
+
+def flush_heartbeats(last_seen):
+    """Write buffered heartbeats with a single batched UPDATE"""
+    student_table = Student.__table__
+    statement = (
+        update(student_table)
+        .where(student_table.c.id == bindparam('student_pk'), student_table.c.is_logged_in == True)
+        .values(last_active_time=bindparam('seen'))
+    )
+    with app.app_context():
+        db.session.execute(statement, [{'student_pk': pk, 'seen': seen} for pk, seen in last_seen.items()])
+        db.session.commit()
+
+heartbeats = HeartbeatBuffer(flush_heartbeats, interval=app.config['HEARTBEAT_FLUSH_INTERVAL'])
+atexit.register(heartbeats.stop)
+
+def load_presence():
+    """Rooms and logged-in students as stored in the database, for the presence registry"""
+    with app.app_context():
+        rooms = db.session.execute(select(Room.room_code, Room.admin_id)).all()
+        students = db.session.execute(
+            select(Student.id, Student.current_room, Student.student_id, Student.username,
+                   Student.login_time, Student.last_active_time)
+            .where(Student.is_logged_in == True)
+        ).all()
+    return rooms, [
+        {'pk': pk, 'room': room_code, 'student_id': student_id, 'username': username,
+         'login_time': login_time, 'last_seen': heartbeats.last_seen(pk, last_seen)}
+        for pk, room_code, student_id, username, login_time, last_seen in students
+    ]
+
+presence = PresenceRegistry(load_presence, resync_interval=app.config['PRESENCE_RESYNC_INTERVAL'])
+presence.rebuild()
+
+def is_inactive(student):
+    """No heartbeat (buffered or stored) within STUDENT_INACTIVE_AFTER seconds"""
+    last_active = heartbeats.last_seen(student.id, student.last_active_time)
+    return bool(last_active and (datetime.now() - last_active).total_seconds() > app.config['STUDENT_INACTIVE_AFTER'])
+
+def present_students(admin_id):
+    """Students logged into the admin's rooms, from the presence registry"""
+    now = datetime.now()
+    inactive_after = app.config['STUDENT_INACTIVE_AFTER']
+    students = []
+    for entry in presence.students(presence.room_codes(admin_id)):
+        # Calculate active time
+        if entry['login_time']:
+            hours, remainder = divmod((now - entry['login_time']).seconds, 3600)
+            minutes, seconds = divmod(remainder, 60)
+            active_time = f"{hours:02}:{minutes:02}:{seconds:02}"
+        else:
+            active_time = "00:00:00"
+
+        last_seen = entry['last_seen']
+        students.append({
+            'student_id': entry['student_id'],
+            'username': entry['username'],
+            'status': "Inactive" if last_seen and (now - last_seen).total_seconds() > inactive_after else "Active",
+            'active_time': active_time,
+            'room': entry['room'],
+            'login_time': entry['login_time'],
+            'last_seen': last_seen
+        })
+    return students
+
+def end_sessions(condition, logout_time=None):
+    """Log out every logged-in student matching condition, set-based.
+
+    The matching rows are claimed first with SELECT ... FOR UPDATE, so of two
+    overlapping callers (the reaper, close_room, a logout) only one ends each
+    session; the other waits for it and then no longer finds the student
+    logged in. One INSERT ... SELECT then writes the claimed students'
+    attendance records, one upsert adds them to the daily rollups and one
+    UPDATE resets them, however many students match. logout_time is a column
+    expression (e.g. the last heartbeat) or now if not given. The caller
+    commits and then calls sessions_ended() with the returned
+    (pk, student_id, room_code) tuples.
+    """
+    now = datetime.now()
+    student = Student.__table__
+    record = AttendanceRecord.__table__
+    if logout_time is None:
+        logout_time = literal(now, db.DateTime)
+    # Logins committed after this started are left alone
+    matching = and_(
+        student.c.is_logged_in == True,
+        condition,
+        or_(student.c.login_time == None, student.c.login_time <= now)
+    )
+    bind = {'mapper': Student}
+
+    # Locked until the caller commits (SQLite has no FOR UPDATE, its writers are serialized anyway)
+    ended = db.session.execute(
+        select(student.c.id, student.c.student_id, student.c.current_room).where(matching).with_for_update(),
+        bind_arguments=bind
+    ).all()
+    if not ended:
+        return []
+    claimed = and_(matching, student.c.id.in_([pk for pk, _, _ in ended]))
 
-# Function to get connected WiFi BSSID
+    db.session.execute(
+        insert(record).from_select(
+            ['student_id', 'room_code', 'login_time', 'logout_time', 'active_duration'],
+            select(student.c.student_id, student.c.current_room, student.c.login_time, logout_time,
+                   minutes_between(student.c.login_time, logout_time))
+            .where(claimed, student.c.login_time != None)
+        ),
+        bind_arguments=bind
+    )
+    add_to_rollups(
+        select(student.c.student_id, func.coalesce(student.c.current_room, ''), day_of(student.c.login_time),
+               literal(1, db.Integer), minutes_between(student.c.login_time, logout_time),
+               student.c.login_time, logout_time)
+        .where(claimed, student.c.login_time != None)
+    )
+    db.session.execute(
+        update(student).where(claimed).values(is_logged_in=False, current_room=None, login_time=None, last_active_time=None),
+        bind_arguments=bind
+    )
+    return [tuple(row) for row in ended]
+
+def rollups_from_records(condition):
+    """Select the attendance records matching condition summed up per student, room and day"""
+    record = AttendanceRecord.__table__.c
+    room_code = func.coalesce(record.room_code, '')
+    day = day_of(record.login_time)
+    return (
+        select(record.student_id, room_code, day, func.count(), func.coalesce(func.sum(record.active_duration), 0.0),
+               func.min(record.login_time), func.max(record.logout_time))
+        .where(condition, record.login_time != None)
+        .group_by(record.student_id, room_code, day)
+    )
+
+def add_to_rollups(rows):
+    """Add rows of (student_id, room_code, day, sessions, minutes, first_login, last_logout) to the rollups"""
+    rollup = AttendanceRollup.__table__
+    bind = {'mapper': AttendanceRollup}
+    dialect = db.session.get_bind(**bind).dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        statement = upsert(rollup).from_select([column.name for column in rollup.columns], rows)
+        excluded = statement.excluded
+        statement = statement.on_conflict_do_update(
+            index_elements=['student_id', 'room_code', 'day'],
+            set_={
+                'sessions': rollup.c.sessions + excluded.sessions,
+                'minutes': rollup.c.minutes + excluded.minutes,
+                'first_login': case((excluded.first_login < rollup.c.first_login, excluded.first_login),
+                                    else_=rollup.c.first_login),
+                'last_logout': case((excluded.last_logout > rollup.c.last_logout, excluded.last_logout),
+                                    else_=rollup.c.last_logout)
+            }
+        )
+        db.session.execute(statement, bind_arguments=bind)
+        return
+
+    # No INSERT ... ON CONFLICT: merge the rows one by one
+    for student_id, room_code, day, sessions, minutes, first_login, last_logout in db.session.execute(rows, bind_arguments=bind).all():
+        existing = db.session.get(AttendanceRollup, (student_id, room_code, day))
+        if existing is None:
+            db.session.add(AttendanceRollup(student_id=student_id, room_code=room_code, day=day, sessions=sessions,
+                                            minutes=minutes, first_login=first_login, last_logout=last_logout))
+        else:
+            existing.sessions += sessions
+            existing.minutes += minutes
+            existing.first_login = min(existing.first_login, first_login)
+            existing.last_logout = max(existing.last_logout, last_logout)
+    db.session.flush()
+
+def sessions_ended(ended, publish=True):
+    """Drop committed logouts from the in-memory state, announcing them unless the whole room closed"""
+    for pk, student_id, room_code in ended:
+        heartbeats.discard(pk)
+        presence.leave(pk)
+        if publish and room_code:
+            roster.publish('left', room_code, student_id=student_id)
+
+def close_rooms(room_codes):
+    """Close rooms, logging out everyone in them, returns how many students were logged out"""
+    room_codes = list(room_codes)
+    if not room_codes:
+        return 0
+
+    ended = end_sessions(Student.__table__.c.current_room.in_(room_codes))
+    db.session.execute(delete(Room.__table__).where(Room.__table__.c.room_code.in_(room_codes)),
+                       bind_arguments={'mapper': Room})
+    db.session.commit()
+
+    sessions_ended(ended, publish=False)
+    for room_code in room_codes:
+        presence.remove_room(room_code)
+        roster.publish('room_closed', room_code)
+    return len(ended)
+
+def reap_idle_sessions():
+    """Log out students without a heartbeat for SESSION_IDLE_TIMEOUT seconds, returns the batch sizes.
+
+    Abandoned login jobs are deleted on the same schedule.
+    """
+    # This worker's buffered heartbeats must reach the database before it decides who is idle
+    heartbeats.flush()
+
+    student = Student.__table__
+    cutoff = datetime.now() - timedelta(seconds=app.config['SESSION_IDLE_TIMEOUT'])
+    batch_size = app.config['SESSION_REAP_BATCH_SIZE']
+    stale = and_(
+        student.c.is_logged_in == True,
+        or_(student.c.last_active_time < cutoff, and_(student.c.last_active_time == None, student.c.login_time < cutoff))
+    )
+
+    batches = []
+    with app.app_context():
+        while True:
+            pks = db.session.execute(
+                select(student.c.id).where(stale).order_by(student.c.last_active_time).limit(batch_size),
+                bind_arguments={'mapper': Student}
+            ).scalars().all()
+            if not pks:
+                break
+
+            # Their session ended with their last heartbeat, not when the reaper noticed
+            ended = end_sessions(
+                and_(student.c.id.in_(pks), stale),
+                logout_time=func.coalesce(student.c.last_active_time, student.c.login_time)
+            )
+            db.session.commit()
+            sessions_ended(ended)
+
+            if not ended:
+                break
+            batches.append(len(ended))
+            if len(pks) < batch_size:
+                break
+
+        # Login jobs whose result the browser never collected
+        expired = datetime.now() - timedelta(seconds=app.config['LOGIN_JOB_TTL'])
+        db.session.execute(delete(LoginJob.__table__).where(LoginJob.__table__.c.created_at < expired),
+                           bind_arguments={'mapper': LoginJob})
+        db.session.commit()
+    return batches
+
+# One worker reaps, the others only take over if it exits
+reaper = SessionReaper(reap_idle_sessions, interval=app.config['SESSION_REAP_INTERVAL'],
+                       lock_path=os.path.join(app.instance_path, 'reaper.lock'))
+atexit.register(reaper.stop)
+
+def start_background_services():
+    """Start this process's BSSID refresher, heartbeat flusher, presence resync and idle reaper"""
+    bssid_provider.start()
+    heartbeats.start()
+    presence.start()
+    reaper.start()
+
+def after_fork():
+    """Prepare a worker forked from a master that imported the app (gunicorn.conf.py post_fork)"""
+    # Pooled connections opened by the master stay with the master, the worker opens its own
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    # Workers forked later (after a restart) would otherwise start from the master's old snapshot
+    presence.rebuild()
+    start_background_services()
+
+if app.config['START_BACKGROUND_SERVICES']:
+    start_background_services()
+
+# Function to get connected WiFi BSSID (cached, refreshed in the background)
 def get_wifi_bssid():
+    with metrics.stage('bssid'):
+        return bssid_provider.get()
+
+def normalize_bssid(bssid):
+    return (bssid or '').strip().upper().replace('-', ':')
+
+def issue_network_token(room_code):
+    """Sign a short-lived token for a room, handed out by its admin to the students in it"""
+    return network_tokens.dumps({'room': room_code})
+
+def verify_network_token(token, room_code):
+    """Check a room network token, returns (verified, message).
+
+    A valid, unexpired token for the room is the proof of presence on its
+    own. Only the signature and payload are checked, so this needs no
+    database lookup and no subprocess and works the same on any app server.
+    The token carries nothing but the room code, so it does not reveal the
+    room's BSSID.
+    """
     try:
-        import platform
-        system = platform.system()
+        payload = network_tokens.loads(token, max_age=app.config['NETWORK_TOKEN_MAX_AGE'])
+    except SignatureExpired:
+        return False, "Network token has expired, ask your instructor for a new one"
+    except BadSignature:
+        return False, "Invalid network token"
 
-        if system == "Windows":
-            result = subprocess.run(["netsh", "wlan", "show", "interfaces"], capture_output=True, text=True)
-            match = re.search(r'BSSID\s*:\s*([0-9A-Fa-f:-]+)', result.stdout)
-        else:  # Linux / macOS
-            result = subprocess.run(["iwconfig"], capture_output=True, text=True)
-            match = re.search(r'Access Point: ([0-9A-Fa-f:]+)', result.stdout)
+    if payload.get('room') != room_code:
+        return False, "Network token is for a different room"
 
-        return match.group(1) if match else "BSSID not found"
-    except Exception as e:
-        return str(e)
+    return True, "Network verified"
+
+def decode_image(image_data):
+    """Decode a base64 data URL from the webcam into a BGR image, no larger than needed for detection"""
+    with metrics.stage('base64_decode'):
+        data = decode_data_url(image_data)
+    with metrics.stage('image_decode'):
+        return decode_reduced(data, app.config['FACE_DETECT_SIZE'])
 
 def process_face_image(image_data):
-    """Process base64 image data and extract face encoding using YOLOv8"""
+    """Detect the face in base64 image data, returns (face crop JPEG bytes, embedding, message)"""
+    import cv2
     try:
-        # Decode base64 image
-        image_data = image_data.split(',')[1]
-        image_bytes = base64.b64decode(image_data)
-        np_arr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        # Faces are cropped from the letterboxed model input, so box coordinates apply directly
+        img = decode_image(image_data)
+        with metrics.stage('letterbox'):
+            img, _ = letterbox(img)
         
         # Detect faces using YOLOv8
-        results = face_model(img)
+        with metrics.stage('face_detect'):
+            boxes = face_engine.detect(img)
         
-        if len(results[0].boxes) == 0:
-            return None, "No face detected"
+        if len(boxes) == 0:
+            return None, None, "No face detected"
         
-        if len(results[0].boxes) > 1:
-            return None, "Multiple faces detected"
+        if len(boxes) > 1:
+            return None, None, "Multiple faces detected"
         
         # Extract the face region
-        x1, y1, x2, y2 = results[0].boxes.xyxy[0].tolist()
+        x1, y1, x2, y2 = boxes[0].tolist()
         face_img = img[int(y1):int(y2), int(x1):int(x2)]
+        with metrics.stage('face_embed'):
+            embedding = embedding_engine.detect(face_img)
         
-        # Resize to standard size
-        face_img = cv2.resize(face_img, (100, 100))
-        
-        # Encode the face image to base64 for storage
-        _, buffer = cv2.imencode('.jpg', face_img)
-        face_encoded = base64.b64encode(buffer).decode('utf-8')
+        # Resize to standard size and encode for storage
+        with metrics.stage('face_encode'):
+            face_img = cv2.resize(face_img, (100, 100))
+            _, buffer = cv2.imencode('.jpg', face_img)
         
-        return face_encoded, "Success"
+        return buffer.tobytes(), embedding, "Success"
+    except Exception as e:
+        return None, None, str(e)
+
+def process_face_burst(frames_data):
+    """Enroll from a burst of frames, returns (face crop JPEG bytes, (K, dim) templates, message).
+
+    All frames go through the inference engine together, so they are detected
+    as one batch, and their crops are scored together.
+    Frames without exactly one good quality face are dropped, the sharpest
+    remaining crop is kept as the face image.
+    """
+    import cv2
+    try:
+        frames = []
+        for image_data in frames_data:
+            img = decode_image(image_data)
+            with metrics.stage('letterbox'):
+                frames.append(letterbox(img)[0].copy())  # The letterbox canvas is reused
+
+        with metrics.stage('face_detect'):
+            frame_boxes = face_engine.detect_many(frames)
+
+        crops, boxes = [], []
+        for frame, found in zip(frames, frame_boxes):
+            if len(found) != 1:
+                continue
+            x1, y1, x2, y2 = found[0].tolist()
+            crop = frame[int(y1):int(y2), int(x1):int(x2)]
+            if crop.size:
+                crops.append(crop)
+                boxes.append(found[0])
+        if not crops:
+            return None, None, "No single face detected in any frame"
+
+        with metrics.stage('face_quality'):
+            scores = face_quality.score(crops, boxes)
+            accepted, reasons = face_quality.check(scores)
+        good = np.flatnonzero(accepted)
+        if len(good) < app.config['ENROLLMENT_MIN_FRAMES']:
+            reason = max(set(filter(None, reasons)), key=reasons.count, default='no single face')
+            return None, None, (f"Only {len(good)} of {len(frames_data)} frames were usable ({reason}), "
+                                "please face the camera in good light and try again")
+
+        with metrics.stage('face_embed'):
+            templates = np.stack(embedding_engine.detect_many([crops[i] for i in good]))
+
+        best = good[np.argmax(scores['sharpness'][good])]
+        with metrics.stage('face_encode'):
+            _, buffer = cv2.imencode('.jpg', cv2.resize(crops[best], (100, 100)))
+
+        return buffer.tobytes(), templates, f"Enrolled from {len(good)} frames"
     except Exception as e:
-        return None, str(e)
+        return None, None, str(e)
+
+def get_face_embedding(student_id):
+    """Look up a student's enrolled embedding, building it from the stored face if needed"""
+    embedding = face_index.get(student_id)
+    if embedding is not None:
+        return embedding
+
+    # Another worker may have enrolled the student since we loaded the index
+    face_index.refresh()
+    embedding = face_index.get(student_id)
+    if embedding is not None:
+        return embedding
+
+    student = Student.query.filter_by(student_id=student_id).first()
+    if not student:
+        return None
+    if student.embedding_hash:
+        templates = face_blobs.get_array(student.embedding_hash)
+        if templates is not None:
+            face_index.add(student_id, average_templates(templates))
+            return face_index.get(student_id)
+
+    # Students enrolled before embeddings existed only have the stored JPEG crop,
+    # in the blob store or, before `flask migrate-face-blobs`, in the row itself
+    if student.face_hash:
+        stored_face_bytes = face_blobs.get(student.face_hash)
+    elif student.face_encoding:
+        stored_face_bytes = base64.b64decode(student.face_encoding)
+    else:
+        return None
+
+    import cv2
+    stored_face_arr = np.frombuffer(stored_face_bytes, np.uint8)
+    stored_face_img = cv2.imdecode(stored_face_arr, cv2.IMREAD_COLOR)
+    embedding = embedding_engine.detect(stored_face_img)
+    face_index.add(student_id, embedding)
+    return embedding
+
+def sync_face_index():
+    """Bring the face index up to date with every enrolled student.
+
+    Picks up what other workers added to the index, then adds the stored
+    embeddings of students who are still missing from it, e.g. after the
+    index files were lost. Students enrolled before embeddings existed are
+    added by get_face_embedding on their next login.
+    """
+    face_index.refresh()
+    enrolled = db.session.execute(
+        select(Student.student_id, Student.embedding_hash).where(Student.embedding_hash.is_not(None)),
+        bind_arguments={'mapper': Student}
+    ).all()
+    missing_ids, embeddings = [], []
+    for student_id, embedding_hash in enrolled:
+        if student_id in face_index:
+            continue
+        templates = face_blobs.get_array(embedding_hash)
+        if templates is not None:
+            missing_ids.append(student_id)
+            embeddings.append(average_templates(templates))
+    if missing_ids:
+        face_index.add_many(missing_ids, np.stack(embeddings))
 
 def verify_face(student_id, image_data):
-    """Verify if the captured face matches the stored face using YOLOv8"""
+    """Verify if the captured face matches the student's enrolled face embedding"""
     try:
-        # Get student by student_id
-        student = Student.query.filter_by(student_id=student_id).first()
-        if not student or not student.face_encoding:
+        with metrics.stage('enrolled_embedding'):
+            enrolled = get_face_embedding(student_id)
+        if enrolled is None:
             return False, "Student not found or no face data"
 
         # Process submitted image
-        image_data = image_data.split(',')[1]
-        image_bytes = base64.b64decode(image_data)
-        np_arr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        img = decode_image(image_data)
+        with metrics.stage('letterbox'):
+            img, _ = letterbox(img)
 
         # Detect face using YOLOv8
-        results = face_model(img)
-        if len(results[0].boxes) != 1:
+        with metrics.stage('face_detect'):
+            boxes = face_engine.detect(img)
+        if len(boxes) != 1:
             return False, "No or multiple faces detected"
 
         # Extract the face region
-        x1, y1, x2, y2 = results[0].boxes.xyxy[0].tolist()
+        x1, y1, x2, y2 = boxes[0].tolist()
         face_img = img[int(y1):int(y2), int(x1):int(x2)]
-        face_img = cv2.resize(face_img, (100, 100))
-
-        # Compare with stored face
-        stored_face_bytes = base64.b64decode(student.face_encoding)
-        stored_face_arr = np.frombuffer(stored_face_bytes, np.uint8)
-        stored_face_img = cv2.imdecode(stored_face_arr, cv2.IMREAD_COLOR)
 
-        # Simple comparison using Mean Squared Error (MSE)
-        mse = np.mean((face_img - stored_face_img) ** 2)
-        if mse < 1000:  # Adjust threshold as needed
+        # Compare with enrolled embedding using cosine similarity
+        with metrics.stage('face_embed'):
+            embedding = embedding_engine.detect(face_img)
+        similarity = face_index.similarity(student_id, embedding)
+        if similarity >= app.config['FACE_MATCH_THRESHOLD']:
             return True, "Face verified"
         else:
-            return False, f"Verification failed (MSE: {mse})"
+            return False, f"Verification failed (similarity: {similarity:.2f})"
 
     except Exception as e:
         return False, str(e)
 
+def check_login_request(username, room_code, network_token):
+    """The cheap login checks (student, room, network), returns (student, error message)"""
+    with metrics.stage('db_query'):
+        student = Student.query.filter_by(username=username).first()
+    if not student:
+        return None, "Invalid username or password"
+
+    # Verify room code exists and is active
+    room = Room.query.filter_by(room_code=room_code, active=True).first()
+    if not room:
+        return None, "Invalid or inactive room code"
+
+    # Verify the student is on the room's network: a signed room token is enough, without
+    # one the server must itself be on the room's network. A BSSID reported by the
+    # client is never trusted.
+    if network_token:
+        with metrics.stage('network_token'):
+            network_verified, message = verify_network_token(network_token, room_code)
+        if not network_verified:
+            return None, message
+    elif normalize_bssid(get_wifi_bssid()) != normalize_bssid(room.bssid):
+        return None, "You must be connected to the same network as the admin who created this room"
+
+    return student, None
+
+def verify_credentials(student, password, face_image, password_known=False):
+    """The expensive login checks, returns (verified, message, needs_rehash).
+
+    The password is checked on the bcrypt pool while the face is verified in
+    this thread, so this takes as long as the slower of the two. With
+    password_known (the session is already the student's) only the face is
+    checked.
+    """
+    password_check = None if password_known else passwords.verify_async(student.password, password)
+
+    with metrics.stage('verify_face'):
+        face_verified, message = verify_face(student.student_id, face_image)
+
+    needs_rehash = False
+    if password_check is not None:
+        with metrics.stage('password_check'):
+            password_ok, needs_rehash = password_check.result()
+        if not password_ok:
+            return False, "Invalid username or password", False
+    if not face_verified:
+        return False, f"Face verification failed: {message}", False
+    return True, "Login successful", needs_rehash
+
+def session_authenticates(key, user):
+    """Whether this request's (signed) session is already logged in as user.
+
+    Its password was verified when the session was created, so logging in
+    again, e.g. into another room, skips the bcrypt check.
+    """
+    return user is not None and session.get(key) == user.id
+
+def complete_login(student, room_code, password, needs_rehash):
+    """Mark a verified student as logged into room_code, commit and announce it"""
+    ended = []
+    if student.is_logged_in:
+        # Still logged into a room (e.g. moving to another one): that session ends first, with its record
+        ended = end_sessions(Student.__table__.c.id == student.id)
+        db.session.expire(student)
+
+    if needs_rehash:
+        upgrade_password_hash(student, password)
+
+    # Set login info
+    student.is_logged_in = True
+    student.login_time = datetime.now()
+    student.last_active_time = datetime.now()
+    student.current_room = room_code
+
+    with metrics.stage('db_commit'):
+        db.session.commit()
+
+    sessions_ended(ended)
+    presence.join(room_code, student.id, student.student_id, student.username, student.login_time)
+    roster.publish('joined', room_code, **roster_entry(student))
+
+def start_student_session(student, room_code):
+    session['student_id'] = student.id
+    session['student_username'] = student.username
+    session['student_number'] = student.student_id
+    session['current_room'] = room_code
+
+def run_login_job(job_id, student_pk, room_code, password, face_image, password_known=False):
+    """Verify a login in the background and record the outcome for /login_status"""
+    metrics.begin_request('login_job')
+    status = 'failed'
+    with app.app_context():
+        try:
+            student = db.session.get(Student, student_pk)
+            try:
+                verified, message, needs_rehash = verify_credentials(student, password, face_image, password_known)
+            except PasswordPoolBusy as e:
+                verified, message, needs_rehash = False, str(e), False
+
+            job = db.session.get(LoginJob, job_id)
+            status = 'success' if verified else 'failed'
+            job.status, job.message = status, message
+            if verified:
+                complete_login(student, room_code, password, needs_rehash)  # Commits the job too
+            else:
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            db.session.execute(
+                update(LoginJob.__table__).where(LoginJob.__table__.c.id == job_id)
+                .values(status='failed', message="Login failed, please try again"),
+                bind_arguments={'mapper': LoginJob}
+            )
+            db.session.commit()
+            raise
+        finally:
+            metrics.end_request('JOB', status)
+
+def upgrade_password_hash(user, password):
+    """Rehash a just-verified password at the current cost factor, committed with the login"""
+    try:
+        user.password = passwords.rehash(password)
+    except PasswordPoolBusy:
+        pass  # Upgraded on a later login
+
 # Main index route
 @app.route('/')
 def index():
@@ -197,7 +1135,11 @@ def register_admin():
             flash("Username already exists")
             return redirect(url_for('register_admin'))
             
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        try:
+            hashed_password = passwords.hash(password)
+        except PasswordPoolBusy as e:
+            flash(str(e))
+            return redirect(url_for('register_admin'))
         new_admin = Admin(idname=idname, username=username, password=hashed_password)
         
         db.session.add(new_admin)
@@ -217,7 +1159,18 @@ def login_admin():
         
         admin = Admin.query.filter_by(username=username).first()
         
-        if admin and bcrypt.check_password_hash(admin.password, password):
+        try:
+            if session_authenticates('admin_id', admin):
+                password_ok, needs_rehash = True, False
+            else:
+                password_ok, needs_rehash = passwords.verify_async(admin.password, password).result() if admin else (False, False)
+        except PasswordPoolBusy as e:
+            flash(str(e))
+            return render_template('login_admin.html')
+        
+        if password_ok:
+            if needs_rehash:
+                upgrade_password_hash(admin, password)
             session['admin_id'] = admin.id
             session['admin_username'] = admin.username
             
@@ -239,35 +1192,11 @@ def admin_dashboard():
         flash("Please login first")
         return redirect(url_for('login_admin'))
         
-    # Get students who are currently logged in
-    students_present = []
-    active_students = Student.query.filter_by(is_logged_in=True).all()
-    
-    for student in active_students:
-        # Calculate active time
-        if student.login_time:
-            active_duration = datetime.now() - student.login_time
-            hours, remainder = divmod(active_duration.seconds, 3600)
-            minutes, seconds = divmod(remainder, 60)
-            active_time = f"{hours:02}:{minutes:02}:{seconds:02}"
-        else:
-            active_time = "00:00:00"
-        
-        # Check if student is active within last 2 minutes
-        status = "Active"
-        if student.last_active_time and (datetime.now() - student.last_active_time).seconds > 120:
-            status = "Inactive"
-            
-        students_present.append({
-            'student_id': student.student_id,
-            'username': student.username,
-            'status': status,
-            'active_time': active_time,
-            'room': student.current_room
-        })
+    # Get students who are currently logged into this admin's rooms
+    admin_id = session.get('admin_id')
+    students_present = present_students(admin_id)
         
     # Get all rooms created by this admin
-    admin_id = session.get('admin_id')
     rooms = Room.query.filter_by(admin_id=admin_id).all()
     
     return render_template('admin_dashboard.html', students_present=students_present, rooms=rooms)
@@ -301,8 +1230,32 @@ def create_room():
     
     db.session.add(new_room)
     db.session.commit()
+    presence.add_room(admin_id, room_code)
+    roster.watch_room(admin_id, room_code)
     
-    return jsonify({'success': True, 'message': f'Room {room_code} created successfully'})
+    return jsonify({
+        'success': True,
+        'message': f'Room {room_code} created successfully',
+        'network_token': issue_network_token(room_code)
+    })
+
+# Issue a fresh network token for one of the admin's rooms
+@app.route('/room_token/<room_code>')
+def room_token(room_code):
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Admin not logged in'})
+
+    admin_id = session.get('admin_id')
+    room = Room.query.filter_by(room_code=room_code, admin_id=admin_id).first()
+
+    if not room:
+        return jsonify({'success': False, 'message': 'Room not found'})
+
+    return jsonify({
+        'success': True,
+        'network_token': issue_network_token(room_code),
+        'expires_in': app.config['NETWORK_TOKEN_MAX_AGE']
+    })
 
 @app.route('/close_room/<room_code>', methods=['POST'])
 def close_room(room_code):
@@ -315,31 +1268,123 @@ def close_room(room_code):
     if not room:
         return jsonify({'success': False, 'message': 'Room not found'})
 
-    # Log out all students in the room
-    students_in_room = Student.query.filter_by(current_room=room_code, is_logged_in=True).all()
-    for student in students_in_room:
-        if student.login_time:
-            active_duration = (datetime.now() - student.login_time).total_seconds() / 60
-            attendance = AttendanceRecord(
-                student_id=student.student_id,
-                room_code=room_code,
-                login_time=student.login_time,
-                logout_time=datetime.utcnow(),
-                active_duration=active_duration
-            )
-            db.session.add(attendance)
+    # Log out all students in the room and delete it
+    close_rooms([room_code])
+
+    return jsonify({'success': True, 'message': f'Room {room_code} closed successfully'})
 
-        # Reset student login status
-        student.is_logged_in = False
-        student.current_room = None
-        student.login_time = None
-        student.last_active_time = None
+def read_roll_call_frames(upload):
+    """Read an uploaded classroom photo or video clip into a list of BGR frames"""
+    import cv2
+    data = upload.read()
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is not None:
+        return [img]
 
-    # Delete the room
-    db.session.delete(room)
+    # Not an image, try it as a video and sample frames evenly across the clip
+    import tempfile
+    suffix = os.path.splitext(upload.filename or '')[1] or '.mp4'
+    with tempfile.TemporaryDirectory() as temp_dir:
+        video_path = os.path.join(temp_dir, 'roll_call' + suffix)
+        with open(video_path, 'wb') as f:
+            f.write(data)
+
+        capture = cv2.VideoCapture(video_path)
+        frames = []
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        max_frames = app.config['ROLL_CALL_MAX_FRAMES']
+        for index in np.linspace(0, max(frame_count - 1, 0), num=max_frames, dtype=int):
+            capture.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+            ok, frame = capture.read()
+            if ok:
+                frames.append(frame)
+        capture.release()
+
+    return frames
+
+@app.route('/roll_call/<room_code>', methods=['POST'])
+def roll_call(room_code):
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Admin not logged in'})
+
+    admin_id = session.get('admin_id')
+    room = Room.query.filter_by(room_code=room_code, admin_id=admin_id).first()
+
+    if not room:
+        return jsonify({'success': False, 'message': 'Room not found'})
+
+    try:
+        if 'media' in request.files:
+            frames = read_roll_call_frames(request.files['media'])
+        elif request.form.get('image'):
+            frames = [decode_image(request.form.get('image'))]
+        else:
+            return jsonify({'success': False, 'message': 'No image or video uploaded'})
+
+        if not frames:
+            return jsonify({'success': False, 'message': 'Could not read image or video'})
+
+        # Detect faces in every frame, batched together through the inference engine
+        faces = []
+        faces_per_frame = []
+        for frame, boxes in zip(frames, face_engine.detect_many(frames)):
+            count = 0
+            for x1, y1, x2, y2 in boxes.tolist():
+                face_img = frame[int(y1):int(y2), int(x1):int(x2)]
+                if face_img.size:
+                    faces.append(face_img)
+                    count += 1
+            faces_per_frame.append(count)
+
+        if not faces:
+            return jsonify({'success': False, 'message': 'No faces detected'})
+
+        # Embed every face at once, then match frame by frame: within a frame each student
+        # is at most one face, across the frames of a clip the same people appear again
+        sync_face_index()
+        embeddings = np.stack(embedding_engine.detect_many(faces))
+        best = {}
+        unmatched_per_frame = []
+        start = 0
+        for count in faces_per_frame:
+            matches = face_index.match(embeddings[start:start + count], app.config['FACE_MATCH_THRESHOLD'])
+            start += count
+            unmatched_per_frame.append(sum(1 for student_id, _ in matches if student_id is None))
+            for student_id, similarity in matches:
+                if student_id and similarity > best.get(student_id, 0.0):
+                    best[student_id] = similarity
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)})
+
+    matched = list(best.items())
+
+    # Record attendance for every identified student in one transaction
+    now = datetime.now()
+    db.session.add_all([
+        AttendanceRecord(
+            student_id=student_id,
+            room_code=room_code,
+            login_time=now,
+            logout_time=now,
+            active_duration=0.0
+        )
+        for student_id, _ in matched
+    ])
+    if matched:
+        record = AttendanceRecord.__table__.c
+        db.session.flush()
+        add_to_rollups(rollups_from_records(and_(record.room_code == room_code, record.login_time == now)))
     db.session.commit()
 
-    return jsonify({'success': True, 'message': f'Room {room_code} closed successfully'})
+    return jsonify({
+        'success': True,
+        'message': f'{len(matched)} students marked present in {room_code}',
+        'frames': len(frames),
+        # Per frame, not summed over a clip's frames, which would count each person once per frame
+        'max_faces_in_frame': max(faces_per_frame),
+        'max_unmatched_in_frame': max(unmatched_per_frame),
+        'students': [{'student_id': student_id, 'similarity': round(similarity, 3)} for student_id, similarity in matched]
+    })
 
 # ... rest of existing routes ...
 # Student registration
@@ -350,33 +1395,45 @@ def register_student():
         username = request.form.get('username')
         password = request.form.get('password')
         face_image = request.form.get('face_image')
+        face_images = request.form.getlist('face_images')[:app.config['ENROLLMENT_BURST_SIZE']]  # Burst mode
         
         existing_student = Student.query.filter_by(username=username).first()
         if existing_student:
             flash("Username already exists")
             return redirect(url_for('register_student'))
             
-        # Process and save face image
-        face_encoding, message = process_face_image(face_image)
-        if not face_encoding:
+        # Process and save face image, from a burst of frames if the page sent one
+        if len(face_images) > 1:
+            face_jpeg, templates, message = process_face_burst(face_images)
+        else:
+            face_jpeg, templates, message = process_face_image(face_images[0] if face_images else face_image)
+        if not face_jpeg:
             flash(f"Face registration failed: {message}")
             return redirect(url_for('register_student'))
         
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        try:
+            with metrics.stage('password_hash'):
+                hashed_password = passwords.hash(password)
+        except PasswordPoolBusy as e:
+            flash(str(e))
+            return redirect(url_for('register_student'))
         new_student = Student(
             student_id=student_id,
             username=username,
             password=hashed_password,
-            face_encoding=face_encoding
+            face_hash=face_blobs.put(face_jpeg),
+            embedding_hash=face_blobs.put_array(templates)
         )
         
         db.session.add(new_student)
-        db.session.commit()
+        with metrics.stage('db_commit'):
+            db.session.commit()
+        face_index.add(student_id, average_templates(templates))
         
         flash("Registration successful")
         return redirect(url_for('login_student'))
         
-    return render_template('register_student.html')
+    return render_template('register_student.html', burst_size=app.config['ENROLLMENT_BURST_SIZE'])
 
 # Student login
 @app.route('/login_student', methods=['GET', 'POST'])
@@ -386,46 +1443,45 @@ def login_student():
         password = request.form.get('password')
         face_image = request.form.get('face_image')
         room_code = request.form.get('room_code')  # Added room code field
+        network_token = request.form.get('network_token')
         
-        student = Student.query.filter_by(username=username).first()
+        asynchronous = request.form.get('async') == '1'  # Sent by the login page's script
         
-        if not student:
-            flash("Invalid username or password")
-            return redirect(url_for('login_student'))
-            
-        if not bcrypt.check_password_hash(student.password, password):
-            flash("Invalid username or password")
+        def fail(message):
+            if asynchronous:
+                return jsonify({'success': False, 'message': message})
+            flash(message)
             return redirect(url_for('login_student'))
         
-        # Verify face
-        face_verified, message = verify_face(student.student_id, face_image)
-        if not face_verified:
-            flash(f"Face verification failed: {message}")
-            return redirect(url_for('login_student'))
-        
-        # Verify room code exists and is active
-        room = Room.query.filter_by(room_code=room_code, active=True).first()
-        if not room:
-            flash("Invalid or inactive room code")
-            return redirect(url_for('login_student'))
+        # Reject a wrong room or network before paying for face inference
+        student, message = check_login_request(username, room_code, network_token)
+        if not student:
+            return fail(message)
+        password_known = session_authenticates('student_id', student)
         
-        # Verify BSSID matches the room's BSSID
-        current_bssid = get_wifi_bssid()
-        if current_bssid != room.bssid:
-            flash("You must be connected to the same network as the admin who created this room")
-            return redirect(url_for('login_student'))
-            
-        # Set login info
-        student.is_logged_in = True
-        student.login_time = datetime.now()
-        student.last_active_time = datetime.now()
-        student.current_room = room_code
+        # Hand the face and password checks to the login pipeline and let the browser poll
+        if asynchronous:
+            job = LoginJob(id=secrets.token_urlsafe(16), student_pk=student.id, room_code=room_code)
+            db.session.add(job)
+            db.session.commit()
+            try:
+                login_pipeline.submit(run_login_job, job.id, student.id, room_code, password, face_image, password_known)
+            except PoolBusy as e:
+                db.session.delete(job)
+                db.session.commit()
+                return fail(str(e))
+            session['login_job'] = job.id
+            return jsonify({'success': True, 'job_id': job.id, 'status_url': url_for('login_status', job_id=job.id)}), 202
         
-        db.session.commit()
+        try:
+            verified, message, needs_rehash = verify_credentials(student, password, face_image, password_known)
+        except PasswordPoolBusy as e:
+            return fail(str(e))
+        if not verified:
+            return fail(message)
         
-        session['student_id'] = student.id
-        session['student_username'] = student.username
-        session['current_room'] = room_code
+        complete_login(student, room_code, password, needs_rehash)
+        start_student_session(student, room_code)
         
         return redirect(url_for('student_dashboard'))
         
@@ -433,6 +1489,32 @@ def login_student():
     active_rooms = Room.query.filter_by(active=True).all()
     return render_template('login_student.html', active_rooms=active_rooms)
 
+# Outcome of a login started with async=1, completes the session once it succeeded
+@app.route('/login_status/<job_id>')
+def login_status(job_id):
+    if session.get('login_job') != job_id:
+        return jsonify({'success': False, 'message': 'Unknown login'}), 404
+    
+    job = db.session.get(LoginJob, job_id)
+    if not job:
+        session.pop('login_job', None)
+        return jsonify({'success': False, 'message': 'Login expired, please try again'}), 404
+    
+    if job.status == 'pending':
+        return jsonify({'success': True, 'status': 'pending'})
+    
+    # Each outcome is reported once
+    session.pop('login_job', None)
+    status, message, student_pk, room_code = job.status, job.message, job.student_pk, job.room_code
+    db.session.delete(job)
+    db.session.commit()
+    
+    if status != 'success':
+        return jsonify({'success': False, 'status': status, 'message': message})
+    
+    start_student_session(db.session.get(Student, student_pk), room_code)
+    return jsonify({'success': True, 'status': status, 'redirect': url_for('student_dashboard')})
+
 # Student dashboard
 @app.route('/student_dashboard')
 def student_dashboard():
@@ -449,42 +1531,26 @@ def student_dashboard():
 @app.route('/logout', methods=['POST'])
 def logout():
     if 'student_id' in session:
-        student_id = session.get('student_id')
-        student = Student.query.get(student_id)
-
-        if student and student.is_logged_in:
-            # Create attendance record
-            if student.login_time:
-                active_duration = (datetime.now() - student.login_time).total_seconds() / 60
-                attendance = AttendanceRecord(
-                    student_id=student.student_id,
-                    room_code=student.current_room,
-                    login_time=student.login_time,
-                    logout_time=datetime.now(),
-                    active_duration=active_duration
-                )
-                db.session.add(attendance)
-
-            # Reset student login status
-            student.is_logged_in = False
-            student.current_room = None
-            student.login_time = None
-            student.last_active_time = None
-            db.session.commit()
+        # Create the attendance record and reset the student's login status
+        ended = end_sessions(Student.__table__.c.id == session.get('student_id'))
+        db.session.commit()
+        sessions_ended(ended)
 
         # Clear student session
         session.pop('student_id', None)
         session.pop('student_username', None)
+        session.pop('student_number', None)
         session.pop('current_room', None)
 
     elif 'admin_id' in session:
         admin_id = session.get('admin_id')
 
-        # Close all active rooms created by the admin
-        rooms = Room.query.filter_by(admin_id=admin_id).all()
-        for room in rooms:
-            db.session.delete(room)
-        db.session.commit()
+        # Close all rooms created by the admin and log out the students in them
+        room_codes = db.session.execute(
+            select(Room.__table__.c.room_code).where(Room.__table__.c.admin_id == admin_id),
+            bind_arguments={'mapper': Room}
+        ).scalars().all()
+        close_rooms(room_codes)
 
         # Clear admin session
         session.pop('admin_id', None)
@@ -495,42 +1561,26 @@ def logout():
 @app.route('/logout_s', methods=['POST'])
 def logout_s():
     if 'student_id' in session:
-        student_id = session.get('student_id')
-        student = Student.query.get(student_id)
-
-        if student and student.is_logged_in:
-            # Create attendance record
-            if student.login_time:
-                active_duration = (datetime.now() - student.login_time).total_seconds() / 60
-                attendance = AttendanceRecord(
-                    student_id=student.student_id,
-                    room_code=student.current_room,
-                    login_time=student.login_time,
-                    logout_time=datetime.now(),
-                    active_duration=active_duration
-                )
-                db.session.add(attendance)
-
-            # Reset student login status
-            student.is_logged_in = False
-            student.current_room = None
-            student.login_time = None
-            student.last_active_time = None
-            db.session.commit()
+        # Create the attendance record and reset the student's login status
+        ended = end_sessions(Student.__table__.c.id == session.get('student_id'))
+        db.session.commit()
+        sessions_ended(ended)
 
         # Clear student session
         session.pop('student_id', None)
         session.pop('student_username', None)
+        session.pop('student_number', None)
         session.pop('current_room', None)
 
     elif 'admin_id' in session:
         admin_id = session.get('admin_id')
 
-        # Close all active rooms created by the admin
-        rooms = Room.query.filter_by(admin_id=admin_id).all()
-        for room in rooms:
-            db.session.delete(room)
-        db.session.commit()
+        # Close all rooms created by the admin and log out the students in them
+        room_codes = db.session.execute(
+            select(Room.__table__.c.room_code).where(Room.__table__.c.admin_id == admin_id),
+            bind_arguments={'mapper': Room}
+        ).scalars().all()
+        close_rooms(room_codes)
 
         # Clear admin session
         session.pop('admin_id', None)
@@ -541,17 +1591,17 @@ def logout_s():
 
 
 
-# Update student activity
+# Update student activity (buffered, flushed to the database in batches)
 @app.route('/update_activity', methods=['POST'])
 def update_activity():
-    if 'student_id' in session:
-        student_id = session.get('student_id')
-        student = Student.query.get(student_id)
-        
-        if student:
-            student.last_active_time = datetime.now()
-            db.session.commit()
-            
+    if 'student_id' in session and session.get('current_room'):
+        now = datetime.now()
+        heartbeats.touch(session.get('student_id'), now)
+        last_seen = presence.touch(session.get('student_id'), now)
+        # Dashboards only hear of the student coming back, not of every heartbeat
+        if session.get('student_number') and last_seen and (now - last_seen).total_seconds() > app.config['STUDENT_INACTIVE_AFTER']:
+            roster.publish('active', session.get('current_room'), student_id=session.get('student_number'))
+
     return jsonify({'success': True})
 
 # Get active students for admin dashboard
@@ -560,62 +1610,312 @@ def active_students():
     if 'admin_id' not in session:
         return jsonify([])
     
-    students_list = []
-    active_students = Student.query.filter_by(is_logged_in=True).all()
-    
-    for student in active_students:
-        # Calculate active time
-        if student.login_time:
-            active_duration = datetime.now() - student.login_time
-            hours, remainder = divmod(active_duration.seconds, 3600)
-            minutes, seconds = divmod(remainder, 60)
-            active_time = f"{hours:02}:{minutes:02}:{seconds:02}"
-        else:
-            active_time = "00:00:00"
-        
-        # Check if student is active within last 2 minutes
-        status = "Active"
-        if student.last_active_time and (datetime.now() - student.last_active_time).seconds > 120:
-            status = "Inactive"
-            
-        students_list.append({
-            'student_id': student.student_id,
-            'username': student.username,
-            'status': status,
-            'active_time': active_time,
-            'room': student.current_room
-        })
+    students_list = [
+        {key: student[key] for key in ('student_id', 'username', 'status', 'active_time', 'room')}
+        for student in present_students(session.get('admin_id'))
+    ]
     
     return jsonify(students_list)
 
+# Face inference queue depth and batch sizes
+@app.route('/inference_stats')
+def inference_stats():
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Admin not logged in'})
+
+    return jsonify(face_engine.stats())
+
+# Cached BSSID and how stale it is
+@app.route('/bssid_status')
+def bssid_status():
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Admin not logged in'})
+
+    return jsonify(bssid_provider.status())
+
+# Idle session reaper runs, run times and batch sizes
+@app.route('/reaper_stats')
+def reaper_stats():
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Admin not logged in'})
+
+    return jsonify(reaper.stats())
+
+# Request and stage latency histograms for Prometheus
+@app.route('/metrics')
+def metrics_endpoint():
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response("Unauthorized\n", status=401, mimetype='text/plain')
+
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Turn the slow request profiler on or off and read the stacks it captured
+@app.route('/slow_requests', methods=['GET', 'POST'])
+def slow_requests():
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Admin not logged in'})
+
+    if request.method == 'POST':
+        profiler.set_enabled(request.form.get('enabled') == '1')
+
+    return jsonify({
+        'enabled': profiler.enabled,
+        'threshold': profiler.threshold,
+        'interval': profiler.interval,
+        'profiles': profiler.all_profiles()
+    })
+
+def roster_entry(student):
+    """Presence of one logged-in student as sent to admin dashboards"""
+    status = "Active"
+    if is_inactive(student):
+        status = "Inactive"
+
+    return {
+        'student_id': student.student_id,
+        'username': student.username,
+        'status': status,
+        'login_time': student.login_time.isoformat() if student.login_time else None
+    }
+
+# Push live roster changes for the admin's rooms (Server-Sent Events)
+@app.route('/roster_stream')
+def roster_stream():
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Admin not logged in'}), 401
+
+    admin_id = session.get('admin_id')
+    retry = f"retry: {app.config['ROSTER_RECONNECT_DELAY'] * 1000}\n\n"
+
+    # Subscribe before taking the snapshot so no change is missed in between
+    subscriber = roster.subscribe(admin_id, presence.room_codes(admin_id))
+    if subscriber is None:
+        # Every stream slot of this worker is taken, the dashboard tries again (maybe on another worker)
+        return Response(retry, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+    keepalive = app.config['ROSTER_KEEPALIVE']
+    snapshot_interval = timedelta(seconds=app.config['ROSTER_SNAPSHOT_INTERVAL'])
+    lifetime = timedelta(seconds=app.config['ROSTER_STREAM_LIFETIME'])
+
+    def take_snapshot():
+        """The admin's students from the presence registry, and the room and status of each"""
+        students = present_students(admin_id)
+        snapshot = [
+            {'student_id': student['student_id'], 'username': student['username'], 'status': student['status'],
+             'login_time': student['login_time'].isoformat() if student['login_time'] else None, 'room': student['room']}
+            for student in students
+        ]
+        # Room and status per student, as last sent to the dashboard
+        sent = {student['student_id']: (student['room'], student['status']) for student in students}
+        return snapshot, sent
+
+    snapshot, sent = take_snapshot()
+
+    def stream():
+        nonlocal sent
+        opened = datetime.now()
+        yield retry + format_event('snapshot', {'students': snapshot})
+        snapshot_sent = opened
+        while True:
+            try:
+                event, data = subscriber.get(timeout=keepalive)
+            except queue.Empty:
+                event, data = None, None
+
+            if (event, data) == RECONNECT:
+                # Dropped for falling behind, the client reconnects and starts over from a snapshot
+                return
+            if event == 'joined':
+                sent[data['student_id']] = (data['room'], data['status'])
+            elif event == 'active':
+                sent[data['student_id']] = (data['room'], "Active")
+            elif event == 'left':
+                sent.pop(data['student_id'], None)
+            elif event == 'room_closed':
+                for student_id, (room_code, _) in list(sent.items()):
+                    if room_code == data['room']:
+                        del sent[student_id]
+
+            if event:
+                yield format_event(event, data)
+            else:
+                yield ": keepalive\n\n"
+
+            now = datetime.now()
+            if lifetime and now - opened > lifetime:
+                # Give the worker thread back, the client reconnects after the retry delay
+                return
+
+            # Events are only published in the worker that handled the change, changes made
+            # by other workers reach this stream through the resynced presence registry
+            if snapshot_interval and now - snapshot_sent > snapshot_interval:
+                roster.set_rooms(subscriber, presence.room_codes(admin_id))
+                fresh, sent = take_snapshot()
+                yield format_event('snapshot', {'students': fresh})
+                snapshot_sent = now
+                continue
+
+            # Heartbeats are not events of their own, so compare statuses with the registry here
+            for student in present_students(admin_id):
+                student_id, status = student['student_id'], student['status']
+                if student_id in sent and sent[student_id][1] != status:
+                    sent[student_id] = (student['room'], status)
+                    yield format_event(status.lower(), {'student_id': student_id, 'room': student['room']})
+
+    response = Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Also runs when the client went away before the stream was started
+    response.call_on_close(lambda: roster.unsubscribe(subscriber))
+    return response
+
+def attendance_query(start=None, end=None, room_code=None, student_id=None):
+    """Select attendance rows (as plain tuples, not ORM objects) matching the given filters"""
+    record = AttendanceRecord.__table__.c
+    statement = select(record.student_id, record.room_code, record.login_time, record.logout_time, record.active_duration)
+
+    if start:
+        statement = statement.where(record.login_time >= start)
+    if end:
+        statement = statement.where(record.login_time < end)
+    if room_code:
+        statement = statement.where(record.room_code == room_code)
+    if student_id:
+        statement = statement.where(record.student_id == student_id)
+
+    return statement.order_by(record.login_time)
+
+def attendance_filters():
+    """Read the start/end date (YYYY-MM-DD, end inclusive) and room filters from the query string"""
+    start = request.args.get('start')
+    end = request.args.get('end')
+    return {
+        'start': datetime.strptime(start, '%Y-%m-%d') if start else None,
+        'end': datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1) if end else None,
+        'room_code': request.args.get('room') or None
+    }
+
+def export_attendance(statement, header, format_row, filename):
+    """Stream attendance rows to the client as CSV, or as Parquet with ?format=parquet"""
+    def chunks():
+        result = db.session.execute(
+            statement.execution_options(stream_results=True, yield_per=app.config['EXPORT_CHUNK_SIZE']),
+            bind_arguments={'mapper': AttendanceRecord}
+        )
+        try:
+            yield from result.partitions()
+        finally:
+            result.close()
+
+    if request.args.get('format') == 'parquet':
+        import pyarrow as pa
+        columns = [
+            ('student_id', pa.string()),
+            ('room_code', pa.string()),
+            ('login_time', pa.timestamp('us')),
+            ('logout_time', pa.timestamp('us')),
+            ('active_duration', pa.float64())  # Minutes
+        ]
+        body = stream_parquet(chunks(), columns)
+        mimetype = 'application/vnd.apache.parquet'
+        filename += '.parquet'
+    else:
+        body = stream_csv(chunks(), header, format_row)
+        mimetype = 'text/csv'
+        filename += '.csv'
+
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+def analytics_frame():
+    """Rollups matching the request's start/end/room/student filters, as a DataFrame"""
+    # Imported here, like pyarrow in export.py, so pandas is only loaded once analytics are asked for
+    import analytics
+
+    filters = attendance_filters()
+    rollup = AttendanceRollup.__table__.c
+    statement = select(*[getattr(rollup, column) for column in analytics.COLUMNS])
+    if filters['start']:
+        statement = statement.where(rollup.day >= filters['start'].date())
+    if filters['end']:
+        statement = statement.where(rollup.day < filters['end'].date())
+    if filters['room_code']:
+        statement = statement.where(rollup.room_code == filters['room_code'])
+    if request.args.get('student'):
+        statement = statement.where(rollup.student_id == request.args.get('student'))
+
+    with metrics.stage('db_query'):
+        rows = db.session.execute(statement, bind_arguments={'mapper': AttendanceRollup}).all()
+    return analytics.rollup_frame(rows)
+
+def analytics_response(compute):
+    """Run an analytics query for an admin, with the usual filters, as JSON"""
+    if 'admin_id' not in session:
+        return jsonify({'success': False, 'message': 'Admin not logged in'})
+
+    try:
+        frame = analytics_frame()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid date, use YYYY-MM-DD'})
+
+    with metrics.stage('analytics'):
+        result = compute(frame) if len(frame) else []
+    return jsonify({'success': True, 'results': result})
+
+# Total minutes and days per student and room
+@app.route('/analytics/minutes')
+def analytics_minutes():
+    import analytics
+
+    return analytics_response(lambda frame: analytics.records(analytics.student_minutes(frame)))
+
+# Attendance rate per room and day, week or month
+@app.route('/analytics/attendance_rate')
+def analytics_attendance_rate():
+    import analytics
+
+    period = request.args.get('period', 'week')
+    if period not in analytics.PERIODS:
+        return jsonify({'success': False, 'message': f"period must be one of {', '.join(analytics.PERIODS)}"})
+    return analytics_response(lambda frame: analytics.records(analytics.attendance_rates(frame, period)))
+
+# Late arrivals per student and room
+@app.route('/analytics/late_arrivals')
+def analytics_late_arrivals():
+    import analytics
+
+    late_after = request.args.get('late_after', app.config['ANALYTICS_LATE_AFTER'], type=float)
+    return analytics_response(lambda frame: analytics.records(analytics.late_arrivals(frame, late_after)))
+
+# Distribution of minutes attended per student and day
+@app.route('/analytics/durations')
+def analytics_durations():
+    import analytics
+
+    return analytics_response(lambda frame: analytics.duration_distribution(frame, app.config['ANALYTICS_DURATION_BINS']))
+
 # Download attendance records
 @app.route('/download_attendance')
 def download_attendance():
     if 'admin_id' not in session:
         flash("Please login first")
         return redirect(url_for('login_admin'))
-    
-    # Create a temporary CSV file
-    import tempfile
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.csv')
-    
-    with open(temp_file.name, 'w', newline='') as csvfile:
-        fieldnames = ['student_id', 'room_code', 'login_time', 'logout_time', 'active_duration']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        writer.writeheader()
-        records = AttendanceRecord.query.all()
-        
-        for record in records:
-            writer.writerow({
-                'student_id': record.student_id,
-                'room_code': record.room_code,
-                'login_time': record.login_time,
-                'logout_time': record.logout_time,
-                'active_duration': f"{record.active_duration:.2f} minutes"
-            })
-    
-    return send_file(temp_file.name, as_attachment=True, download_name='attendance.csv')
+
+    try:
+        filters = attendance_filters()
+    except ValueError:
+        flash("Invalid date, use YYYY-MM-DD")
+        return redirect(url_for('admin_dashboard'))
+
+    statement = attendance_query(student_id=request.args.get('student') or None, **filters)
+    header = ['student_id', 'room_code', 'login_time', 'logout_time', 'active_duration']
+
+    def format_row(row):
+        return [row.student_id, row.room_code, row.login_time, row.logout_time, f"{row.active_duration:.2f} minutes"]
+
+    return export_attendance(statement, header, format_row, 'attendance')
 
 @app.route('/download_student_attendance')
 def download_student_attendance():
@@ -631,31 +1931,25 @@ def download_student_attendance():
         flash("Student not found")
         return redirect(url_for('login_student'))
 
-    # Create temporary CSV file
-    import tempfile
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.csv')
-    
-    with open(temp_file.name, 'w', newline='') as csvfile:
-        fieldnames = ['room_code', 'login_time', 'logout_time', 'active_duration']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        writer.writeheader()
-        # Filter records by student's actual ID string
-        records = AttendanceRecord.query.filter_by(student_id=student.student_id).all()
-        
-        for record in records:
-            writer.writerow({
-                'room_code': record.room_code,
-                'login_time': record.login_time.strftime('%Y-%m-%d %H:%M:%S'),
-                'logout_time': record.logout_time.strftime('%Y-%m-%d %H:%M:%S') if record.logout_time else 'N/A',
-                'active_duration': f"{record.active_duration:.2f} minutes"
-            })
-    
-    return send_file(
-        temp_file.name,
-        as_attachment=True,
-        download_name=f'attendance_{student.student_id}.csv'
-    )
+    try:
+        filters = attendance_filters()
+    except ValueError:
+        flash("Invalid date, use YYYY-MM-DD")
+        return redirect(url_for('student_dashboard'))
+
+    # Filter records by student's actual ID string
+    statement = attendance_query(student_id=student.student_id, **filters)
+    header = ['room_code', 'login_time', 'logout_time', 'active_duration']
+
+    def format_row(row):
+        return [
+            row.room_code,
+            row.login_time.strftime('%Y-%m-%d %H:%M:%S'),
+            row.logout_time.strftime('%Y-%m-%d %H:%M:%S') if row.logout_time else 'N/A',
+            f"{row.active_duration:.2f} minutes"
+        ]
+
+    return export_attendance(statement, header, format_row, f'attendance_{student.student_id}')
 
 if __name__ == '__main__':
     app.run(host="0.0.0.0",port=5000 ,ssl_context=("cert.pem", "key.pem"), debug=True)
\ No newline at end of file
@@ -0,0 +1,72 @@
+"""Time the attendance analytics on synthetic rollups.
+
+Builds one rollup row per student, room and class day (as the
+attendance_rollup table holds them) and times each analytics query on
+it. The cost depends on students x rooms x days, not on the number of
+sessions behind them. Run from the project root:
+
+    python benchmarks/analytics.py --students 300 --rooms 10 --days 120
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+
+
+def synthetic_rollups(students, rooms, days, attendance, seed=0):
+    rng = np.random.default_rng(seed)
+    start = datetime(2025, 1, 6)
+    rows = []
+    for day in range(days):
+        date = (start + timedelta(days=day)).date()
+        for room in range(rooms):
+            class_start = datetime.combine(date, datetime.min.time()) + timedelta(hours=8 + room % 8)
+            present = np.flatnonzero(rng.random(students) < attendance)
+            delays = rng.exponential(5.0, len(present))
+            minutes = rng.normal(50.0, 10.0, len(present)).clip(1.0)
+            for student, delay, duration in zip(present, delays, minutes):
+                first_login = class_start + timedelta(minutes=float(delay))
+                rows.append((f'S{student:05}', f'R{room:03}', date, 1, float(duration),
+                             first_login, first_login + timedelta(minutes=float(duration))))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=300)
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--days', type=int, default=120)
+    parser.add_argument('--attendance', type=float, default=0.8, help="Chance a student attends a class day")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = synthetic_rollups(args.students, args.rooms, args.days, args.attendance)
+    start = time.perf_counter()
+    frame = analytics.rollup_frame(rows)
+    load_ms = (time.perf_counter() - start) * 1000
+    print(f"{len(frame)} rollup rows, loaded into a DataFrame in {load_ms:.1f} ms")
+
+    queries = [
+        ('student_minutes', lambda: analytics.student_minutes(frame)),
+        ('attendance_rates (week)', lambda: analytics.attendance_rates(frame, 'week')),
+        ('late_arrivals', lambda: analytics.late_arrivals(frame, 10)),
+        ('duration_distribution', lambda: analytics.duration_distribution(frame, [0, 15, 30, 45, 60, 90, 120, 180])),
+    ]
+    print(f"{'query':<26} {'ms':>8}")
+    for name, query in queries:
+        query()  # Warm up
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            query()
+        print(f"{name:<26} {(time.perf_counter() - start) / args.repeat * 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Student query time with face images inline versus in the blob store.
+
+Builds two student tables in a throwaway SQLite file: 'inline' keeps each
+face image as a base64 Text column read with the row, as students.db did
+before the blob store; 'blobs' keeps only the blob hash, with the old column
+deferred. Times the dashboard query (logged-in students of a room), the
+query for all logged-in students, and reading enrolled faces back from the
+blob store with and without mmap. Run from the project root:
+
+    python benchmarks/face_blobs.py --students 5000 --repeat 50
+"""
+import argparse
+import base64
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, String, Text, create_engine, event
+from sqlalchemy.orm import Session, declarative_base, deferred
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blobs import BlobStore  # noqa: E402
+
+Base = declarative_base()
+ROOMS = 20
+
+
+class InlineStudent(Base):
+    __tablename__ = 'inline_student'
+    id = Column(Integer, primary_key=True)
+    student_id = Column(String(50), nullable=False, unique=True)
+    username = Column(String(50), nullable=False, unique=True)
+    password = Column(String(100), nullable=False)
+    face_encoding = Column(Text)
+    current_room = Column(String(50))
+    is_logged_in = Column(Boolean, default=False)
+    login_time = Column(DateTime)
+    last_active_time = Column(DateTime)
+
+    __table_args__ = (Index('ix_inline_logged_in_room', 'is_logged_in', 'current_room'),)
+
+
+class BlobStudent(Base):
+    __tablename__ = 'blob_student'
+    id = Column(Integer, primary_key=True)
+    student_id = Column(String(50), nullable=False, unique=True)
+    username = Column(String(50), nullable=False, unique=True)
+    password = Column(String(100), nullable=False)
+    face_hash = Column(String(64))
+    embedding_hash = Column(String(64))
+    face_encoding = deferred(Column(Text))
+    current_room = Column(String(50))
+    is_logged_in = Column(Boolean, default=False)
+    login_time = Column(DateTime)
+    last_active_time = Column(DateTime)
+
+    __table_args__ = (Index('ix_blob_logged_in_room', 'is_logged_in', 'current_room'),)
+
+
+def per_call_ms(fn, repeat):
+    fn()  # Warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--face-bytes', type=int, default=3500, help="Size of one face crop JPEG")
+    parser.add_argument('--logged-in', type=float, default=0.8, help="Fraction of students logged in")
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='face_blob_bench_')
+    engine = create_engine('sqlite:///' + os.path.join(workdir, 'students.db'))
+
+    @event.listens_for(engine, 'connect')
+    def sqlite_pragmas(dbapi_connection, connection_record):
+        # The app's SQLite settings (see database.py)
+        dbapi_connection.execute('PRAGMA journal_mode=WAL')
+        dbapi_connection.execute('PRAGMA synchronous=NORMAL')
+
+    Base.metadata.create_all(engine)
+    store = BlobStore(os.path.join(workdir, 'face_data'))
+
+    with Session(engine) as session:
+        for i in range(args.students):
+            face = os.urandom(args.face_bytes)  # JPEG data does not compress either
+            common = {
+                'student_id': f'S{i:06}',
+                'username': f'student{i:06}',
+                'password': '$2b$12$' + 'x' * 53,
+                'current_room': f'R{i % ROOMS}',
+                'is_logged_in': i < args.students * args.logged_in
+            }
+            session.add(InlineStudent(face_encoding=base64.b64encode(face).decode('ascii'), **common))
+            session.add(BlobStudent(face_hash=store.put(face), **common))
+        session.commit()
+
+    def room_query(model):
+        def run():
+            with Session(engine) as session:
+                return session.query(model).filter_by(is_logged_in=True, current_room='R1').all()
+        return run
+
+    def logged_in_query(model):
+        def run():
+            with Session(engine) as session:
+                return session.query(model).filter_by(is_logged_in=True).all()
+        return run
+
+    print(f"{args.students} students, {args.face_bytes} byte faces")
+    print(f"{'query':<28} {'inline ms':>10} {'blobs ms':>9} {'speedup':>8}")
+    for name, query in (('logged-in students of room', room_query), ('all logged-in students', logged_in_query)):
+        inline = per_call_ms(query(InlineStudent), args.repeat)
+        blobs = per_call_ms(query(BlobStudent), args.repeat)
+        print(f"{name:<28} {inline:>10.2f} {blobs:>9.2f} {inline / blobs:>7.1f}x")
+
+    with Session(engine) as session:
+        hashes = [h for (h,) in session.query(BlobStudent.face_hash).limit(1000)]
+    for use_mmap in (False, True):
+        reader = BlobStore(store.root, use_mmap=use_mmap)
+        us = per_call_ms(lambda: [len(reader.get(h)) for h in hashes], max(1, args.repeat // 10)) / len(hashes) * 1000
+        print(f"read one face blob ({'mmap' if use_mmap else 'read'}): {us:.1f} us")
+
+
+if __name__ == '__main__':
+    main()
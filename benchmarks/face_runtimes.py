@@ -0,0 +1,104 @@
+"""Compare face detection accuracy and latency across model runtimes.
+
+Runs every exported variant of the detector (see `flask export-face-model`)
+over a directory of face photos and compares it with the PyTorch model:
+per-image latency (p50/p95) and how well its boxes agree with PyTorch's
+(recall and precision at IoU >= 0.5, mean IoU of matched boxes). Run from
+the project root:
+
+    python benchmarks/face_runtimes.py --images path/to/face/photos
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_export  # noqa: E402
+
+
+def iou(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes"""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+
+def agreement(reference, candidate, threshold=0.5):
+    """Greedy one-to-one matching, returns (matched, reference count, candidate count, IoUs)"""
+    if not len(reference) or not len(candidate):
+        return 0, len(reference), len(candidate), []
+    overlaps = iou(reference, candidate)
+    matched_ious = []
+    while overlaps.size and overlaps.max() >= threshold:
+        i, j = np.unravel_index(overlaps.argmax(), overlaps.shape)
+        matched_ious.append(overlaps[i, j])
+        overlaps[i, :] = -1
+        overlaps[:, j] = -1
+    return len(matched_ious), len(reference), len(candidate), matched_ious
+
+
+def run(model, images, imgsz):
+    latencies, boxes = [], []
+    model(images[0], imgsz=imgsz, verbose=False)  # Warm up
+    for img in images:
+        start = time.perf_counter()
+        result = model(img, imgsz=imgsz, verbose=False)[0]
+        latencies.append(time.perf_counter() - start)
+        boxes.append(result.boxes.xyxy.cpu().numpy())
+    return np.array(latencies), boxes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', required=True, help="Directory of face photos (jpg/png)")
+    parser.add_argument('--weights', default='yolov8n.pt')
+    parser.add_argument('--imgsz', type=int, default=640)
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+
+    paths = sorted(glob.glob(os.path.join(args.images, '*.jpg')) + glob.glob(os.path.join(args.images, '*.png')))
+    images = [cv2.imread(path) for path in paths]
+    if not images:
+        parser.error(f"No images found in {args.images}")
+
+    variants = [('pytorch', False), ('onnx', False), ('onnx', True), ('openvino', False), ('openvino', True)]
+    reference = None
+
+    print(f"{len(images)} images")
+    print(f"{'runtime':<16} {'p50 (ms)':>9} {'p95 (ms)':>9} {'recall':>7} {'precision':>9} {'mean IoU':>9}")
+    for runtime, int8 in variants:
+        path = model_export.model_path(args.weights, runtime, int8)
+        if runtime != 'pytorch' and not os.path.exists(path):
+            continue
+
+        latencies, boxes = run(YOLO(path, task='detect'), images, args.imgsz)
+        if reference is None:
+            reference = boxes
+
+        matched = reference_total = candidate_total = 0
+        ious = []
+        for expected, found in zip(reference, boxes):
+            m, r, c, i = agreement(expected, found)
+            matched += m
+            reference_total += r
+            candidate_total += c
+            ious.extend(i)
+
+        label = runtime + (' int8' if int8 else '')
+        print(f"{label:<16} {np.percentile(latencies, 50) * 1000:>9.1f} {np.percentile(latencies, 95) * 1000:>9.1f} "
+              f"{matched / max(reference_total, 1):>7.3f} {matched / max(candidate_total, 1):>9.3f} "
+              f"{np.mean(ious) if ious else 0:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""Simulate a lecture-start login storm against the Flask app.
+
+Seeds an admin and a room in a throwaway database, then drives
+/register_student, /login_student, /update_activity and /active_students at
+the given concurrency with synthetic face images and a stub BSSID. Reports
+throughput and p50/p95/p99 latency per route plus time spent waiting on
+database writes and commits, and can save or compare against a baseline.
+Afterwards the in-memory presence registry is checked against the database.
+Run from the project root:
+
+    python benchmarks/login_storm.py --students 300 --concurrency 32
+    python benchmarks/login_storm.py --save-baseline
+    python benchmarks/login_storm.py --compare
+
+Face inference is replaced with a stub costing --face-latency ms per batch
+unless --real-models is given (which needs real photos, see --faces).
+--async-login logs in the way the login page does, posting async=1 and
+polling /login_status until the job finishes.
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baselines', 'login_storm.json')
+ROOM_CODE = 'BENCH101'
+STUB_BSSID = '00:11:22:33:44:55'
+
+
+def synthetic_face(seed, width=320, height=240):
+    """A deterministic JPEG data URL per student, as the webcam page would send it"""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    img = cv2.resize(rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8), (width, height))
+    _, buffer = cv2.imencode('.jpg', img)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer).decode('ascii')
+
+
+def photo_faces(directory):
+    paths = sorted(glob.glob(os.path.join(directory, '*.jpg')))
+    faces = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            faces.append('data:image/jpeg;base64,' + base64.b64encode(f.read()).decode('ascii'))
+    return faces
+
+
+class DatabaseTimer:
+    """Accumulates time spent executing writes and committing, i.e. holding or waiting for the write lock"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def install(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine, default
+
+        @event.listens_for(Engine, 'before_cursor_execute')
+        def before(conn, cursor, statement, parameters, context, executemany):
+            self._local.start = time.perf_counter()
+
+        @event.listens_for(Engine, 'after_cursor_execute')
+        def after(conn, cursor, statement, parameters, context, executemany):
+            if not statement.lstrip().upper().startswith('SELECT'):
+                self._add(time.perf_counter() - self._local.start)
+
+        # There is no event after a commit completes, so time the dialect's commit itself
+        do_commit = default.DefaultDialect.do_commit
+
+        def timed_commit(dialect, dbapi_connection):
+            start = time.perf_counter()
+            try:
+                return do_commit(dialect, dbapi_connection)
+            finally:
+                self._add(time.perf_counter() - start)
+
+        default.DefaultDialect.do_commit = timed_commit
+
+    def _add(self, seconds):
+        with self._lock:
+            self.seconds += seconds
+            self.count += 1
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--heartbeats', type=int, default=3, help="Heartbeats per student after login")
+    parser.add_argument('--dashboard-polls', type=int, default=200, help="/active_students requests during the storm")
+    parser.add_argument('--face-latency', type=float, default=20.0, help="Stub inference cost per batch in ms")
+    parser.add_argument('--real-models', action='store_true', help="Use the real face models instead of the stub")
+    parser.add_argument('--faces', help="Directory of face photos (jpg), required with --real-models")
+    parser.add_argument('--async-login', action='store_true', help="Log in through the job pipeline and poll")
+    parser.add_argument('--database-url', help="Database to run against, default: a throwaway SQLite file")
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true', help="Fail if p95 regresses beyond --tolerance")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed p95 regression, 0.2 = 20%%")
+    args = parser.parse_args()
+
+    if args.real_models and not args.faces:
+        parser.error("--real-models needs --faces")
+
+    # Configure the app before importing it
+    workdir = tempfile.mkdtemp(prefix='login_storm_')
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['BSSID_BACKEND'] = 'stub'
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+
+    timer = DatabaseTimer()
+    timer.install()
+
+    import app as attendance
+
+    if args.real_models:
+        faces = photo_faces(args.faces)
+        face_for = lambda i: faces[i % len(faces)]
+    else:
+        face_for = synthetic_face
+        latency = args.face_latency / 1000
+
+        def stub_detect(images):
+            time.sleep(latency)
+            return [np.array([[w * 0.25, h * 0.25, w * 0.75, h * 0.75]], dtype=np.float32)
+                    for h, w in (img.shape[:2] for img in images)]
+
+        def stub_embed(faces):
+            time.sleep(latency)
+            import cv2
+            small = [cv2.resize(face, (16, 32)).astype(np.float32).ravel() for face in faces]
+            return np.stack([np.resize(v - v.mean(), attendance.face_embedder.dim) for v in small])
+
+        attendance.face_engine.model_fn = stub_detect
+        attendance.embedding_engine.model_fn = stub_embed
+
+    attendance.face_index.path = os.path.join(workdir, 'face_index')
+    attendance.bssid_provider.backend.bssid = STUB_BSSID
+    attendance.bssid_provider.refresh()
+
+    # Seed the admin and the room students log into
+    with attendance.app.app_context():
+        admin = attendance.Admin(idname='bench', username='bench-admin',
+                                 password=attendance.bcrypt.generate_password_hash('bench').decode('utf-8'))
+        attendance.db.session.add(admin)
+        attendance.db.session.commit()
+        attendance.db.session.add(attendance.Room(room_code=ROOM_CODE, admin_id=admin.id, bssid=STUB_BSSID, active=True))
+        attendance.db.session.commit()
+    attendance.presence.rebuild()
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+
+    def timed(route, fn, ok):
+        start = time.perf_counter()
+        response = fn()
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies[route].append(elapsed)
+            if not ok(response):
+                errors[route] += 1
+        return response
+
+    def redirects_to(endpoint):
+        return lambda response: response.status_code == 302 and response.headers.get('Location', '').endswith(endpoint)
+
+    def async_login(client, login):
+        response = client.post('/login_student', data=dict(login, **{'async': '1'}))
+        if response.status_code != 202:
+            return response
+        status_url = response.get_json()['status_url']
+        while True:
+            response = client.get(status_url)
+            if response.get_json().get('status') != 'pending':
+                return response
+            time.sleep(0.01)
+
+    def student_session(i):
+        client = attendance.app.test_client()
+        form = {'student_id': f'B{i:05}', 'username': f'bench{i:05}', 'password': 'password', 'face_image': face_for(i)}
+        timed('/register_student', lambda: client.post('/register_student', data=form), redirects_to('/login_student'))
+
+        login = {'username': form['username'], 'password': 'password', 'face_image': form['face_image'], 'room_code': ROOM_CODE}
+        if args.async_login:
+            timed('/login_student', lambda: async_login(client, login), lambda r: r.get_json().get('status') == 'success')
+        else:
+            timed('/login_student', lambda: client.post('/login_student', data=login), redirects_to('/student_dashboard'))
+
+        for _ in range(args.heartbeats):
+            timed('/update_activity', lambda: client.post('/update_activity'), lambda r: r.status_code == 200)
+
+        # Some students leave early, so presence has departures to track as well
+        if i % 4 == 3:
+            timed('/logout_s', lambda: client.post('/logout_s'), lambda r: r.status_code == 200)
+
+    def dashboard_polls():
+        client = attendance.app.test_client()
+        client.post('/login_admin', data={'username': 'bench-admin', 'password': 'bench'})
+        for _ in range(args.dashboard_polls):
+            timed('/active_students', lambda: client.get('/active_students'), lambda r: r.status_code == 200)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        poller = pool.submit(dashboard_polls)
+        for future in [pool.submit(student_session, i) for i in range(args.students)]:
+            future.result()
+        poller.result()
+    wall = time.perf_counter() - start
+
+    results = {
+        'students': args.students,
+        'concurrency': args.concurrency,
+        'wall_seconds': wall,
+        'db_write_wait_seconds': timer.seconds,
+        'db_writes': timer.count,
+        'routes': {
+            route: {
+                'requests': len(values),
+                'errors': errors[route],
+                'throughput': len(values) / wall,
+                'p50_ms': percentile(values, 50),
+                'p95_ms': percentile(values, 95),
+                'p99_ms': percentile(values, 99)
+            }
+            for route, values in sorted(latencies.items())
+        }
+    }
+
+    print(f"{args.students} students, concurrency {args.concurrency}, {wall:.1f}s wall")
+    print(f"{'route':<20} {'reqs':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, stats in results['routes'].items():
+        print(f"{route:<20} {stats['requests']:>6} {stats['errors']:>6} {stats['throughput']:>8.1f} "
+              f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+    print(f"DB write/commit wait: {timer.seconds:.2f}s over {timer.count} writes")
+
+    # The dashboards read presence from memory, it must agree with the database after the storm
+    from presence import PresenceRegistry, diff
+    stored = PresenceRegistry(attendance.load_presence, resync_interval=0)
+    stored.rebuild()
+    inconsistencies = diff(stored.snapshot(), attendance.presence.snapshot())
+    for problem in inconsistencies:
+        print(f"PRESENCE MISMATCH {problem}")
+    if inconsistencies:
+        sys.exit(1)
+    print("Presence registry matches the database")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE), exist_ok=True)
+        with open(BASELINE, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {BASELINE}")
+
+    if args.compare:
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+        regressions = []
+        for route, stats in results['routes'].items():
+            before = baseline['routes'].get(route)
+            if before and before['p95_ms'] and stats['p95_ms'] > before['p95_ms'] * (1 + args.tolerance):
+                regressions.append(f"{route}: p95 {before['p95_ms']:.1f} -> {stats['p95_ms']:.1f} ms")
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No p95 regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
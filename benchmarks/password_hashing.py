@@ -0,0 +1,86 @@
+"""Login throughput at different bcrypt cost factors.
+
+Each simulated login checks a password and runs face verification, modelled
+as --face-latency ms of work that releases the GIL like model inference.
+'inline' checks the password in the request thread before the face, as
+login_student used to; 'pool' checks it on the PasswordHasher pool while the
+face is verified. Run from the project root:
+
+    python benchmarks/password_hashing.py --logins 200 --concurrency 16 --rounds 10 11 12 13
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+from flask_bcrypt import Bcrypt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import PasswordHasher, PasswordPoolBusy  # noqa: E402
+
+
+def run(logins, concurrency, login_fn):
+    rejected = 0
+    latencies = []
+
+    def one(_):
+        start = time.perf_counter()
+        try:
+            login_fn()
+        except PasswordPoolBusy:
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency in pool.map(one, range(logins)):
+            if latency is None:
+                rejected += 1
+            else:
+                latencies.append(latency)
+    wall = time.perf_counter() - start
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0.0
+    return len(latencies) / wall, p95, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--rounds', type=int, nargs='+', default=[10, 11, 12, 13])
+    parser.add_argument('--workers', type=int, default=4, help="bcrypt pool threads")
+    parser.add_argument('--max-pending', type=int, default=64)
+    parser.add_argument('--face-latency', type=float, default=50.0, help="Face verification time in ms")
+    args = parser.parse_args()
+
+    bcrypt = Bcrypt(Flask(__name__))
+    face_latency = args.face_latency / 1000
+
+    print(f"{'rounds':>6} {'hash ms':>8} {'mode':<7} {'logins/s':>9} {'p95 ms':>8} {'rejected':>9}")
+    for rounds in args.rounds:
+        hasher = PasswordHasher(bcrypt, rounds=rounds, workers=args.workers, max_pending=args.max_pending)
+        stored = hasher.hash('correct horse')
+        start = time.perf_counter()
+        bcrypt.check_password_hash(stored, 'correct horse')
+        hash_ms = (time.perf_counter() - start) * 1000
+
+        def inline():
+            bcrypt.check_password_hash(stored, 'correct horse')
+            time.sleep(face_latency)
+
+        def offloaded():
+            check = hasher.verify_async(stored, 'correct horse')
+            time.sleep(face_latency)
+            check.result()
+
+        for mode, login_fn in (('inline', inline), ('pool', offloaded)):
+            throughput, p95, rejected = run(args.logins, args.concurrency, login_fn)
+            print(f"{rounds:>6} {hash_ms:>8.1f} {mode:<7} {throughput:>9.1f} {p95:>8.1f} {rejected:>9}")
+
+
+if __name__ == '__main__':
+    main()
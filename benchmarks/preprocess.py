@@ -0,0 +1,72 @@
+"""Per-image latency and peak allocation of the face image decode path.
+
+Compares the original path (split the data URL, full-size decode) with the
+reduced-scale decode into a reused letterbox buffer, for synthetic 720p and
+1080p webcam frames. Run from the project root:
+
+    python benchmarks/preprocess.py --runs 50
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocess import decode_data_url, decode_reduced, Letterbox  # noqa: E402
+
+
+def synthetic_data_url(width, height, seed=0):
+    """A JPEG data URL with some structure, so it compresses like a real frame"""
+    rng = np.random.default_rng(seed)
+    img = cv2.resize(rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8), (width, height))
+    _, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 92])
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer).decode('ascii')
+
+
+def original(image_data):
+    image_data = image_data.split(',')[1]
+    image_bytes = base64.b64decode(image_data)
+    np_arr = np.frombuffer(image_bytes, np.uint8)
+    return cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+
+
+def optimized(image_data, letterbox=Letterbox(640)):
+    return letterbox(decode_reduced(decode_data_url(image_data), 640))[0]
+
+
+def measure(fn, image_data, runs):
+    fn(image_data)  # Warm up buffers and caches
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn(image_data)
+    latency = (time.perf_counter() - start) / runs
+
+    tracemalloc.start()
+    fn(image_data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return latency, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'input':<8} {'path':<10} {'latency (ms)':>12} {'peak alloc (MB)':>16}")
+    for label, width, height in (('720p', 1280, 720), ('1080p', 1920, 1080)):
+        image_data = synthetic_data_url(width, height)
+        for name, fn in (('original', original), ('optimized', optimized)):
+            latency, peak = measure(fn, image_data, args.runs)
+            print(f"{label:<8} {name:<10} {latency * 1000:>12.2f} {peak / 2**20:>16.2f}")
+
+
+if __name__ == '__main__':
+    main()
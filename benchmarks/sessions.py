@@ -0,0 +1,105 @@
+"""Per-request overhead of each session backend.
+
+Runs a minimal Flask app with the same session payload the attendance app
+uses (student id, username, current room) and times a request that only
+reads the session and one that changes it, for each backend and for no
+session access at all. Run from the project root:
+
+    python benchmarks/sessions.py --requests 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from flask import Flask, session
+from sqlalchemy import Column, DateTime, Index, LargeBinary, MetaData, String, Table, create_engine, event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_store import create_session_interface  # noqa: E402
+
+
+def make_app(backend, workdir):
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'benchmark'
+
+    if backend == 'filesystem':
+        from flask_session import Session
+        app.config['SESSION_TYPE'] = 'filesystem'
+        app.config['SESSION_FILE_DIR'] = os.path.join(workdir, 'flask_session')
+        Session(app)
+    elif backend != 'none':
+        metadata = MetaData()
+        table = Table(
+            'web_session', metadata,
+            Column('id', String(64), primary_key=True),
+            Column('data', LargeBinary, nullable=False),
+            Column('expires_at', DateTime, nullable=False),
+            Index('ix_web_session_expires', 'expires_at')
+        )
+        engine = create_engine('sqlite:///' + os.path.join(workdir, f'{backend}.db'))
+
+        @event.listens_for(engine, 'connect')
+        def sqlite_pragmas(dbapi_connection, connection_record):
+            # The app's SQLite settings (see database.py)
+            dbapi_connection.execute('PRAGMA journal_mode=WAL')
+            dbapi_connection.execute('PRAGMA synchronous=NORMAL')
+
+        metadata.create_all(engine)
+        app.session_interface = create_session_interface(backend, engine_fn=lambda: engine, table=table)
+
+    @app.route('/login')
+    def login():
+        if backend != 'none':
+            session['student_id'] = 42
+            session['student_username'] = 'student042'
+            session['student_number'] = 'S00042'
+            session['current_room'] = 'CS101'
+        return 'ok'
+
+    @app.route('/read')
+    def read():
+        if backend != 'none':
+            return str(session.get('student_id'))
+        return 'ok'
+
+    @app.route('/write')
+    def write():
+        if backend != 'none':
+            session['current_room'] = 'CS102' if session.get('current_room') == 'CS101' else 'CS101'
+        return 'ok'
+
+    return app
+
+
+def per_request_us(client, path, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get(path)
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--backends', nargs='+', default=['none', 'cookie', 'memory', 'sql', 'filesystem'])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='session_bench_')
+    results = {}
+    for backend in args.backends:
+        client = make_app(backend, workdir).test_client()
+        client.get('/login')
+        client.get('/read')  # Warm up
+        results[backend] = (per_request_us(client, '/read', args.requests), per_request_us(client, '/write', args.requests))
+
+    baseline_read, baseline_write = results.get('none', (0.0, 0.0))
+    print(f"{'backend':<12} {'read us':>9} {'+overhead':>10} {'write us':>9} {'+overhead':>10}")
+    for backend, (read, write) in results.items():
+        print(f"{backend:<12} {read:>9.1f} {read - baseline_read:>10.1f} {write:>9.1f} {write - baseline_write:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Time and peak memory to import app.py, with lazy vs preloaded face models.
+
+Run from the project root:
+
+    python benchmarks/startup.py --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_APP = """
+import resource, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+heavy = [name for name in ('ultralytics', 'torch', 'cv2') if name in sys.modules]
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+print(elapsed, rss, ','.join(heavy) or '-')
+"""
+
+
+def measure(preload, runs):
+    env = dict(os.environ, PRELOAD_FACE_MODELS='1' if preload else '0')
+    times, rss = [], []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', IMPORT_APP], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(output[0]))
+        rss.append(int(output[1]) / 1024)
+        heavy = output[2]
+    return statistics.median(times), statistics.median(rss), heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10} {'import (s)':>10} {'peak RSS (MB)':>14}  heavy modules loaded")
+    for label, preload in (('lazy', False), ('preload', True)):
+        elapsed, rss, heavy = measure(preload, args.runs)
+        print(f"{label:<10} {elapsed:>10.2f} {rss:>14.0f}  {heavy}")
+
+
+if __name__ == '__main__':
+    main()
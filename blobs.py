@@ -0,0 +1,71 @@
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+
+import numpy as np
+
+
+class BlobStore:
+    """Immutable blobs on disk, addressed by the SHA-256 of their content.
+
+    A blob with digest 'ab12...' lives at root/ab/ab12..., so identical
+    content is stored once and a digest always names the same bytes. Writes
+    go to a temporary file that is renamed into place, so readers never see a
+    partial blob and concurrent writers of the same content are harmless.
+    With use_mmap, reads map the file instead of copying it into memory.
+    """
+
+    def __init__(self, root, use_mmap=False):
+        self.root = root
+        self.use_mmap = use_mmap
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def __contains__(self, digest):
+        return bool(digest) and os.path.exists(self.path(digest))
+
+    def put(self, data):
+        """Store bytes, returns their hex digest"""
+        data = bytes(data)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return digest
+
+    def get(self, digest):
+        """The blob's bytes (a read-only mmap with use_mmap), None if it does not exist"""
+        try:
+            with open(self.path(digest), 'rb') as f:
+                if self.use_mmap:
+                    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put_array(self, array):
+        """Store a numpy array in .npy format, returns its digest"""
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(array), allow_pickle=False)
+        return self.put(buffer.getvalue())
+
+    def get_array(self, digest):
+        """Load an array stored with put_array, None if it does not exist"""
+        path = self.path(digest)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode='r' if self.use_mmap else None, allow_pickle=False)
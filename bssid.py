@@ -0,0 +1,169 @@
+import os
+import platform
+import re
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+from forksafe import PerProcess
+
+BSSID_NOT_FOUND = "BSSID not found"
+
+
+class SubprocessBackend:
+    """Parses the output of `netsh wlan show interfaces` or `iwconfig`"""
+
+    name = 'subprocess'
+
+    def read(self):
+        try:
+            if platform.system() == "Windows":
+                result = subprocess.run(["netsh", "wlan", "show", "interfaces"], capture_output=True, text=True)
+                match = re.search(r'BSSID\s*:\s*([0-9A-Fa-f:-]+)', result.stdout)
+            else:  # Linux / macOS
+                result = subprocess.run(["iwconfig"], capture_output=True, text=True)
+                match = re.search(r'Access Point: ([0-9A-Fa-f:]+)', result.stdout)
+
+            return match.group(1) if match else BSSID_NOT_FOUND
+        except Exception as e:
+            return str(e)
+
+
+class WirelessExtensionsBackend:
+    """Reads the BSSID in-process on Linux, without spawning a subprocess.
+
+    Wireless interfaces are listed in /proc/net/wireless and the access point
+    address is fetched with the same SIOCGIWAP ioctl iwconfig uses.
+    """
+
+    name = 'wext'
+
+    SIOCGIWAP = 0x8B15
+    PROC_WIRELESS = '/proc/net/wireless'
+
+    @classmethod
+    def available(cls):
+        return os.path.exists(cls.PROC_WIRELESS)
+
+    def interfaces(self):
+        with open(self.PROC_WIRELESS) as f:
+            # The first two lines are headers, then one "iface: ..." line per interface
+            return [line.split(':', 1)[0].strip() for line in f.readlines()[2:] if ':' in line]
+
+    def read(self):
+        try:
+            import fcntl
+
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                for interface in self.interfaces():
+                    # struct iwreq: 16 byte interface name followed by a sockaddr
+                    request = struct.pack('16s16s', interface.encode()[:15], b'\0' * 16)
+                    try:
+                        response = fcntl.ioctl(sock.fileno(), self.SIOCGIWAP, request)
+                    except OSError:
+                        continue
+
+                    address = response[18:24]
+                    if any(address) and address != b'\xff' * 6:
+                        return ':'.join(f'{byte:02X}' for byte in address)
+
+            return BSSID_NOT_FOUND
+        except Exception as e:
+            return str(e)
+
+
+class StubBackend:
+    """Returns a fixed BSSID, for tests and benchmarks"""
+
+    name = 'stub'
+
+    def __init__(self, bssid='00:11:22:33:44:55'):
+        self.bssid = bssid
+
+    def read(self):
+        return self.bssid
+
+
+def create_backend(name):
+    if name == 'auto':
+        name = 'wext' if WirelessExtensionsBackend.available() else 'subprocess'
+    if name == 'wext':
+        return WirelessExtensionsBackend()
+    if name == 'stub':
+        return StubBackend()
+    if name == 'subprocess':
+        return SubprocessBackend()
+    raise ValueError(f"Unknown BSSID backend: {name}")
+
+
+class BSSIDProvider:
+    """Caches the connected BSSID and keeps it fresh from a background thread.
+
+    Requests read the cached value. The backend is only called on the request
+    path when nothing has been read yet or the cache is older than ttl (for
+    example because the refresher was never started or has stalled).
+    """
+
+    def __init__(self, backend, ttl=10.0, refresh_interval=2.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._value = None
+        self._updated_at = None
+        self._refresher = PerProcess(self._start_refresher)
+        self._stop = threading.Event()
+
+    def get(self):
+        """Return the cached BSSID, refreshing it inline only if it has expired"""
+        if self._updated_at is None or self.staleness() > self.ttl:
+            return self.refresh()
+        return self._value
+
+    def refresh(self):
+        value = self.backend.read()
+        with self._lock:
+            self._value = value
+            self._updated_at = time.monotonic()
+        return value
+
+    def staleness(self):
+        """Seconds since the cached value was read, None if it never was"""
+        if self._updated_at is None:
+            return None
+        return time.monotonic() - self._updated_at
+
+    def start(self):
+        """Start the background refresher thread"""
+        self._refresher.get()
+
+    def stop(self):
+        self._stop.set()
+        refresher = self._refresher.clear()
+        if refresher is not None:
+            refresher.join()
+
+    def _start_refresher(self):
+        self._stop.clear()
+        refresher = threading.Thread(target=self._refresh_loop, name='bssid-refresh', daemon=True)
+        refresher.start()
+        return refresher
+
+    def status(self):
+        staleness = self.staleness()
+        return {
+            'backend': self.backend.name,
+            'bssid': self._value,
+            'staleness': None if staleness is None else round(staleness, 3),
+            'ttl': self.ttl,
+            'refresh_interval': self.refresh_interval,
+            'refresher_running': self._refresher.current() is not None
+        }
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.refresh_interval)
@@ -0,0 +1,112 @@
+import sqlite3
+
+from sqlalchemy import Date, Float, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+# Local development: one SQLite file per bind, as the app has always used
+SQLITE_DATABASE_URI = 'sqlite:///default.db'
+SQLITE_BINDS = {
+    'admin_db': 'sqlite:///admin.db',
+    'student_db': 'sqlite:///students.db',
+    'room_db': 'sqlite:///rooms.db'  # New database for room management
+}
+
+_single_database = False
+_sqlite_pragmas = {}
+
+
+def configure_database(app):
+    """Set the SQLAlchemy URIs and engine options from DATABASE_URL.
+
+    Without DATABASE_URL the per-bind SQLite files are used, tuned for
+    concurrent workers (WAL, busy timeout, synchronous setting). With it, every
+    model lives in that one database (e.g. PostgreSQL) behind a single
+    connection pool, so cross-table queries can be joins.
+    """
+    global _single_database
+
+    url = app.config.get('DATABASE_URL')
+    if url:
+        # Heroku-style URLs use the scheme name SQLAlchemy dropped
+        if url.startswith('postgres://'):
+            url = 'postgresql://' + url[len('postgres://'):]
+        _single_database = True
+        app.config['SQLALCHEMY_DATABASE_URI'] = url
+        app.config['SQLALCHEMY_BINDS'] = {}
+        if not url.startswith('sqlite'):
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+                'pool_size': app.config['DB_POOL_SIZE'],
+                'max_overflow': app.config['DB_MAX_OVERFLOW'],
+                'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+                'pool_recycle': app.config['DB_POOL_RECYCLE'],
+                'pool_pre_ping': True
+            }
+    else:
+        _single_database = False
+        app.config['SQLALCHEMY_DATABASE_URI'] = SQLITE_DATABASE_URI
+        app.config['SQLALCHEMY_BINDS'] = dict(SQLITE_BINDS)
+
+    _sqlite_pragmas.update({
+        'journal_mode': app.config['SQLITE_JOURNAL_MODE'],
+        'synchronous': app.config['SQLITE_SYNCHRONOUS'],
+        'busy_timeout': app.config['SQLITE_BUSY_TIMEOUT']
+    })
+
+
+def bind_key(name):
+    """Bind key for a model, None when everything lives in one database"""
+    return None if _single_database else name
+
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma, value in _sqlite_pragmas.items():
+        cursor.execute(f'PRAGMA {pragma}={value}')
+    cursor.close()
+
+
+class minutes_between(FunctionElement):
+    """Minutes from the first datetime expression to the second, as a float"""
+    type = Float()
+    name = 'minutes_between'
+    inherit_cache = True
+
+
+@compiles(minutes_between)
+def _minutes_between(element, compiler, **kw):
+    start, end = (compiler.process(clause, **kw) for clause in element.clauses)
+    return f'EXTRACT(EPOCH FROM ({end} - {start})) / 60.0'
+
+
+@compiles(minutes_between, 'sqlite')
+def _minutes_between_sqlite(element, compiler, **kw):
+    start, end = (compiler.process(clause, **kw) for clause in element.clauses)
+    return f'(julianday({end}) - julianday({start})) * 1440.0'
+
+
+@compiles(minutes_between, 'mysql')
+def _minutes_between_mysql(element, compiler, **kw):
+    start, end = (compiler.process(clause, **kw) for clause in element.clauses)
+    return f'TIMESTAMPDIFF(MICROSECOND, {start}, {end}) / 60000000.0'
+
+
+class day_of(FunctionElement):
+    """Calendar date of a datetime expression"""
+    type = Date()
+    name = 'day_of'
+    inherit_cache = True
+
+
+@compiles(day_of)
+def _day_of(element, compiler, **kw):
+    return f'CAST({compiler.process(element.clauses, **kw)} AS DATE)'
+
+
+@compiles(day_of, 'sqlite')
+def _day_of_sqlite(element, compiler, **kw):
+    return f'date({compiler.process(element.clauses, **kw)})'
@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import SimpleNamespace
+
+from forksafe import PerProcess
+
+
+class FaceInferenceEngine:
+    """Collects concurrent face detection requests into micro-batches.
+
+    Request handlers call detect() and block until their image has been run
+    through the model. A dispatcher thread drains the queue into batches of at
+    most max_batch_size images, waiting up to max_wait seconds for a batch to
+    fill, and hands each batch to a worker pool. When nothing else is queued
+    the image is dispatched on its own straight away, so light traffic does
+    not pay the batching delay.
+    """
+
+    def __init__(self, model_fn, max_batch_size=16, max_wait=0.01, workers=2):
+        self.model_fn = model_fn  # Callable taking a list of images, returning one result per image
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.workers = workers
+
+        self._lock = threading.Lock()
+        self._runtime = PerProcess(self._start)
+
+        self._batch_sizes = Counter()
+        self._images = 0
+        self._in_flight = 0
+
+    def detect(self, img, timeout=None):
+        """Run detection on a single image and return its result"""
+        return self.detect_many([img], timeout=timeout)[0]
+
+    def detect_many(self, images, timeout=None):
+        """Run detection on several images, batched with whatever else is queued"""
+        queue_ = self._runtime.get().queue
+        futures = []
+        for img in images:
+            future = Future()
+            queue_.put((img, future))
+            futures.append(future)
+        return [future.result(timeout=timeout) for future in futures]
+
+    def stats(self):
+        """Queue depth and batch-size histogram for monitoring"""
+        runtime = self._runtime.current()
+        with self._lock:
+            return {
+                'queue_depth': runtime.queue.qsize() if runtime else 0,
+                'in_flight_batches': self._in_flight,
+                'images': self._images,
+                'batches': sum(self._batch_sizes.values()),
+                'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+                'max_batch_size': self.max_batch_size,
+                'max_wait': self.max_wait,
+                'workers': self.workers
+            }
+
+    def _start(self):
+        runtime = SimpleNamespace(
+            queue=queue.Queue(),
+            executor=ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='face-infer'),
+            # One slot per worker: while all workers are busy, requests pile up in
+            # the queue and get picked up together as the next batch
+            slots=threading.Semaphore(self.workers)
+        )
+        threading.Thread(target=self._dispatch_loop, args=(runtime,), name='face-dispatch', daemon=True).start()
+        return runtime
+
+    def _dispatch_loop(self, runtime):
+        while True:
+            runtime.slots.acquire()
+            batch = [runtime.queue.get()]
+
+            # Only wait for more images if others are already queued behind this one
+            if not runtime.queue.empty():
+                deadline = time.monotonic() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(runtime.queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+
+            with self._lock:
+                self._in_flight += 1
+                self._batch_sizes[len(batch)] += 1
+                self._images += len(batch)
+            runtime.executor.submit(self._run_batch, runtime, batch)
+
+    def _run_batch(self, runtime, batch):
+        try:
+            images = [img for img, _ in batch]
+            try:
+                results = list(self.model_fn(images))
+                if len(results) != len(batch):
+                    # Left unresolved, the callers of the missing images would wait forever
+                    raise RuntimeError(f"Face model returned {len(results)} results for {len(batch)} images")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            runtime.slots.release()
@@ -0,0 +1,316 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the app runs as a single process
+    fcntl = None
+
+
+class FaceEmbedder:
+    """Turns face crops into fixed-length, L2-normalised float32 embeddings.
+
+    Uses facenet-pytorch's InceptionResnetV1. The model is loaded on the first
+    call so importing this module stays cheap.
+    """
+
+    size = 160
+    dim = 512
+
+    def __init__(self, pretrained='vggface2'):
+        self.pretrained = pretrained
+        self._model = None
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()  # One forward pass at a time on the shared model
+
+    def load(self):
+        with self._lock:
+            if self._model is None:
+                from facenet_pytorch import InceptionResnetV1
+                self._model = InceptionResnetV1(pretrained=self.pretrained).eval()
+        return self._model
+
+    def embed(self, faces):
+        """Embed a list of BGR face crops, returns an (N, dim) float32 array"""
+        import cv2
+        import torch
+
+        model = self.load()
+        batch = np.empty((len(faces), self.size, self.size, 3), dtype=np.float32)
+        for i, face in enumerate(faces):
+            rgb = cv2.cvtColor(cv2.resize(face, (self.size, self.size)), cv2.COLOR_BGR2RGB)
+            batch[i] = rgb
+        batch = (batch - 127.5) / 128.0
+
+        with self._run_lock, torch.no_grad():
+            embeddings = model(torch.from_numpy(batch).permute(0, 3, 1, 2)).numpy()
+        return normalize(embeddings)
+
+
+def normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def average_templates(templates):
+    """One enrolled embedding from several templates of the same face, the normalised mean"""
+    templates = np.asarray(templates, dtype=np.float32)
+    return normalize(normalize(templates.reshape(-1, templates.shape[-1])).mean(axis=0))
+
+
+class FaceEmbeddingIndex:
+    """In-memory matrix of enrolled face embeddings keyed by student_id.
+
+    Row i of the matrix belongs to student_ids[i]. On disk the index is a
+    plain .npy file (loaded with mmap_mode so a restart does not read or decode
+    anything up front) next to a JSON list of student ids, plus a log of the
+    embeddings added since. Every worker process appends its enrollments to the
+    log under a file lock and reads the other workers' from it, so no worker
+    overwrites another's and an enrollment writes one record, not the index.
+    The log is folded into the .npy file once it holds compact_after records.
+
+    In memory the rows from the .npy file stay mapped (copy-on-write, so a
+    re-enrollment only copies the page it changes) and rows added since go to
+    a second array with spare capacity that grows geometrically, so adding
+    an embedding writes one row instead of copying the whole matrix.
+    """
+
+    id_bytes = 64  # Student ids are stored NUL-padded in each log record
+
+    def __init__(self, path, dim=FaceEmbedder.dim, compact_after=1000):
+        self.path = path  # Base path, '.npy', '.json', '.log' and '.lock' are appended
+        self.dim = dim
+        self.compact_after = compact_after
+        self.record = np.dtype([('student_id', f'S{self.id_bytes}'), ('embedding', '<f4', (dim,))])
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._student_ids = []
+        self._base = np.empty((0, dim), dtype=np.float32)  # Rows of the .npy file, memory-mapped
+        self._added = np.empty((0, dim), dtype=np.float32)  # Rows added since, then spare capacity
+        self._base_version = None  # Identity of the .npy file last loaded
+        self._log_offset = 0  # Bytes of the log applied so far
+
+    def __len__(self):
+        return len(self._student_ids)
+
+    def __contains__(self, student_id):
+        return student_id in self._rows
+
+    @property
+    def student_ids(self):
+        return list(self._student_ids)
+
+    @property
+    def matrix(self):
+        """A copy of every enrolled embedding, row i belongs to student_ids[i]"""
+        with self._lock:
+            return np.concatenate([self._base, self._added[:self._added_count()]])
+
+    def load(self):
+        """Load the persisted index, returns False if there is nothing usable on disk"""
+        with self._lock, self._file_lock(fcntl.LOCK_SH if fcntl else None):
+            return self._load()
+
+    def refresh(self):
+        """Pick up embeddings other processes added since the last load, returns True if any.
+
+        Costs two stat calls when nothing changed, and otherwise reads only the
+        new log records unless the log was compacted in the meantime.
+        """
+        if self._base_version == self._version(self.path + '.npy') and self._log_size() == self._log_offset:
+            return False
+        with self._lock, self._file_lock(fcntl.LOCK_SH if fcntl else None):
+            return self._catch_up()
+
+    def get(self, student_id):
+        with self._lock:
+            row = self._rows.get(student_id)
+            return None if row is None else np.array(self._row(row))
+
+    def add(self, student_id, embedding):
+        """Add or replace one student's embedding and persist it"""
+        self.add_many([student_id], np.asarray(embedding).reshape(1, self.dim))
+
+    def add_many(self, student_ids, embeddings):
+        """Add or replace several embeddings, persisted with a single log append"""
+        records = np.empty(len(student_ids), dtype=self.record)
+        records['student_id'] = [self._encode(student_id) for student_id in student_ids]
+        records['embedding'] = normalize(embeddings).reshape(len(student_ids), self.dim)
+
+        with self._lock, self._file_lock(fcntl.LOCK_EX if fcntl else None):
+            self._catch_up()
+            self._append(records)
+            self._apply(records)
+            if (self._log_offset // self.record.itemsize) >= self.compact_after:
+                self._compact()
+
+    def similarity(self, student_id, embedding):
+        """Cosine similarity between a probe embedding and a student's enrolled one"""
+        enrolled = self.get(student_id)
+        if enrolled is None:
+            return None
+        return float(np.dot(enrolled, normalize(embedding).reshape(self.dim)))
+
+    def match(self, embeddings, threshold):
+        """Identify each probe embedding against every enrolled student at once.
+
+        Returns one (student_id, similarity) per probe, with student_id None when
+        the best match is below threshold. A student matched by several probes
+        keeps only the most similar one.
+        """
+        embeddings = normalize(embeddings).reshape(-1, self.dim)
+        matches = [(None, 0.0)] * len(embeddings)
+        if not len(self._student_ids) or not len(embeddings):
+            return matches
+
+        with self._lock:
+            student_ids = list(self._student_ids)
+            scores = np.hstack([embeddings @ self._base.T, embeddings @ self._added[:self._added_count()].T])
+
+        best_rows = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(embeddings)), best_rows]
+
+        # Visit the most confident probes first so duplicates keep the best one
+        claimed = set()
+        for probe in np.argsort(-best_scores):
+            row, score = int(best_rows[probe]), float(best_scores[probe])
+            if score < threshold or row in claimed:
+                continue
+            claimed.add(row)
+            matches[probe] = (student_ids[row], score)
+        return matches
+
+    def _encode(self, student_id):
+        encoded = student_id.encode('utf-8')
+        if len(encoded) > self.id_bytes or b'\0' in encoded:
+            raise ValueError(f"Student id {student_id!r} cannot be stored in the face index")
+        return encoded
+
+    @contextmanager
+    def _file_lock(self, operation):
+        """Hold an flock on the lock file, a no-op where fcntl is unavailable"""
+        if operation is None:
+            yield
+            return
+        self._make_directory()
+        with open(self.path + '.lock', 'a') as f:
+            fcntl.flock(f.fileno(), operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _make_directory(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _version(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _log_size(self):
+        try:
+            return os.path.getsize(self.path + '.log')
+        except OSError:
+            return 0
+
+    def _load(self):
+        """Read the .npy file and the whole log, the caller holds both locks"""
+        self._student_ids = []
+        self._rows = {}
+        self._base = np.empty((0, self.dim), dtype=np.float32)
+        self._added = np.empty((0, self.dim), dtype=np.float32)
+        self._base_version = self._version(self.path + '.npy')
+        self._log_offset = 0
+
+        loaded = False
+        try:
+            with open(self.path + '.json') as f:
+                student_ids = json.load(f)
+            matrix = np.load(self.path + '.npy', mmap_mode='c')
+        except (OSError, ValueError):
+            pass
+        else:
+            if matrix.ndim == 2 and matrix.shape[1] == self.dim and matrix.shape[0] >= len(student_ids):
+                self._student_ids = list(student_ids)
+                self._rows = {student_id: i for i, student_id in enumerate(self._student_ids)}
+                self._base = matrix[:len(self._student_ids)]
+                loaded = True
+
+        return self._read_log() or loaded
+
+    def _catch_up(self):
+        """Apply what other processes wrote since the last load, the caller holds both locks"""
+        if self._base_version != self._version(self.path + '.npy'):
+            self._load()
+            return True
+        return self._read_log()
+
+    def _read_log(self):
+        """Apply the log records past _log_offset, returns True if there were any"""
+        size = self._log_size()
+        size -= size % self.record.itemsize  # A record cut short by a crash is ignored
+        if size <= self._log_offset:
+            return False
+        with open(self.path + '.log', 'rb') as f:
+            f.seek(self._log_offset)
+            records = np.fromfile(f, dtype=self.record, count=(size - self._log_offset) // self.record.itemsize)
+        self._apply(records)
+        self._log_offset = size
+        return True
+
+    def _apply(self, records):
+        for student_id, embedding in zip(records['student_id'], records['embedding']):
+            student_id = student_id.decode('utf-8')
+            row = self._rows.get(student_id)
+            if row is None:
+                row = len(self._student_ids)
+                self._reserve(self._added_count() + 1)
+                self._student_ids.append(student_id)
+                self._rows[student_id] = row
+            self._row(row)[:] = embedding
+
+    def _row(self, row):
+        return self._base[row] if row < len(self._base) else self._added[row - len(self._base)]
+
+    def _added_count(self):
+        return len(self._student_ids) - len(self._base)
+
+    def _reserve(self, count):
+        """Make room for count added rows, doubling the capacity when it runs out"""
+        if count <= len(self._added):
+            return
+        added = np.empty((max(count, 2 * len(self._added), 64), self.dim), dtype=np.float32)
+        added[:self._added_count()] = self._added[:self._added_count()]
+        self._added = added
+
+    def _append(self, records):
+        self._make_directory()
+        with open(self.path + '.log', 'ab') as f:
+            # Drop a record cut short by a crash so the new ones stay aligned
+            size = f.seek(0, os.SEEK_END)
+            if size % self.record.itemsize:
+                f.truncate(size - size % self.record.itemsize)
+            f.write(records.tobytes())
+        self._log_offset = self._log_size()
+
+    def _compact(self):
+        """Fold the log into the .npy file, the caller holds the exclusive file lock"""
+        # Write to temporary files and swap them in so readers never see a partial index
+        np.save(self.path + '.tmp.npy', np.concatenate([self._base, self._added[:self._added_count()]]))
+        with open(self.path + '.tmp.json', 'w') as f:
+            json.dump(self._student_ids, f)
+        os.replace(self.path + '.tmp.json', self.path + '.json')
+        os.replace(self.path + '.tmp.npy', self.path + '.npy')
+        os.truncate(self.path + '.log', 0)
+        self._load()  # Map the new file instead of keeping the rows in memory
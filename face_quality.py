@@ -0,0 +1,74 @@
+import numpy as np
+
+SIZE = 64  # Crops are scored at this size, so scores do not depend on how large the face is
+
+
+def grey_stack(crops, size=SIZE):
+    """Stack BGR face crops into one (N, size, size) float32 greyscale array"""
+    import cv2
+
+    stack = np.empty((len(crops), size, size), dtype=np.float32)
+    for i, crop in enumerate(crops):
+        grey = crop if crop.ndim == 2 else cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        stack[i] = cv2.resize(grey, (size, size), interpolation=cv2.INTER_AREA)
+    return stack
+
+
+def sharpness(stack):
+    """Variance of the Laplacian of each crop, low for blurred or out of focus faces"""
+    laplacian = (
+        4 * stack[:, 1:-1, 1:-1]
+        - stack[:, :-2, 1:-1] - stack[:, 2:, 1:-1]
+        - stack[:, 1:-1, :-2] - stack[:, 1:-1, 2:]
+    )
+    return laplacian.reshape(len(stack), -1).var(axis=1)
+
+
+def symmetry(stack):
+    """1 minus the mean left/right difference of each crop (0 to 1), drops as the head turns"""
+    return 1.0 - np.abs(stack - stack[:, :, ::-1]).reshape(len(stack), -1).mean(axis=1) / 255.0
+
+
+class QualityGate:
+    """Decides which face crops of an enrollment burst are good enough to keep.
+
+    A crop must be large enough, sharp, and roughly frontal: a turned head
+    gives a narrow box and a face that no longer mirrors itself. Every crop of
+    a burst is scored at once on stacked arrays.
+    """
+
+    def __init__(self, min_sharpness=50.0, min_symmetry=0.85, min_size=80, aspect_range=(0.6, 1.0)):
+        self.min_sharpness = min_sharpness
+        self.min_symmetry = min_symmetry
+        self.min_size = min_size  # Pixels, shorter side of the face box
+        self.aspect_range = aspect_range  # Box width / height of a frontal face
+
+    def score(self, crops, boxes):
+        """Scores of each crop as a dict of arrays, boxes are the crops' x1, y1, x2, y2"""
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        widths = boxes[:, 2] - boxes[:, 0]
+        heights = boxes[:, 3] - boxes[:, 1]
+        stack = grey_stack(crops)
+        return {
+            'sharpness': sharpness(stack),
+            'symmetry': symmetry(stack),
+            'size': np.minimum(widths, heights),
+            'aspect': widths / np.maximum(heights, 1.0)
+        }
+
+    def check(self, scores):
+        """Mask of accepted crops and the reason each other crop was rejected"""
+        low, high = self.aspect_range
+        checks = [
+            (scores['size'] >= self.min_size, 'face too small'),
+            (scores['sharpness'] >= self.min_sharpness, 'blurred'),
+            ((scores['aspect'] >= low) & (scores['aspect'] <= high), 'face turned away'),
+            (scores['symmetry'] >= self.min_symmetry, 'face turned away'),
+        ]
+        accepted = np.ones(len(scores['size']), dtype=bool)
+        reasons = [None] * len(accepted)
+        for passed, reason in checks:
+            for i in np.flatnonzero(accepted & ~passed):
+                reasons[i] = reason
+            accepted &= passed
+        return accepted, reasons
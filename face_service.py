@@ -0,0 +1,238 @@
+"""Out-of-process face inference service.
+
+One process owns the YOLOv8 detector and the embedding model and serves
+detection and embedding requests over a Unix domain socket. Image pixels are
+not sent over the socket: the client writes them into a shared memory block
+and the service reads them in place, so only a small JSON header crosses the
+socket.
+
+Start it with:
+
+    python face_service.py --socket /tmp/face_service.sock [--runtime onnx --int8]
+
+and point the web app at it with FACE_SERVICE_SOCKET=/tmp/face_service.sock.
+"""
+import argparse
+import atexit
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import model_export
+
+_LENGTH = struct.Struct('!I')
+
+
+def _send(sock, header, payload=b''):
+    data = json.dumps(header).encode('utf-8')
+    sock.sendall(_LENGTH.pack(len(data)) + data + payload)
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if not count:
+            raise ConnectionError("Face service connection closed")
+        received += count
+    return buffer
+
+
+def _recv(sock):
+    size, = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    return json.loads(_recv_exact(sock, size))
+
+
+def _release(block):
+    block.close()
+    try:
+        block.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _attach(name):
+    """Open a shared memory block created by another process without taking ownership of it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 has no track argument, stop the resource tracker from unlinking it on exit
+        from multiprocessing import resource_tracker
+        block = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(block._name, 'shared_memory')
+        return block
+
+
+class FaceServiceClient:
+    """Sends detection and embedding requests to a running face service.
+
+    Each thread keeps its own connection and its own shared memory block,
+    grown as needed and reused between requests.
+    """
+
+    def __init__(self, socket_path, timeout=30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._blocks = set()
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def detect(self, images):
+        """Face boxes for each image, as (N, 4) float32 arrays of x1, y1, x2, y2"""
+        header, _ = self._request('detect', images)
+        return [np.asarray(boxes, dtype=np.float32).reshape(-1, 4) for boxes in header['boxes']]
+
+    def embed(self, faces):
+        """Embeddings for a list of face crops, as an (N, dim) float32 array"""
+        header, payload = self._request('embed', faces)
+        return np.frombuffer(payload, dtype=np.float32).reshape(header['shape'])
+
+    def close(self):
+        with self._lock:
+            blocks, self._blocks = self._blocks, set()
+        for block in blocks:
+            _release(block)
+
+    def _connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _block(self, size):
+        block = getattr(self._local, 'block', None)
+        if block is None or block.size < size:
+            if block is not None:
+                with self._lock:
+                    self._blocks.discard(block)
+                _release(block)
+            # Grow to the next power of two so a slightly larger frame doesn't reallocate
+            block = shared_memory.SharedMemory(create=True, size=1 << max(size - 1, 1).bit_length())
+            with self._lock:
+                self._blocks.add(block)
+            self._local.block = block
+        return block
+
+    def _request(self, op, images):
+        images = [np.ascontiguousarray(image, dtype=np.uint8) for image in images]
+        block = self._block(sum(image.nbytes for image in images))
+
+        layout = []
+        offset = 0
+        for image in images:
+            np.ndarray(image.shape, dtype=np.uint8, buffer=block.buf, offset=offset)[...] = image
+            layout.append([offset, *image.shape])
+            offset += image.nbytes
+
+        try:
+            sock = self._connection()
+            _send(sock, {'op': op, 'shm': block.name, 'images': layout})
+            header = _recv(sock)
+            payload = _recv_exact(sock, header.get('payload', 0))
+        except (OSError, ConnectionError):
+            # Drop the connection so the next request reconnects
+            sock = getattr(self._local, 'sock', None)
+            self._local.sock = None
+            if sock is not None:
+                sock.close()
+            raise
+
+        if not header.get('ok'):
+            raise RuntimeError(header.get('error', "Face service error"))
+        return header, payload
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        block = None
+        try:
+            while True:
+                try:
+                    request = _recv(self.request)
+                except ConnectionError:
+                    return
+
+                try:
+                    # Clients reuse one block per connection, re-attach only when it was replaced
+                    if block is None or block.name != request['shm']:
+                        if block is not None:
+                            block.close()
+                        block = _attach(request['shm'])
+                    images = [
+                        np.ndarray(tuple(shape), dtype=np.uint8, buffer=block.buf, offset=offset)
+                        for offset, *shape in request['images']
+                    ]
+                    header, payload = self.server.run(request['op'], images)
+                    del images  # Views into the block must go before it can be closed
+                except Exception as e:
+                    header, payload = {'ok': False, 'error': str(e)}, b''
+
+                header['payload'] = len(payload)
+                _send(self.request, header, payload)
+        finally:
+            if block is not None:
+                block.close()
+
+
+class FaceService(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves face detection and embedding, one thread per client connection"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, model_path='yolov8n.pt', runtime='pytorch', int8=False):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _Handler)
+
+        from face_index import FaceEmbedder
+
+        self.detector = model_export.load_detector(model_path, runtime, int8)
+        self.embedder = FaceEmbedder()
+        self.embedder.load()
+        self._model_lock = threading.Lock()
+
+    def run(self, op, images):
+        with self._model_lock:
+            if op == 'detect':
+                results = self.detector(images)
+                return {'ok': True, 'boxes': [result.boxes.xyxy.cpu().numpy().tolist() for result in results]}, b''
+            if op == 'embed':
+                embeddings = np.ascontiguousarray(self.embedder.embed(images), dtype=np.float32)
+                return {'ok': True, 'shape': list(embeddings.shape)}, embeddings.tobytes()
+        raise ValueError(f"Unknown operation: {op}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face detection and embedding service")
+    parser.add_argument('--socket', default='/tmp/face_service.sock', help="Unix domain socket path")
+    parser.add_argument('--model', default='yolov8n.pt', help="YOLOv8 face model weights")
+    # Same settings, and defaults, as the web app's FACE_MODEL_RUNTIME / FACE_MODEL_INT8
+    parser.add_argument('--runtime', choices=model_export.RUNTIMES, default=os.environ.get('FACE_MODEL_RUNTIME', 'pytorch'),
+                        help="Run the detector exported for this runtime (see `flask export-face-model`)")
+    parser.add_argument('--int8', action='store_true', default=os.environ.get('FACE_MODEL_INT8') == '1',
+                        help="Use the int8 quantized export")
+    args = parser.parse_args()
+
+    with FaceService(args.socket, args.model, args.runtime, args.int8) as server:
+        print(f"Face service listening on {args.socket}")
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(args.socket)
+
+
+if __name__ == '__main__':
+    main()
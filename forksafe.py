@@ -0,0 +1,57 @@
+import os
+import threading
+import weakref
+
+_instances = weakref.WeakSet()
+
+
+class PerProcess:
+    """A value built by factory() on first use in each process.
+
+    Background threads and thread pools do not survive fork: a forked child
+    inherits the objects but none of the running threads. get() builds a
+    fresh value the first time it is called in a new process, so a child
+    starts its own threads only if and when it uses them; nothing is started
+    on fork itself. The guarding lock is replaced in the child, in case
+    another thread of the parent held it at the moment of the fork.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._pid = None
+        self._value = None
+        _instances.add(self)
+
+    def get(self):
+        if self._pid == os.getpid():
+            return self._value
+        with self._lock:
+            if self._pid != os.getpid():
+                self._value = self.factory()
+                self._pid = os.getpid()
+            return self._value
+
+    def current(self):
+        """The value built in this process, None if get() was not called here yet"""
+        return self._value if self._pid == os.getpid() else None
+
+    def clear(self):
+        """Forget the value, returns it if it was built in this process"""
+        with self._lock:
+            value = self.current()
+            self._pid = None
+            self._value = None
+            return value
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+
+def _after_fork_in_child():
+    for instance in list(_instances):
+        instance._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,34 @@
+import gc
+import os
+import tempfile
+
+bind = '0.0.0.0:5000'
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+worker_class = 'gthread'
+threads = 8  # Roster streams hold a thread each, at most ROSTER_MAX_STREAMS of them
+certfile = 'cert.pem'
+keyfile = 'key.pem'
+
+# Import app.py once in the master and fork workers from it. With
+# PRELOAD_FACE_MODELS=1 the face models are loaded there too, so every
+# worker shares one copy of the weights copy-on-write.
+preload_app = True
+
+# The master only imports the app. Background threads and database connections
+# belong to the workers, which start and open their own after fork
+os.environ.setdefault('START_BACKGROUND_SERVICES', '0')
+
+# Each worker keeps its own metrics and profiler state, shared with the others
+# through files in this directory so any worker can answer /metrics for all
+os.environ.setdefault('METRICS_DIR', tempfile.mkdtemp(prefix='attendance-metrics-'))
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the garbage collector's reach, so
+    # collections in the workers don't write to (and so copy) the shared pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import after_fork
+    after_fork()
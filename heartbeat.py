@@ -0,0 +1,85 @@
+import threading
+
+from forksafe import PerProcess
+
+
+class HeartbeatBuffer:
+    """Keeps the latest heartbeat per student in memory and writes them behind.
+
+    touch() only updates a dict. A background thread hands everything that
+    changed since the last flush to flush_fn in one call every interval
+    seconds, so a crash loses at most one interval of heartbeats.
+    """
+
+    def __init__(self, flush_fn, interval=10.0):
+        self.flush_fn = flush_fn  # Called with a dict of {student pk: last active datetime}
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        self._last_seen = {}
+        self._pending = {}
+        self._flusher = PerProcess(self._start_flusher)
+        self._stop = threading.Event()
+        self.flushes = 0
+        self.rows_flushed = 0
+
+    def touch(self, student_pk, when):
+        with self._lock:
+            self._last_seen[student_pk] = when
+            self._pending[student_pk] = when
+
+    def discard(self, student_pk):
+        """Forget a student, e.g. on logout, so a later flush does not write them back"""
+        with self._lock:
+            self._last_seen.pop(student_pk, None)
+            self._pending.pop(student_pk, None)
+
+    def last_seen(self, student_pk, stored=None):
+        """Latest known heartbeat, falling back to the value stored in the database"""
+        buffered = self._last_seen.get(student_pk)
+        if buffered is None or (stored is not None and stored > buffered):
+            return stored
+        return buffered
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            self.flush_fn(pending)
+        except Exception:
+            # Put the heartbeats back unless newer ones arrived meanwhile
+            with self._lock:
+                for student_pk, when in pending.items():
+                    self._pending.setdefault(student_pk, when)
+            raise
+
+        with self._lock:
+            self.flushes += 1
+            self.rows_flushed += len(pending)
+        return len(pending)
+
+    def start(self):
+        self._flusher.get()
+
+    def stop(self):
+        self._stop.set()
+        flusher = self._flusher.clear()
+        if flusher is not None:
+            flusher.join()
+        self.flush()
+
+    def _start_flusher(self):
+        self._stop.clear()
+        flusher = threading.Thread(target=self._flush_loop, name='heartbeat-flush', daemon=True)
+        flusher.start()
+        return flusher
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                pass  # Retried on the next interval
@@ -0,0 +1,343 @@
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from forksafe import PerProcess
+
+# Seconds, from a fast cache hit up to a face inference stuck behind a full queue
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in labels)
+    return '{' + pairs + '}'
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedDirectory:
+    """JSON files through which the worker processes of one server share metrics.
+
+    Each process writes files named after its own pid, swapping them in
+    atomically, and whichever worker serves a scrape reads everyone's. This
+    plays the part of prometheus_client's multiprocess mode for the
+    histograms here.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, name, data):
+        target = os.path.join(self.path, name + '.json')
+        temporary = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(data, f)
+        os.replace(temporary, target)
+
+    def read(self, name):
+        try:
+            with open(os.path.join(self.path, name + '.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def read_all(self, kind):
+        """{pid: data} of every process that wrote a '<kind>_<pid>' file"""
+        found = {}
+        for filename in os.listdir(self.path):
+            stem, extension = os.path.splitext(filename)
+            prefix, _, pid = stem.rpartition('_')
+            if extension == '.json' and prefix == kind and pid.isdigit():
+                data = self.read(stem)
+                if data is not None:
+                    found[int(pid)] = data
+        return found
+
+
+class Histogram:
+    """Cumulative latency histogram per label set, in the Prometheus text format"""
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, seconds, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += seconds
+
+    def series(self):
+        with self._lock:
+            return {labels: list(values) for labels, values in self._series.items()}
+
+    def dump(self):
+        """The series as JSON-ready [label values, values] pairs"""
+        return [[list(labels), values] for labels, values in self.series().items()]
+
+    @staticmethod
+    def merge(dumps):
+        """Add up the series of several dump()s, e.g. one from each worker"""
+        merged = {}
+        for dump in dumps:
+            for labels, values in dump:
+                labels = tuple(labels)
+                if labels in merged:
+                    merged[labels] = [a + b for a, b in zip(merged[labels], values)]
+                else:
+                    merged[labels] = list(values)
+        return merged
+
+    def render(self, series=None):
+        """The histogram in text format, of this process's series unless others are given"""
+        if series is None:
+            series = self.series()
+
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for label_values, values in sorted(series.items()):
+            labels = list(zip(self.label_names, label_values))
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", bound)])} {count}')
+            lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", "+Inf")])} {values[-2]}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {values[-2]}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {values[-1]:.6f}')
+        return '\n'.join(lines)
+
+
+class Metrics:
+    """Request and per-stage timings for the hot paths.
+
+    begin_request()/end_request() bracket each request and remember its route
+    for the current thread, so stage() timings made anywhere inside it are
+    labelled with the route they belong to.
+
+    With a SharedDirectory each process publishes its numbers there at most
+    every publish_interval seconds, and render() adds up the histograms of
+    every worker, past and present, and reports each live worker's gauges
+    labelled with its pid.
+    """
+
+    def __init__(self, profiler=None, directory=None, publish_interval=1.0):
+        self.profiler = profiler
+        self.directory = directory
+        self.publish_interval = publish_interval
+        self.requests = Histogram(
+            'attendance_request_seconds', 'Request latency by route', ('route', 'method', 'status')
+        )
+        self.stages = Histogram(
+            'attendance_stage_seconds', 'Time spent in each stage of a request', ('route', 'stage')
+        )
+        self._local = threading.local()
+        self._gauges = []  # (name, help, callable returning a number)
+        self._publish_lock = threading.Lock()
+        self._published = 0.0
+
+    def gauge(self, name, help_text, fn):
+        """Report fn() as a gauge on every scrape"""
+        self._gauges.append((name, help_text, fn))
+
+    def begin_request(self, route):
+        self._local.route = route
+        self._local.start = time.perf_counter()
+        if self.profiler:
+            self.profiler.begin()
+
+    def end_request(self, method, status):
+        start = getattr(self._local, 'start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        route = self._local.route
+        self._local.start = None
+        self._local.route = None
+        self.requests.observe(elapsed, route, method, status)
+        if self.profiler:
+            self.profiler.end(route, elapsed)
+        self.publish()
+
+    def publish(self, force=False):
+        """Write this process's numbers to the shared directory, if one is set"""
+        if self.directory is None:
+            return
+        if not force and time.monotonic() - self._published < self.publish_interval:
+            return
+        # One thread writes at a time, the others skip this round unless forced
+        if not self._publish_lock.acquire(blocking=force):
+            return
+        try:
+            self._published = time.monotonic()
+            self.directory.write(f'metrics_{os.getpid()}', {
+                'requests': self.requests.dump(),
+                'stages': self.stages.dump(),
+                'gauges': self._gauge_values()
+            })
+        finally:
+            self._publish_lock.release()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.observe(time.perf_counter() - start, getattr(self._local, 'route', None) or 'none', name)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        if self.directory is None:
+            parts = [self.requests.render(), self.stages.render()]
+            values = self._gauge_values()
+            for name, help_text, _ in self._gauges:
+                value = values.get(name)
+                if value is not None:
+                    parts.append(f'# HELP {name} {help_text}\n# TYPE {name} gauge\n{name} {value}')
+            return '\n'.join(parts) + '\n'
+
+        self.publish(force=True)
+        workers = self.directory.read_all('metrics')
+        parts = [
+            self.requests.render(Histogram.merge(worker['requests'] for worker in workers.values())),
+            self.stages.render(Histogram.merge(worker['stages'] for worker in workers.values()))
+        ]
+        live = {pid: worker['gauges'] for pid, worker in workers.items() if process_alive(pid)}
+        for name, help_text, _ in self._gauges:
+            lines = [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+            for pid, gauges in sorted(live.items()):
+                if name in gauges:
+                    lines.append(f'{name}{_format_labels([("pid", pid)])} {gauges[name]}')
+            parts.append('\n'.join(lines))
+        return '\n'.join(parts) + '\n'
+
+    def _gauge_values(self):
+        values = {}
+        for name, _, fn in self._gauges:
+            try:
+                values[name] = float(fn())
+            except Exception:
+                continue
+        return values
+
+
+class SlowRequestProfiler:
+    """Samples the stacks of in-flight requests and keeps the ones that turned out slow.
+
+    While enabled, a background thread wakes every interval seconds and
+    records the stack of each thread that is serving a request. When a request
+    finishes after more than threshold seconds its samples are kept, folded
+    into one line per distinct stack with a sample count (the input format of
+    flame graph tools). Faster requests' samples are thrown away.
+
+    With a SharedDirectory, set_enabled() switches the profiler in every
+    worker (each picks the switch up within a second) and all_profiles()
+    lists the slow requests of all of them.
+    """
+
+    def __init__(self, enabled=False, threshold=1.0, interval=0.005, keep=50, directory=None):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.interval = interval
+        self.keep = keep
+        self.profiles = deque(maxlen=keep)
+        self.directory = directory
+        self._switch_checked = 0.0
+
+        self._lock = threading.Lock()
+        self._samples = {}  # thread ident -> Counter of folded stacks
+        self._sampler = PerProcess(self._start_sampler)
+
+    def begin(self):
+        if self.directory is not None and time.monotonic() - self._switch_checked > 1.0:
+            self._switch_checked = time.monotonic()
+            switch = self.directory.read('profiler')
+            if switch is not None and switch['enabled'] != self.enabled:
+                self._set_enabled(switch['enabled'])
+        if not self.enabled:
+            return
+        self._sampler.get()
+        with self._lock:
+            self._samples[threading.get_ident()] = Counter()
+
+    def end(self, route, seconds):
+        with self._lock:
+            samples = self._samples.pop(threading.get_ident(), None)
+        if samples is None or seconds < self.threshold:
+            return
+        self.profiles.append({
+            'route': route,
+            'seconds': round(seconds, 4),
+            'finished': time.time(),
+            'samples': sum(samples.values()),
+            'stacks': [f'{stack} {count}' for stack, count in samples.most_common()]
+        })
+        if self.directory is not None:
+            self.directory.write(f'profiles_{os.getpid()}', list(self.profiles))
+
+    def all_profiles(self):
+        """The kept slow requests, of every worker when there is a shared directory"""
+        if self.directory is None:
+            return list(self.profiles)
+        profiles = [profile for worker in self.directory.read_all('profiles').values() for profile in worker]
+        return sorted(profiles, key=lambda profile: profile['finished'])[-self.keep:]
+
+    def set_enabled(self, enabled):
+        if self.directory is not None:
+            self.directory.write('profiler', {'enabled': enabled})
+        self._set_enabled(enabled)
+
+    def _set_enabled(self, enabled):
+        self.enabled = enabled
+        if not enabled:
+            with self._lock:
+                self._samples.clear()
+
+    def _start_sampler(self):
+        sampler = threading.Thread(target=self._sample_loop, name='slow-request-profiler', daemon=True)
+        sampler.start()
+        return sampler
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.interval)
+            if not self.enabled:
+                continue
+            with self._lock:
+                idents = list(self._samples)
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = ';'.join(f'{entry.name} ({os.path.basename(entry.filename)}:{entry.lineno})'
+                                 for entry in traceback.extract_stack(frame))
+                with self._lock:
+                    samples = self._samples.get(ident)
+                    if samples is not None:
+                        samples[stack] += 1
+            del frames
@@ -0,0 +1,135 @@
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from database import bind_key as resolve_bind_key
+
+
+def add_column(table, column, ddl):
+    """Migration step adding a column unless create_all already made it"""
+    def step(connection):
+        if column not in {c['name'] for c in inspect(connection).get_columns(table)}:
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+    return step
+
+
+# Ordered schema migrations: (id, bind key, steps). A step is an SQL statement
+# or a function of the connection. Applied ids are recorded in a
+# schema_migrations table in each database, so every migration runs once per
+# database. Never edit a migration that has shipped, add a new one.
+MIGRATIONS = [
+    ('0001_attendance_indexes', 'student_db', [
+        'CREATE INDEX IF NOT EXISTS ix_attendance_student_login ON attendance_record (student_id, login_time)',
+        'CREATE INDEX IF NOT EXISTS ix_attendance_room_login ON attendance_record (room_code, login_time)',
+        'CREATE INDEX IF NOT EXISTS ix_attendance_login ON attendance_record (login_time)',
+    ]),
+    ('0002_student_presence_index', 'student_db', [
+        'CREATE INDEX IF NOT EXISTS ix_student_logged_in_room ON student (is_logged_in, current_room)',
+    ]),
+    ('0003_room_admin_index', 'room_db', [
+        'CREATE INDEX IF NOT EXISTS ix_room_admin ON room (admin_id)',
+    ]),
+    ('0004_student_idle_index', 'student_db', [
+        'CREATE INDEX IF NOT EXISTS ix_student_logged_in_active ON student (is_logged_in, last_active_time)',
+    ]),
+    ('0005_student_face_blobs', 'student_db', [
+        add_column('student', 'face_hash', 'VARCHAR(64)'),
+        add_column('student', 'embedding_hash', 'VARCHAR(64)'),
+    ]),
+    ('0006_attendance_rollup_backfill', 'student_db', [
+        'INSERT INTO attendance_rollup (student_id, room_code, day, sessions, minutes, first_login, last_logout) '
+        "SELECT student_id, COALESCE(room_code, ''), DATE(login_time), COUNT(*), COALESCE(SUM(active_duration), 0), "
+        'MIN(login_time), MAX(logout_time) FROM attendance_record WHERE login_time IS NOT NULL '
+        "GROUP BY student_id, COALESCE(room_code, ''), DATE(login_time)",
+    ]),
+]
+
+# Queries on the request path, each must be answered from an index, for
+# `flask check-query-plans` against a deployed database:
+# (description, bind key, SQL, parameters)
+# tests/test_query_plans.py checks the statements the app really sends.
+HOT_QUERIES = [
+    ('close_room: end the sessions of everyone in a room', 'student_db',
+     'UPDATE student SET is_logged_in = 0, current_room = NULL, login_time = NULL, last_active_time = NULL '
+     'WHERE is_logged_in = 1 AND current_room IN (:room) AND (login_time IS NULL OR login_time <= :now)',
+     {'room': 'R1', 'now': '2025-01-01 09:00:00'}),
+    ('heartbeat flush: last active time of a logged-in student', 'student_db',
+     'UPDATE student SET last_active_time = :seen WHERE id = :student_pk AND is_logged_in = 1',
+     {'seen': '2025-01-01 09:00:00', 'student_pk': 1}),
+    ('presence resync: logged-in students', 'student_db',
+     'SELECT id, current_room, student_id, username, login_time, last_active_time FROM student '
+     'WHERE is_logged_in = 1', {}),
+    ('reaper: idle sessions', 'student_db',
+     'SELECT id FROM student WHERE is_logged_in = 1 AND last_active_time < :cutoff ORDER BY last_active_time LIMIT 500',
+     {'cutoff': '2025-01-01 09:00:00'}),
+    ('login_student: student by username', 'student_db',
+     'SELECT * FROM student WHERE username = :username', {'username': 'u'}),
+    ('download_student_attendance: one student\'s history', 'student_db',
+     'SELECT * FROM attendance_record WHERE student_id = :student_id ORDER BY login_time', {'student_id': 'S1'}),
+    ('download_attendance: room over a date range', 'student_db',
+     'SELECT * FROM attendance_record WHERE room_code = :room AND login_time >= :start AND login_time < :end '
+     'ORDER BY login_time', {'room': 'R1', 'start': '2025-01-01', 'end': '2025-02-01'}),
+    ('download_attendance: date range', 'student_db',
+     'SELECT * FROM attendance_record WHERE login_time >= :start AND login_time < :end ORDER BY login_time',
+     {'start': '2025-01-01', 'end': '2025-02-01'}),
+    ('analytics: rollups of a room over a date range', 'student_db',
+     'SELECT * FROM attendance_rollup WHERE room_code = :room AND day >= :start AND day < :end',
+     {'room': 'R1', 'start': '2025-01-01', 'end': '2025-02-01'}),
+    ('analytics: rollups over a date range', 'student_db',
+     'SELECT * FROM attendance_rollup WHERE day >= :start AND day < :end', {'start': '2025-01-01', 'end': '2025-02-01'}),
+    ('sql sessions: session by id', None,
+     'SELECT data, expires_at FROM web_session WHERE id = :id', {'id': 'abc'}),
+    ('sql sessions: expired sessions to purge', None,
+     'SELECT id FROM web_session WHERE expires_at < :now LIMIT 1000', {'now': '2025-01-01 09:00:00'}),
+    ('admin_dashboard: rooms of an admin', 'room_db',
+     'SELECT * FROM room WHERE admin_id = :admin_id', {'admin_id': 1}),
+    ('login_student: active room by code', 'room_db',
+     'SELECT * FROM room WHERE room_code = :room AND active = 1', {'room': 'R1'}),
+]
+
+
+def upgrade(db):
+    """Apply pending migrations, returns the ids that were applied"""
+    applied = []
+    for bind_key in dict.fromkeys(bind_key for _, bind_key, _ in MIGRATIONS):
+        with db.get_engine(bind_key=resolve_bind_key(bind_key)).begin() as connection:
+            connection.execute(text(
+                'CREATE TABLE IF NOT EXISTS schema_migrations (id VARCHAR(100) PRIMARY KEY, applied_at TIMESTAMP)'
+            ))
+            done = {row[0] for row in connection.execute(text('SELECT id FROM schema_migrations'))}
+
+            for migration_id, migration_bind_key, statements in MIGRATIONS:
+                if migration_bind_key != bind_key or migration_id in done:
+                    continue
+                for statement in statements:
+                    if callable(statement):
+                        statement(connection)
+                    else:
+                        connection.execute(text(statement))
+                connection.execute(
+                    text('INSERT INTO schema_migrations (id, applied_at) VALUES (:id, :applied_at)'),
+                    {'id': migration_id, 'applied_at': datetime.now()}
+                )
+                applied.append(migration_id)
+    return applied
+
+
+def query_plan(db, bind_key, sql, params):
+    """EXPLAIN QUERY PLAN detail lines for a query (SQLite only)"""
+    with db.get_engine(bind_key=resolve_bind_key(bind_key)).connect() as connection:
+        return [row[-1] for row in connection.execute(text('EXPLAIN QUERY PLAN ' + sql), params)]
+
+
+def full_table_scans(plan):
+    """The lines of a query plan that read a whole table"""
+    return [line for line in plan if line.startswith('SCAN') and 'INDEX' not in line]
+
+
+def unindexed_queries(db):
+    """Hot queries whose plan contains a full table scan, as (description, plan) pairs"""
+    failures = []
+    for description, bind_key, sql, params in HOT_QUERIES:
+        plan = query_plan(db, bind_key, sql, params)
+        if full_table_scans(plan):
+            failures.append((description, plan))
+    return failures
@@ -0,0 +1,121 @@
+"""Export the YOLOv8 face detector to CPU inference runtimes.
+
+Supported runtimes are 'pytorch' (the .pt weights as-is), 'onnx' (ONNX
+Runtime) and 'openvino'. Both exported runtimes can be quantized to int8,
+calibrated on enrolled face crops. Ultralytics loads every exported format
+through the same YOLO() API, so the app only has to pick the file.
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+RUNTIMES = ('pytorch', 'onnx', 'openvino')
+
+
+def model_path(weights, runtime, int8=False):
+    """Where the exported model for a runtime lives, next to the .pt weights"""
+    stem = os.path.splitext(weights)[0]
+    if runtime == 'pytorch':
+        return weights
+    if runtime == 'onnx':
+        return f'{stem}.int8.onnx' if int8 else f'{stem}.onnx'
+    if runtime == 'openvino':
+        # Ultralytics' own naming for OpenVINO exports
+        return f'{stem}_int8_openvino_model' if int8 else f'{stem}_openvino_model'
+    raise ValueError(f"Unknown face model runtime: {runtime}")
+
+
+def load_detector(weights, runtime, int8=False):
+    """The YOLO detector for a runtime, the exported model must exist for anything but 'pytorch'"""
+    path = model_path(weights, runtime, int8)
+    if runtime != 'pytorch' and not os.path.exists(path):
+        raise RuntimeError(f"Face model {path} not found, run `flask export-face-model`")
+
+    from ultralytics import YOLO
+    return YOLO(path, task='detect')
+
+
+def _letterbox_input(img, imgsz):
+    """Model input tensor (1, 3, imgsz, imgsz) float32 the way ultralytics prepares it"""
+    import cv2
+
+    height, width = img.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - new_height) // 2, (imgsz - new_width) // 2
+    canvas[top:top + new_height, left:left + new_width] = cv2.resize(img, (new_width, new_height))
+    rgb = canvas[:, :, ::-1].transpose(2, 0, 1)
+    return np.ascontiguousarray(rgb, dtype=np.float32)[None] / 255.0
+
+
+def _quantize_onnx(onnx_path, output_path, calibration_images, imgsz):
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    import onnxruntime
+
+    input_name = onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class FaceCrops(CalibrationDataReader):
+        def __init__(self):
+            self._images = iter(calibration_images)
+
+        def get_next(self):
+            img = next(self._images, None)
+            return None if img is None else {input_name: _letterbox_input(img, imgsz)}
+
+    quantize_static(
+        onnx_path, output_path, FaceCrops(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True
+    )
+    return output_path
+
+
+def _calibration_dataset(directory, calibration_images):
+    """Write images as an unlabelled ultralytics dataset, returns its YAML path"""
+    import cv2
+
+    image_dir = os.path.join(directory, 'images')
+    os.makedirs(image_dir)
+    for i, img in enumerate(calibration_images):
+        cv2.imwrite(os.path.join(image_dir, f'{i:05}.jpg'), img)
+
+    yaml_path = os.path.join(directory, 'calibration.yaml')
+    with open(yaml_path, 'w') as f:
+        f.write(f"path: {directory}\ntrain: images\nval: images\nnames:\n  0: face\n")
+    return yaml_path
+
+
+def export_model(weights, runtime, int8=False, calibration_images=(), imgsz=640):
+    """Export weights to runtime, returns the path the app will load"""
+    from ultralytics import YOLO
+
+    if runtime == 'pytorch':
+        return weights
+    target = model_path(weights, runtime, int8)
+    calibration_images = list(calibration_images)
+    if int8 and not calibration_images:
+        raise ValueError("int8 quantization needs calibration images (enrolled faces)")
+
+    if runtime == 'onnx':
+        # Dynamic batch so the inference engine can send micro-batches
+        onnx_path = YOLO(weights).export(format='onnx', imgsz=imgsz, dynamic=True)
+        if int8:
+            return _quantize_onnx(onnx_path, target, calibration_images, imgsz)
+        return onnx_path
+
+    if runtime == 'openvino':
+        if not int8:
+            return YOLO(weights).export(format='openvino', imgsz=imgsz)
+        directory = tempfile.mkdtemp(prefix='face_calibration_')
+        try:
+            data = _calibration_dataset(directory, calibration_images)
+            return YOLO(weights).export(format='openvino', imgsz=imgsz, int8=True, data=data)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    raise ValueError(f"Unknown face model runtime: {runtime}")
@@ -0,0 +1,77 @@
+import threading
+
+from pools import BoundedExecutor, PoolBusy
+
+
+class PasswordPoolBusy(PoolBusy):
+    """Too many password hashes are already queued, the caller should retry later"""
+
+
+def hash_rounds(hashed):
+    """The cost factor of a bcrypt hash ($2b$12$...), None if it is not one"""
+    parts = hashed.split('$') if hashed else []
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    """Runs bcrypt on a small worker pool instead of the request thread.
+
+    bcrypt releases the GIL, so hashes on the pool run in parallel with the
+    request's other work (face inference) and with each other. At most
+    max_pending hashes may be queued or running; beyond that submissions
+    raise PasswordPoolBusy instead of piling up behind a login storm.
+
+    New hashes use the configured rounds. verify() reports when a stored hash
+    uses different rounds, so the caller can rehash it while it has the
+    plaintext password.
+    """
+
+    def __init__(self, bcrypt, rounds=12, workers=4, max_pending=64):
+        self.bcrypt = bcrypt  # Flask-Bcrypt extension
+        self.rounds = rounds
+
+        self._pool = BoundedExecutor(workers, max_pending, name='bcrypt', busy_error=PasswordPoolBusy,
+                                     busy_message="Too many logins at once, please try again")
+        self._lock = threading.Lock()
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+
+    def hash_async(self, password):
+        return self._pool.submit(self._hash, password)
+
+    def hash(self, password):
+        return self.hash_async(password).result()
+
+    def verify_async(self, hashed, password):
+        """Future of (matches, needs_rehash)"""
+        return self._pool.submit(self._verify, hashed, password)
+
+    def needs_rehash(self, hashed):
+        return hash_rounds(hashed) != self.rounds
+
+    def rehash(self, password):
+        """New hash at the configured rounds for a password that was just verified"""
+        with self._lock:
+            self.rehashed += 1
+        return self.hash(password)
+
+    def stats(self):
+        stats = self._pool.stats()
+        with self._lock:
+            stats.update(rounds=self.rounds, hashed=self.hashed, verified=self.verified, rehashed=self.rehashed)
+        return stats
+
+    def _hash(self, password):
+        hashed = self.bcrypt.generate_password_hash(password, self.rounds).decode('utf-8')
+        with self._lock:
+            self.hashed += 1
+        return hashed
+
+    def _verify(self, hashed, password):
+        matches = self.bcrypt.check_password_hash(hashed, password)
+        with self._lock:
+            self.verified += 1
+        return matches, matches and self.needs_rehash(hashed)
@@ -0,0 +1,76 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from forksafe import PerProcess
+
+
+class PoolBusy(Exception):
+    """The pool already has max_pending tasks queued or running"""
+
+
+class BoundedExecutor:
+    """A thread pool that refuses work instead of queueing without limit.
+
+    At most max_pending tasks may be queued or running; submit() raises
+    PoolBusy beyond that, so callers can turn requests away early during a
+    storm. The threads are started on first use in each process.
+    """
+
+    def __init__(self, workers=4, max_pending=64, name='pool', busy_error=PoolBusy,
+                 busy_message="Too many requests at once, please try again"):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.name = name
+        self.busy_error = busy_error  # PoolBusy or a subclass, raised when full
+        self.busy_message = busy_message
+
+        self._lock = threading.Lock()
+        self._executor = PerProcess(
+            lambda: ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise self.busy_error(self.busy_message)
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.get().submit(self._timed, fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'busy_seconds': round(self.busy_seconds, 3)
+            }
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def _timed(self, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.busy_seconds += time.perf_counter() - start
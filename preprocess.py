@@ -0,0 +1,93 @@
+import base64
+import binascii
+import threading
+
+import numpy as np
+
+# JPEG start-of-frame markers carry the image size (C4, C8 and CC are other segments)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def decode_data_url(image_data):
+    """Bytes of a base64 data URL, without splitting the (large) string into parts"""
+    start = image_data.find(',') + 1
+    if not start:
+        raise ValueError("Invalid image data")
+    try:
+        return base64.b64decode(memoryview(image_data.encode('ascii'))[start:])
+    except (UnicodeEncodeError, binascii.Error):
+        raise ValueError("Invalid image data")
+
+
+def jpeg_size(data):
+    """(width, height) from a JPEG header, None if it can't be read"""
+    if data[:2] != b'\xff\xd8':
+        return None
+    position = 2
+    while position + 9 < len(data):
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker in _SOF_MARKERS:
+            height = int.from_bytes(data[position + 5:position + 7], 'big')
+            width = int.from_bytes(data[position + 7:position + 9], 'big')
+            return width, height
+        position += 2 + int.from_bytes(data[position + 2:position + 4], 'big')
+    return None
+
+
+def decode_reduced(data, min_side):
+    """Decode a JPEG at 1/2, 1/4 or 1/8 scale when it stays at least min_side on its long side.
+
+    libjpeg scales during the inverse DCT, so this is cheaper than decoding at
+    full size and resizing afterwards. Other formats are decoded at full size.
+    """
+    import cv2
+
+    buffer = np.frombuffer(data, np.uint8)
+    size = jpeg_size(data)
+    if size:
+        long_side = max(size)
+        for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)):
+            if long_side // factor >= min_side:
+                return cv2.imdecode(buffer, flag)
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+class Letterbox:
+    """Fits images into a square model input, reusing preallocated buffers.
+
+    Each thread gets its own canvas, so the returned array is only valid until
+    the same thread letterboxes the next image.
+    """
+
+    def __init__(self, size=640, fill=114):
+        self.size = size
+        self.fill = fill
+        self._local = threading.local()
+
+    def _buffers(self):
+        if not hasattr(self._local, 'canvas'):
+            self._local.canvas = np.empty((self.size, self.size, 3), dtype=np.uint8)
+            self._local.resized = {}
+        return self._local.canvas, self._local.resized
+
+    def __call__(self, img):
+        """Return the letterboxed image and the scale applied to the original"""
+        import cv2
+
+        canvas, resized = self._buffers()
+        height, width = img.shape[:2]
+        scale = min(self.size / height, self.size / width, 1.0)  # Never upscale
+        new_width, new_height = int(round(width * scale)), int(round(height * scale))
+
+        if scale != 1.0:
+            # Webcam frames all have the same size, so this buffer is reused every time
+            target = resized.get((new_height, new_width))
+            if target is None:
+                target = resized[(new_height, new_width)] = np.empty((new_height, new_width, 3), dtype=np.uint8)
+            img = cv2.resize(img, (new_width, new_height), dst=target, interpolation=cv2.INTER_LINEAR)
+
+        canvas[...] = self.fill
+        canvas[:new_height, :new_width] = img
+        return canvas, scale
@@ -0,0 +1,192 @@
+import threading
+import time
+
+from forksafe import PerProcess
+
+
+class PresenceRegistry:
+    """Who is logged into which room, kept in memory for the admin dashboards.
+
+    Rooms are indexed by admin and students by room, so a dashboard reads
+    only the rooms it owns without touching the database. The routes that
+    change presence (login, logout, heartbeats, creating and closing rooms)
+    update it after they commit.
+
+    Every worker process has its own registry. rebuild() reloads it from the
+    database, at startup and then every resync_interval seconds so that
+    changes made by other workers show up. Changes made locally while a
+    rebuild is reading the database are replayed on top of what it read.
+    """
+
+    def __init__(self, load_fn, resync_interval=30.0):
+        self.load_fn = load_fn  # Returns (rooms as (room_code, admin_id) pairs, students as entry dicts)
+        self.resync_interval = resync_interval
+
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._admin_rooms = {}  # admin id -> set of room codes
+        self._rooms = {}  # room code -> {student pk: entry}
+        self._room_of = {}  # student pk -> room code
+        self._journal = None  # Changes made during a rebuild, None when none is running
+        self._resyncer = PerProcess(self._start_resyncer)
+        self.rebuilds = 0
+
+    def add_room(self, admin_id, room_code):
+        self._change('_add_room', admin_id, room_code)
+
+    def remove_room(self, room_code):
+        """Drop a room and everyone in it"""
+        self._change('_remove_room', room_code)
+
+    def join(self, room_code, student_pk, student_id, username, login_time, last_seen=None):
+        entry = {'student_id': student_id, 'username': username, 'login_time': login_time, 'last_seen': last_seen or login_time}
+        self._change('_join', room_code, student_pk, entry)
+
+    def leave(self, student_pk):
+        self._change('_leave', student_pk)
+
+    def touch(self, student_pk, when):
+        """Record a heartbeat, returns the previous one (None for students not in a room)"""
+        with self._lock:
+            room_code = self._room_of.get(student_pk)
+            if room_code is None:
+                return None
+            entry = self._rooms[room_code][student_pk]
+            last_seen = entry['last_seen']
+            if last_seen is None or when > last_seen:
+                entry['last_seen'] = when
+            return last_seen
+
+    def room_codes(self, admin_id):
+        with self._lock:
+            return sorted(self._admin_rooms.get(admin_id, ()))
+
+    def students(self, room_codes):
+        """Copies of the entries of everyone in the given rooms, with their room and pk added"""
+        with self._lock:
+            return [
+                dict(entry, room=room_code, pk=student_pk)
+                for room_code in room_codes
+                for student_pk, entry in self._rooms.get(room_code, {}).items()
+            ]
+
+    def snapshot(self):
+        """Comparable state: ({admin id: room codes}, {student pk: (room code, student id)})"""
+        with self._lock:
+            rooms = {admin_id: set(codes) for admin_id, codes in self._admin_rooms.items() if codes}
+            students = {
+                student_pk: (room_code, self._rooms[room_code][student_pk]['student_id'])
+                for student_pk, room_code in self._room_of.items()
+            }
+            return rooms, students
+
+    def rebuild(self):
+        with self._rebuild_lock:
+            with self._lock:
+                self._journal = []
+            try:
+                rooms, students = self.load_fn()
+            except Exception:
+                with self._lock:
+                    self._journal = None
+                raise
+
+            state = ({}, {}, {})
+            for room_code, admin_id in rooms:
+                self._add_room(state, admin_id, room_code)
+            for entry in students:
+                entry = dict(entry)
+                room_code, student_pk = entry.pop('room'), entry.pop('pk')
+                # Students left behind in a room that no longer exists are not present anywhere
+                if room_code in state[1]:
+                    self._join(state, room_code, student_pk, entry)
+
+            with self._lock:
+                for change, args in self._journal:
+                    getattr(self, change)(state, *args)
+                self._journal = None
+
+                # Heartbeats seen by this worker may be newer than the flushed ones
+                _, new_rooms, new_room_of = state
+                for student_pk, room_code in new_room_of.items():
+                    if self._room_of.get(student_pk) == room_code:
+                        seen = self._rooms[room_code][student_pk]['last_seen']
+                        entry = new_rooms[room_code][student_pk]
+                        if seen and (entry['last_seen'] is None or seen > entry['last_seen']):
+                            entry['last_seen'] = seen
+
+                self._admin_rooms, self._rooms, self._room_of = state
+                self.rebuilds += 1
+
+    def start(self):
+        """Resync from the database every resync_interval seconds in the background"""
+        if self.resync_interval:
+            self._resyncer.get()
+
+    def _start_resyncer(self):
+        resyncer = threading.Thread(target=self._resync_loop, name='presence-resync', daemon=True)
+        resyncer.start()
+        return resyncer
+
+    def _resync_loop(self):
+        while True:
+            time.sleep(self.resync_interval)
+            try:
+                self.rebuild()
+            except Exception:
+                pass  # Retried on the next interval
+
+    def _change(self, change, *args):
+        with self._lock:
+            getattr(self, change)((self._admin_rooms, self._rooms, self._room_of), *args)
+            if self._journal is not None:
+                self._journal.append((change, args))
+
+    # The changes themselves, applied to an (admin rooms, rooms, room of) state
+
+    @staticmethod
+    def _add_room(state, admin_id, room_code):
+        admin_rooms, rooms, _ = state
+        admin_rooms.setdefault(admin_id, set()).add(room_code)
+        rooms.setdefault(room_code, {})
+
+    @staticmethod
+    def _remove_room(state, room_code):
+        admin_rooms, rooms, room_of = state
+        for room_codes in admin_rooms.values():
+            room_codes.discard(room_code)
+        for student_pk in rooms.pop(room_code, {}):
+            room_of.pop(student_pk, None)
+
+    @classmethod
+    def _join(cls, state, room_code, student_pk, entry):
+        _, rooms, room_of = state
+        cls._leave(state, student_pk)
+        rooms.setdefault(room_code, {})[student_pk] = dict(entry)
+        room_of[student_pk] = room_code
+
+    @staticmethod
+    def _leave(state, student_pk):
+        _, rooms, room_of = state
+        room_code = room_of.pop(student_pk, None)
+        if room_code is not None:
+            rooms.get(room_code, {}).pop(student_pk, None)
+
+
+def diff(expected, actual):
+    """Differences between two PresenceRegistry.snapshot() results, as readable strings"""
+    problems = []
+    expected_rooms, expected_students = expected
+    actual_rooms, actual_students = actual
+    for admin_id in sorted(set(expected_rooms) | set(actual_rooms), key=str):
+        missing = expected_rooms.get(admin_id, set()) - actual_rooms.get(admin_id, set())
+        extra = actual_rooms.get(admin_id, set()) - expected_rooms.get(admin_id, set())
+        if missing:
+            problems.append(f"admin {admin_id}: rooms missing {sorted(missing)}")
+        if extra:
+            problems.append(f"admin {admin_id}: unexpected rooms {sorted(extra)}")
+    for student_pk in sorted(set(expected_students) | set(actual_students), key=str):
+        if expected_students.get(student_pk) != actual_students.get(student_pk):
+            problems.append(f"student {student_pk}: expected {expected_students.get(student_pk)}, "
+                            f"found {actual_students.get(student_pk)}")
+    return problems
@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+import traceback
+from collections import Counter
+
+from forksafe import PerProcess
+
+try:
+    import fcntl
+except ImportError:  # Windows, where the app runs as a single process
+    fcntl = None
+
+
+class SessionReaper:
+    """Periodically logs out students whose heartbeats stopped.
+
+    reap_fn does the work and returns the number of sessions closed in each
+    batch. It runs every interval seconds on an APScheduler background
+    scheduler, never overlapping itself, and the run times and batch sizes
+    are kept for monitoring.
+
+    Every worker starts a reaper, but with lock_path only the process holding
+    an flock on that file reaps; the others skip their runs and take over if
+    it exits.
+    """
+
+    def __init__(self, reap_fn, interval=60, lock_path=None):
+        self.reap_fn = reap_fn
+        self.interval = interval
+        self.lock_path = lock_path
+        self._lock_file = None  # (pid, file) while this process holds lock_path
+
+        self._lock = threading.Lock()
+        self._scheduler = PerProcess(self._start_scheduler)
+
+        self.runs = 0
+        self.sessions_closed = 0
+        self.batch_sizes = Counter()
+        self.last_run = None
+        self.last_duration = None
+        self.total_duration = 0.0
+        self.last_error = None
+
+    def run(self):
+        if not self._acquire():
+            return []
+
+        start = time.perf_counter()
+        error = None
+        batches = []
+        try:
+            batches = self.reap_fn()
+        except Exception:
+            error = traceback.format_exc(limit=3)
+        duration = time.perf_counter() - start
+
+        with self._lock:
+            self.runs += 1
+            self.sessions_closed += sum(batches)
+            self.batch_sizes.update(batches)
+            self.last_run = time.time()
+            self.last_duration = duration
+            self.total_duration += duration
+            self.last_error = error
+        return batches
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self._scheduler.current() is not None,
+                'reaping': self._holds_lock(),
+                'interval': self.interval,
+                'runs': self.runs,
+                'sessions_closed': self.sessions_closed,
+                'batch_size_histogram': dict(sorted(self.batch_sizes.items())),
+                'last_run': self.last_run,
+                'last_duration': None if self.last_duration is None else round(self.last_duration, 4),
+                'total_duration': round(self.total_duration, 4),
+                'last_error': self.last_error
+            }
+
+    def start(self):
+        if self.interval:
+            self._scheduler.get()
+
+    def stop(self):
+        scheduler = self._scheduler.clear()
+        if scheduler is not None:
+            scheduler.shutdown(wait=False)
+        if self._lock_file is not None and self._lock_file[0] == os.getpid():
+            # Closing the file releases the flock, another worker takes over on its next run
+            self._lock_file[1].close()
+            self._lock_file = None
+
+    def _holds_lock(self):
+        if self.lock_path is None or fcntl is None:
+            return True
+        return self._lock_file is not None and self._lock_file[0] == os.getpid()
+
+    def _acquire(self):
+        """Whether this process is the one that reaps, taking lock_path over if no one holds it"""
+        if self._holds_lock():
+            return True
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = (os.getpid(), lock_file)
+        return True
+
+    def _start_scheduler(self):
+        from apscheduler.schedulers.background import BackgroundScheduler
+
+        scheduler = BackgroundScheduler(daemon=True)
+        scheduler.add_job(
+            self.run, 'interval', seconds=self.interval, id='reap-sessions',
+            max_instances=1, coalesce=True
+        )
+        scheduler.start()
+        return scheduler
@@ -0,0 +1,89 @@
+import json
+import queue
+import threading
+
+# Last message a dropped subscriber receives, its stream ends and the client reconnects
+RECONNECT = ('reconnect', None)
+
+
+class RosterBroadcaster:
+    """Fans out live roster changes to admin dashboards.
+
+    Each open dashboard subscribes with the room codes it owns and receives
+    only the events for those rooms. Events are small deltas (a student
+    joined, left or became active again) published by the routes that change
+    a student's presence. At most max_subscribers dashboards subscribe at a
+    time, each holds a worker thread.
+    """
+
+    def __init__(self, max_pending=1000, max_subscribers=None):
+        self.max_pending = max_pending
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers = {}  # queue -> (admin_id, set of room codes)
+
+    def subscribe(self, admin_id, room_codes):
+        """A queue of events for the rooms, None if max_subscribers are subscribed already"""
+        subscriber = queue.Queue(maxsize=self.max_pending)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers[subscriber] = (admin_id, set(room_codes))
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.pop(subscriber, None)
+
+    def watch_room(self, admin_id, room_code):
+        """Add a newly created room to all of an admin's open dashboards"""
+        with self._lock:
+            for owner, room_codes in self._subscribers.values():
+                if owner == admin_id:
+                    room_codes.add(room_code)
+
+    def set_rooms(self, subscriber, room_codes):
+        """Replace the rooms a dashboard follows, e.g. with rooms another worker created"""
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers[subscriber] = (self._subscribers[subscriber][0], set(room_codes))
+
+    def publish(self, event, room_code, **data):
+        data['room'] = room_code
+        message = (event, data)
+        with self._lock:
+            targets = [subscriber for subscriber, (_, room_codes) in self._subscribers.items() if room_code in room_codes]
+            if event == 'room_closed':
+                for subscriber in targets:
+                    self._subscribers[subscriber][1].discard(room_code)
+
+        for subscriber in targets:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # A stalled client is dropped, it gets a fresh snapshot when it reconnects
+                self.drop(subscriber)
+
+    def drop(self, subscriber):
+        """Unsubscribe and replace whatever is pending with RECONNECT"""
+        self.unsubscribe(subscriber)
+        while True:
+            try:
+                while True:
+                    subscriber.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                subscriber.put_nowait(RECONNECT)
+                return
+            except queue.Full:
+                continue  # A publish already under way refilled it
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+def format_event(event, data):
+    """Serialise an event in text/event-stream format"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
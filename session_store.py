@@ -0,0 +1,225 @@
+"""Flask session backends.
+
+'cookie'  Flask's signed cookie: the session lives in the browser, nothing is
+          stored or read on the server.
+'memory'  Server-side sessions in an in-process LRU with a TTL. Each worker
+          has its own, so only for a single worker process.
+'sql'     Server-side sessions in a database table with an indexed expiry
+          column, purged of expired rows in batches.
+
+Server-side sessions give the browser a signed random session id only.
+"""
+import abc
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+BACKENDS = ('cookie', 'memory', 'sql')
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class _ServerSideSessionInterface(SessionInterface, metaclass=abc.ABCMeta):
+    """Keeps session data on the server under a random id sent as a signed cookie"""
+
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSideSession
+
+    @abc.abstractmethod
+    def _load(self, sid, ttl):
+        """Serialized data stored under sid, None if there is none or it expired"""
+
+    @abc.abstractmethod
+    def _store(self, sid, data, ttl, new):
+        """Store serialized data under sid for ttl seconds, new when sid was just created"""
+
+    @abc.abstractmethod
+    def _delete(self, sid):
+        """Forget sid"""
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='session-id')
+
+    def open_session(self, app, request):
+        ttl = app.permanent_session_lifetime
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('ascii')
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self._load(sid, ttl)
+                if data is not None:
+                    return self.session_class(self.serializer.loads(data), sid=sid)
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified:
+                if not session.new:
+                    self._delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.modified:
+            self._store(session.sid, self.serializer.dumps(dict(session)), app.permanent_session_lifetime, session.new)
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid.encode('ascii')).decode('ascii'),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+
+
+class MemorySessionInterface(_ServerSideSessionInterface):
+    """Sessions in a least-recently-used dict, expiring ttl after their last use"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # sid -> (monotonic expiry, serialized data)
+
+    def _load(self, sid, ttl):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[sid]
+                return None
+            # Sliding expiry, touching an entry is just a dict update
+            self._entries[sid] = (now + ttl.total_seconds(), entry[1])
+            self._entries.move_to_end(sid)
+            return entry[1]
+
+    def _store(self, sid, data, ttl, new):
+        with self._lock:
+            self._entries[sid] = (time.monotonic() + ttl.total_seconds(), data)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqlSessionInterface(_ServerSideSessionInterface):
+    """Sessions in a table with (id, data, expires_at), expires_at indexed.
+
+    Reading a session is one primary key lookup. The expiry is only pushed
+    back when less than half the lifetime is left, so sessions that are read
+    but not changed cost no write on most requests. Expired rows are deleted
+    in batches at most once every purge_interval seconds.
+    """
+
+    def __init__(self, engine_fn, table, purge_interval=300, purge_batch_size=1000):
+        self.engine_fn = engine_fn  # Returns the engine holding the table
+        self.table = table
+        self.purge_interval = purge_interval
+        self.purge_batch_size = purge_batch_size
+        self._last_purge = time.monotonic()
+        self._purge_lock = threading.Lock()
+
+    def _load(self, sid, ttl):
+        from sqlalchemy import select, update
+
+        now = datetime.now()
+        with self.engine_fn().connect() as connection:
+            row = connection.execute(
+                select(self.table.c.data, self.table.c.expires_at).where(self.table.c.id == sid)
+            ).first()
+            if row is None or row.expires_at <= now:
+                return None
+            if row.expires_at - now < ttl / 2:
+                connection.execute(update(self.table).where(self.table.c.id == sid).values(expires_at=now + ttl))
+                connection.commit()
+        return row.data
+
+    def _store(self, sid, data, ttl, new):
+        from sqlalchemy import insert, update
+
+        values = {'data': data.encode('utf-8'), 'expires_at': datetime.now() + ttl}
+        with self.engine_fn().begin() as connection:
+            if new or not connection.execute(update(self.table).where(self.table.c.id == sid).values(**values)).rowcount:
+                connection.execute(insert(self.table).values(id=sid, **values))
+        self._maybe_purge()
+
+    def _delete(self, sid):
+        from sqlalchemy import delete
+
+        with self.engine_fn().begin() as connection:
+            connection.execute(delete(self.table).where(self.table.c.id == sid))
+
+    def _maybe_purge(self):
+        if time.monotonic() - self._last_purge < self.purge_interval:
+            return
+        if not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_purge = time.monotonic()
+            self.purge()
+        finally:
+            self._purge_lock.release()
+
+    def purge(self):
+        """Delete expired sessions in batches, returns how many were deleted"""
+        from sqlalchemy import delete, select
+
+        deleted = 0
+        expired = (
+            select(self.table.c.id)
+            .where(self.table.c.expires_at < datetime.now())
+            .limit(self.purge_batch_size)
+        )
+        engine = self.engine_fn()
+        while True:
+            with engine.begin() as connection:
+                sids = connection.execute(expired).scalars().all()
+                if sids:
+                    connection.execute(delete(self.table).where(self.table.c.id.in_(sids)))
+            deleted += len(sids)
+            if len(sids) < self.purge_batch_size:
+                return deleted
+
+
+def create_session_interface(backend, engine_fn=None, table=None, max_entries=10000,
+                             purge_interval=300, purge_batch_size=1000):
+    if backend == 'cookie':
+        return SecureCookieSessionInterface()
+    if backend == 'memory':
+        return MemorySessionInterface(max_entries)
+    if backend == 'sql':
+        return SqlSessionInterface(engine_fn, table, purge_interval, purge_batch_size)
+    raise ValueError(f"Unknown session backend: {backend}")
@@ -11,25 +11,6 @@ function endSession() {
     .then(data => alert(data.message))
     .then(() => location.reload());
 }
-// Update the updateStudentList function in admin-dashboard.html
-function updateStudentList() {
-    fetch("/active_students")
-    .then(response => response.json())
-    .then(data => {
-        let tableBody = document.getElementById("student-list");
-        tableBody.innerHTML = "";
-        data.forEach(student => {
-            let row = `<tr>
-                <td>${student.student_id}</td>
-                <td>${student.username}</td>
-                <td>${student.status}</td>
-                <td>${student.active_time}</td>
-            </tr>`;
-            tableBody.innerHTML += row;
-        });
-    });
-}
-setInterval(updateStudentList, 1000);  // Refresh every 2 seconds
 function sendHeartbeat() {
     fetch('/update_activity', { method: 'POST' })
         .then(response => response.json())
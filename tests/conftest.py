@@ -0,0 +1,111 @@
+"""Fixtures for tests run against a throwaway database.
+
+The app is configured from the environment when app.py is imported, so the
+environment is set here first: every model in one SQLite file through
+DATABASE_URL (the local stand-in for the single PostgreSQL database of a
+production deployment), a stub BSSID backend and no background threads.
+Run from the project root with ``python -m pytest tests``.
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pytest
+from sqlalchemy import delete
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from heartbeat import HeartbeatBuffer  # noqa: E402
+
+WORKDIR = tempfile.mkdtemp(prefix='attendance-tests-')
+STUB_BSSID = 'AA:BB:CC:DD:EE:FF'
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(WORKDIR, 'attendance.db')
+os.environ['FACE_BLOB_DIR'] = os.path.join(WORKDIR, 'face_data')
+os.environ['BSSID_BACKEND'] = 'stub'
+os.environ['START_BACKGROUND_SERVICES'] = '0'
+os.environ['SESSION_BACKEND'] = 'cookie'
+os.environ.pop('METRICS_DIR', None)
+
+
+@pytest.fixture(scope='session')
+def attendance():
+    """The app module"""
+    import app as attendance
+
+    attendance.app.config['TESTING'] = True
+    attendance.bssid_provider.backend.bssid = STUB_BSSID
+    attendance.bssid_provider.refresh()
+    return attendance
+
+
+@pytest.fixture(autouse=True)
+def empty_database(attendance, monkeypatch):
+    """Start every test from empty tables, no buffered heartbeats and an empty presence registry"""
+    with attendance.app.app_context():
+        for metadata in attendance.db.metadatas.values():
+            for table in reversed(metadata.sorted_tables):
+                attendance.db.session.execute(delete(table))
+        attendance.db.session.commit()
+    monkeypatch.setattr(attendance, 'heartbeats', HeartbeatBuffer(attendance.flush_heartbeats))
+    attendance.presence.rebuild()
+
+
+@pytest.fixture
+def app_context(attendance):
+    with attendance.app.app_context():
+        yield
+
+
+@pytest.fixture
+def client(attendance):
+    return attendance.app.test_client()
+
+
+@pytest.fixture
+def make_admin(attendance, app_context):
+    def make_admin(username='admin', room_codes=()):
+        """An admin and their rooms, added to the database and the presence registry"""
+        admin = attendance.Admin(idname=username.upper(), username=username, password='x')
+        attendance.db.session.add(admin)
+        attendance.db.session.commit()
+        for room_code in room_codes:
+            attendance.db.session.add(attendance.Room(room_code=room_code, admin_id=admin.id, bssid=STUB_BSSID))
+            attendance.presence.add_room(admin.id, room_code)
+        attendance.db.session.commit()
+        return admin
+    return make_admin
+
+
+@pytest.fixture
+def make_student(attendance, app_context):
+    def make_student(student_id, room_code=None, login_time=None, last_active_time=None):
+        """A student, logged into room_code (database and presence registry) if one is given"""
+        student = attendance.Student(student_id=student_id, username=student_id.lower(), password='x')
+        if room_code:
+            student.is_logged_in = True
+            student.current_room = room_code
+            student.login_time = login_time or datetime.now()
+            student.last_active_time = last_active_time or student.login_time
+        attendance.db.session.add(student)
+        attendance.db.session.commit()
+        if room_code:
+            attendance.presence.join(room_code, student.id, student.student_id, student.username,
+                                     student.login_time, student.last_active_time)
+        return student
+    return make_student
+
+
+def log_in_as(client, admin=None, student=None):
+    """Put an admin's or student's ids in the test client's session"""
+    with client.session_transaction() as session:
+        if admin is not None:
+            session['admin_id'] = admin.id
+            session['admin_username'] = admin.username
+        if student is not None:
+            session['student_id'] = student.id
+            session['student_username'] = student.username
+            session['student_number'] = student.student_id
+            session['current_room'] = student.current_room
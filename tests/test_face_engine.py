@@ -0,0 +1,25 @@
+"""Every image handed to the inference engine gets a result or an error"""
+import pytest
+
+from face_engine import FaceInferenceEngine
+
+
+def test_results_are_returned_in_order():
+    engine = FaceInferenceEngine(lambda images: [image * 2 for image in images], max_batch_size=4)
+    assert engine.detect_many(list(range(10)), timeout=5) == [image * 2 for image in range(10)]
+
+
+def test_missing_results_fail_the_whole_batch():
+    engine = FaceInferenceEngine(lambda images: images[:-1], max_batch_size=8, max_wait=0.05)
+
+    with pytest.raises(RuntimeError, match='results for'):
+        engine.detect_many(['a', 'b', 'c'], timeout=5)
+
+
+def test_model_errors_reach_the_callers():
+    def broken(images):
+        raise ValueError("model failed")
+
+    engine = FaceInferenceEngine(broken)
+    with pytest.raises(ValueError, match='model failed'):
+        engine.detect('a', timeout=5)
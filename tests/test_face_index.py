@@ -0,0 +1,73 @@
+"""The face index adds embeddings in place and shares them between processes through its files"""
+import threading
+
+import numpy as np
+
+from face_index import FaceEmbeddingIndex
+
+
+def embeddings(count, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+
+def test_adds_keep_the_loaded_rows_mapped(tmp_path):
+    path = str(tmp_path / 'face_index')
+    writer = FaceEmbeddingIndex(path, dim=8, compact_after=3)
+    writer.add_many(['S0', 'S1', 'S2'], embeddings(3))  # Compacted into the .npy file
+
+    index = FaceEmbeddingIndex(path, dim=8)
+    assert index.load()
+    base = index._base
+    for i in range(100):
+        index.add(f'N{i}', embeddings(1, seed=i + 1))
+
+    assert index._base is base and isinstance(base, np.memmap)
+    assert len(index) == 103 and len(index._added) == 128
+    assert np.allclose(index.get('N99'), index.matrix[102])
+
+
+def test_reenrolling_replaces_the_row(tmp_path):
+    index = FaceEmbeddingIndex(str(tmp_path / 'face_index'), dim=8)
+    first, second = embeddings(2)
+    index.add('S1', first)
+    index.add('S1', second)
+
+    assert len(index) == 1
+    assert abs(index.similarity('S1', second) - 1.0) < 1e-5
+
+
+def test_other_processes_adds_are_picked_up(tmp_path):
+    path = str(tmp_path / 'face_index')
+    first, second = FaceEmbeddingIndex(path, dim=8), FaceEmbeddingIndex(path, dim=8)
+    first.add_many(['S1', 'S2'], embeddings(2))
+
+    assert second.refresh()
+    assert second.student_ids == ['S1', 'S2']
+    assert np.allclose(second.matrix, first.matrix)
+
+
+def test_get_during_adds_sees_every_enrolled_student(tmp_path):
+    index = FaceEmbeddingIndex(str(tmp_path / 'face_index'), dim=8, compact_after=50)
+    errors = []
+    done = threading.Event()
+
+    def enroll():
+        for i in range(300):
+            index.add(f'S{i}', embeddings(1, seed=i))
+        done.set()
+
+    def look_up():
+        while not done.is_set():
+            for student_id in index.student_ids[-5:]:
+                try:
+                    assert index.get(student_id) is not None
+                except Exception as e:
+                    errors.append(e)
+
+    threads = [threading.Thread(target=enroll), threading.Thread(target=look_up)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == [] and len(index) == 300
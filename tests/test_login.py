@@ -0,0 +1,99 @@
+"""Logins from a session that is already the same user's skip the bcrypt check"""
+import pytest
+
+from conftest import log_in_as
+
+
+@pytest.fixture
+def password_hash(attendance):
+    return attendance.bcrypt.generate_password_hash('secret', 4).decode('utf-8')
+
+
+@pytest.fixture
+def face_matches(attendance, monkeypatch):
+    monkeypatch.setattr(attendance, 'verify_face', lambda student_id, image_data: (True, "Face verified"))
+
+
+def student_login(client, username, password, room_code):
+    return client.post('/login_student', data={
+        'username': username, 'password': password, 'room_code': room_code, 'face_image': 'data:image/jpeg;base64,'
+    })
+
+
+def test_student_login_checks_the_password(attendance, client, make_admin, make_student, password_hash, face_matches):
+    make_admin(room_codes=['R1'])
+    student = make_student('S1')
+    student.password = password_hash
+    attendance.db.session.commit()
+    verified = attendance.passwords.verified
+
+    assert student_login(client, 's1', 'wrong', 'R1').headers['Location'].endswith('/login_student')
+    assert student_login(client, 's1', 'secret', 'R1').headers['Location'].endswith('/student_dashboard')
+    assert attendance.passwords.verified == verified + 2
+
+
+def test_student_already_logged_in_skips_the_password(attendance, client, make_admin, make_student, password_hash,
+                                                      face_matches):
+    make_admin(room_codes=['R1', 'R2'])
+    student = make_student('S1', 'R1')
+    student.password = password_hash
+    attendance.db.session.commit()
+    log_in_as(client, student=student)
+    verified = attendance.passwords.verified
+
+    assert student_login(client, 's1', '', 'R2').headers['Location'].endswith('/student_dashboard')
+    assert attendance.passwords.verified == verified
+    assert attendance.Student.query.filter_by(student_id='S1').one().current_room == 'R2'
+
+
+def test_another_students_session_does_not_skip_the_password(attendance, client, make_admin, make_student,
+                                                             password_hash, face_matches):
+    make_admin(room_codes=['R1'])
+    other = make_student('S2', 'R1')
+    student = make_student('S1')
+    student.password = password_hash
+    attendance.db.session.commit()
+    log_in_as(client, student=other)
+
+    assert student_login(client, 's1', '', 'R1').headers['Location'].endswith('/login_student')
+
+
+def test_student_already_logged_in_still_needs_a_matching_face(attendance, client, make_admin, make_student,
+                                                               monkeypatch):
+    make_admin(room_codes=['R1'])
+    student = make_student('S1', 'R1')
+    log_in_as(client, student=student)
+    monkeypatch.setattr(attendance, 'verify_face', lambda student_id, image_data: (False, "Face does not match"))
+
+    assert student_login(client, 's1', '', 'R1').headers['Location'].endswith('/login_student')
+
+
+def test_admin_already_logged_in_skips_the_password(attendance, client, make_admin, password_hash):
+    admin = make_admin()
+    admin.password = password_hash
+    attendance.db.session.commit()
+    verified = attendance.passwords.verified
+
+    assert client.post('/login_admin', data={'username': 'admin', 'password': 'secret'}).status_code == 302
+    assert client.post('/login_admin', data={'username': 'admin', 'password': ''}).status_code == 302
+    assert attendance.passwords.verified == verified + 1
+
+
+def test_moving_to_another_room_ends_the_first_rooms_session(attendance, client, make_admin, make_student,
+                                                              face_matches):
+    admin = make_admin(room_codes=['R1', 'R2'])
+    student = make_student('S1', 'R1')
+    log_in_as(client, student=student)
+    subscriber = attendance.roster.subscribe(admin.id, ['R1'])
+    try:
+        assert student_login(client, 's1', '', 'R2').headers['Location'].endswith('/student_dashboard')
+        assert subscriber.get_nowait() == ('left', {'student_id': 'S1', 'room': 'R1'})
+    finally:
+        attendance.roster.unsubscribe(subscriber)
+
+    [record] = attendance.AttendanceRecord.query.all()
+    assert (record.student_id, record.room_code) == ('S1', 'R1')
+    assert attendance.AttendanceRollup.query.filter_by(student_id='S1', room_code='R1').one().sessions == 1
+    moved = attendance.Student.query.filter_by(student_id='S1').one()
+    assert (moved.is_logged_in, moved.current_room) == (True, 'R2')
+    assert [(entry['student_id'], entry['room']) for entry in attendance.present_students(admin.id)] == [('S1', 'R2')]
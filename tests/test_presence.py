@@ -0,0 +1,152 @@
+"""The presence registry agrees with the database after every change to who is where"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from conftest import log_in_as
+from presence import PresenceRegistry, diff
+
+
+def assert_matches_database(attendance):
+    """The app's registry holds the same rooms and students as a registry freshly loaded from the database"""
+    expected = PresenceRegistry(attendance.load_presence)
+    expected.rebuild()
+    assert diff(expected.snapshot(), attendance.presence.snapshot()) == []
+
+
+def test_rebuild_loads_rooms_and_logged_in_students(attendance, make_admin, make_student):
+    admin = make_admin(room_codes=['R1', 'R2'])
+    make_student('S1', 'R1')
+    make_student('S2', 'R2')
+    make_student('S3')
+
+    attendance.presence.rebuild()
+
+    rooms, students = attendance.presence.snapshot()
+    assert rooms == {admin.id: {'R1', 'R2'}}
+    assert sorted(students.values()) == [('R1', 'S1'), ('R2', 'S2')]
+    assert_matches_database(attendance)
+
+
+def test_create_room_adds_it_to_the_admin(attendance, client, make_admin):
+    admin = make_admin()
+    log_in_as(client, admin=admin)
+
+    assert client.post('/create_room', data={'room_code': 'R1'}).get_json()['success']
+
+    assert attendance.presence.room_codes(admin.id) == ['R1']
+    assert_matches_database(attendance)
+
+
+def test_login_joins_the_room(attendance, make_admin, make_student):
+    admin = make_admin(room_codes=['R1'])
+    student = make_student('S1')
+
+    attendance.complete_login(student, 'R1', 'x', needs_rehash=False)
+
+    assert [entry['student_id'] for entry in attendance.present_students(admin.id)] == ['S1']
+    assert_matches_database(attendance)
+
+
+def test_logout_leaves_the_room(attendance, client, make_admin, make_student):
+    admin = make_admin(room_codes=['R1'])
+    student = make_student('S1', 'R1')
+    make_student('S2', 'R1')
+    log_in_as(client, student=student)
+
+    assert client.post('/logout_s').get_json()['success']
+
+    assert [entry['student_id'] for entry in attendance.present_students(admin.id)] == ['S2']
+    assert_matches_database(attendance)
+
+
+def test_close_room_removes_the_room_and_everyone_in_it(attendance, client, make_admin, make_student):
+    admin = make_admin(room_codes=['R1', 'R2'])
+    make_student('S1', 'R1')
+    make_student('S2', 'R1')
+    make_student('S3', 'R2')
+    log_in_as(client, admin=admin)
+
+    assert client.post('/close_room/R1').get_json()['success']
+
+    rooms, students = attendance.presence.snapshot()
+    assert rooms == {admin.id: {'R2'}}
+    assert list(students.values()) == [('R2', 'S3')]
+    assert_matches_database(attendance)
+
+
+def test_reaper_removes_idle_students(attendance, make_admin, make_student):
+    admin = make_admin(room_codes=['R1'])
+    idle_since = datetime.now() - timedelta(seconds=attendance.app.config['SESSION_IDLE_TIMEOUT'] + 60)
+    make_student('S1', 'R1', login_time=idle_since, last_active_time=idle_since)
+    make_student('S2', 'R1')
+
+    attendance.reap_idle_sessions()
+
+    assert [entry['student_id'] for entry in attendance.present_students(admin.id)] == ['S2']
+    assert_matches_database(attendance)
+
+
+def test_dashboard_only_lists_the_admins_own_rooms(attendance, client, make_admin, make_student):
+    admin = make_admin('first', room_codes=['R1'])
+    make_admin('second', room_codes=['R2'])
+    make_student('S1', 'R1')
+    make_student('S2', 'R2')
+    log_in_as(client, admin=admin)
+
+    assert [student['student_id'] for student in client.get('/active_students').get_json()] == ['S1']
+
+
+def test_resync_picks_up_changes_made_by_another_worker(attendance, make_admin, make_student):
+    admin = make_admin(room_codes=['R1'])
+    student = make_student('S1')
+    gone = make_student('S2', 'R1')
+
+    # Another worker logs S1 in and S2 out, this worker's registry does not hear of it
+    table = attendance.Student.__table__
+    now = datetime.now()
+    attendance.db.session.execute(
+        update(table).where(table.c.id == student.id)
+        .values(is_logged_in=True, current_room='R1', login_time=now, last_active_time=now)
+    )
+    attendance.db.session.execute(
+        update(table).where(table.c.id == gone.id)
+        .values(is_logged_in=False, current_room=None, login_time=None, last_active_time=None)
+    )
+    attendance.db.session.commit()
+
+    attendance.presence.rebuild()
+
+    assert [entry['student_id'] for entry in attendance.present_students(admin.id)] == ['S1']
+    assert_matches_database(attendance)
+
+
+def test_resync_keeps_newer_local_heartbeats(attendance, make_admin, make_student):
+    make_admin(room_codes=['R1'])
+    logged_in = datetime.now() - timedelta(minutes=5)
+    student = make_student('S1', 'R1', login_time=logged_in, last_active_time=logged_in)
+
+    # Seen by this worker but not flushed to the database yet
+    heartbeat = datetime.now()
+    attendance.presence.touch(student.id, heartbeat)
+    attendance.presence.rebuild()
+
+    [entry] = attendance.presence.students(['R1'])
+    assert entry['last_seen'] == heartbeat
+
+
+def test_changes_made_during_a_rebuild_are_replayed():
+    registry = None
+    login_time = datetime(2025, 1, 6, 9)
+
+    def load():
+        # The database was read before S2 joined and S1 left
+        registry.join('R1', 2, 'S2', 's2', login_time)
+        registry.leave(1)
+        return [('R1', 7)], [{'pk': 1, 'room': 'R1', 'student_id': 'S1', 'username': 's1',
+                              'login_time': login_time, 'last_seen': login_time}]
+
+    registry = PresenceRegistry(load)
+    registry.rebuild()
+
+    assert registry.snapshot() == ({7: {'R1'}}, {2: ('R1', 'S2')})
@@ -0,0 +1,147 @@
+"""Every statement the hot paths send to the database is answered from an index.
+
+The statements are captured as SQLAlchemy compiles and sends them while the
+real routes and functions run, then explained with EXPLAIN QUERY PLAN on
+the same engine, so the check follows the code rather than a copy of its SQL.
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import migrations
+from conftest import log_in_as
+
+
+@pytest.fixture
+def capture(attendance):
+    @contextmanager
+    def capture():
+        """Collects (engine, SQL, parameters) of every statement sent in the block"""
+        sent = []
+
+        def record(connection, cursor, statement, parameters, context, executemany):
+            if statement.split(None, 1)[0].upper() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE'):
+                sent.append((connection.engine, statement, parameters[0] if executemany else parameters))
+
+        with attendance.app.app_context():
+            engines = list(dict.fromkeys(attendance.db.engines.values()))
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', record)
+        try:
+            yield sent
+        finally:
+            for engine in engines:
+                event.remove(engine, 'before_cursor_execute', record)
+    return capture
+
+
+def explain(sent):
+    """(SQL, plan lines) of each captured statement"""
+    plans = []
+    for engine, statement, parameters in sent:
+        with engine.connect() as connection:
+            rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)
+            plans.append((statement, [row[-1] for row in rows]))
+    return plans
+
+
+def assert_indexed(plans):
+    for statement, plan in plans:
+        assert not migrations.full_table_scans(plan), f"Full table scan in:\n{statement}\n{plan}"
+
+
+def find(plans, prefix):
+    """The captured statements starting with prefix, at least one must have been sent"""
+    found = [(statement, plan) for statement, plan in plans if ' '.join(statement.split()).startswith(prefix)]
+    assert found, f"No statement starting with {prefix!r} was sent"
+    return found
+
+
+def test_hand_written_hot_queries_use_an_index(attendance, app_context):
+    assert migrations.unindexed_queries(attendance.db) == []
+
+
+def test_close_room_ends_sessions_through_indexes(attendance, client, make_admin, make_student, capture):
+    admin = make_admin(room_codes=['R1', 'R2'])
+    for i in range(3):
+        make_student(f'S{i}', 'R1', login_time=datetime.now() - timedelta(minutes=30))
+    make_student('S9', 'R2')
+    log_in_as(client, admin=admin)
+
+    with capture() as sent:
+        assert client.post('/close_room/R1').get_json()['success']
+    plans = explain(sent)
+
+    assert_indexed(plans)
+    # end_sessions: the claim finds the room's students through the index, then the attendance records,
+    # the rollup upsert and the reset only touch the claimed rows, by primary key
+    for _, plan in find(plans, 'SELECT student.id, student.student_id, student.current_room FROM student'):
+        assert any('ix_student_logged_in_room' in line for line in plan)
+    for _, plan in (find(plans, 'INSERT INTO attendance_record') + find(plans, 'INSERT INTO attendance_rollup')
+                    + find(plans, 'UPDATE student SET')):
+        assert any('PRIMARY KEY' in line for line in plan)
+
+    with attendance.app.app_context():
+        assert attendance.AttendanceRecord.query.count() == 3
+        assert attendance.Student.query.filter_by(is_logged_in=True).count() == 1
+
+
+def test_heartbeat_flush_updates_by_primary_key(attendance, make_admin, make_student, capture):
+    make_admin(room_codes=['R1'])
+    students = [make_student(f'S{i}', 'R1') for i in range(3)]
+    now = datetime.now()
+
+    with capture() as sent:
+        attendance.flush_heartbeats({student.id: now for student in students})
+    plans = explain(sent)
+
+    assert_indexed(plans)
+    [(_, plan)] = find(plans, 'UPDATE student SET last_active_time')
+    assert any('PRIMARY KEY' in line for line in plan)
+
+
+def test_reaper_finds_idle_students_through_an_index(attendance, make_admin, make_student, capture):
+    make_admin(room_codes=['R1'])
+    idle_since = datetime.now() - timedelta(seconds=attendance.app.config['SESSION_IDLE_TIMEOUT'] + 60)
+    for i in range(3):
+        make_student(f'S{i}', 'R1', login_time=idle_since, last_active_time=idle_since)
+    make_student('S9', 'R1')
+
+    with capture() as sent:
+        assert sum(attendance.reap_idle_sessions()) == 3
+    plans = explain(sent)
+
+    assert_indexed(plans)
+    [(_, plan)] = find(plans, 'SELECT student.id FROM student')
+    assert any('ix_student_logged_in_active' in line for line in plan)
+
+
+def test_student_logout_and_history_download_use_indexes(attendance, client, make_admin, make_student, capture):
+    make_admin(room_codes=['R1'])
+    student = make_student('S1', 'R1', login_time=datetime.now() - timedelta(minutes=5))
+    log_in_as(client, student=student)
+
+    with capture() as sent:
+        client.post('/logout_s')
+        log_in_as(client, student=student)
+        assert client.get('/download_student_attendance').status_code == 200
+    plans = explain(sent)
+
+    assert_indexed(plans)
+    for _, plan in find(plans, 'SELECT attendance_record.student_id'):
+        assert any('ix_attendance_student_login' in line for line in plan)
+
+
+def test_analytics_read_rollups_through_an_index(attendance, client, make_admin, capture):
+    admin = make_admin(room_codes=['R1'])
+    log_in_as(client, admin=admin)
+
+    with capture() as sent:
+        client.get('/analytics/minutes?room=R1&start=2025-01-01&end=2025-01-31')
+        client.get('/analytics/attendance_rate?start=2025-01-01&end=2025-01-31')
+    plans = explain(sent)
+
+    assert_indexed(plans)
+    assert len(find(plans, 'SELECT attendance_rollup.student_id')) == 2
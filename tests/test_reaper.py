@@ -0,0 +1,32 @@
+"""Only one of the workers' session reapers reaps"""
+import pytest
+
+import reaper as reaper_module
+from reaper import SessionReaper
+
+pytestmark = pytest.mark.skipif(reaper_module.fcntl is None, reason="needs flock")
+
+
+def test_only_the_lock_holder_reaps(tmp_path):
+    reaped = []
+    lock_path = str(tmp_path / 'reaper.lock')
+    first = SessionReaper(lambda: reaped.append('first') or [1], lock_path=lock_path)
+    second = SessionReaper(lambda: reaped.append('second') or [1], lock_path=lock_path)
+
+    assert first.run() == [1]
+    assert second.run() == []
+    assert first.run() == [1]
+    assert reaped == ['first', 'first']
+    assert (first.stats()['reaping'], second.stats()['runs']) == (True, 0)
+
+
+def test_another_reaper_takes_over_when_the_holder_stops(tmp_path):
+    lock_path = str(tmp_path / 'reaper.lock')
+    first = SessionReaper(lambda: [1], lock_path=lock_path)
+    second = SessionReaper(lambda: [2], lock_path=lock_path)
+    first.run()
+
+    first.stop()
+
+    assert second.run() == [2]
+    assert first.run() == []
@@ -0,0 +1,34 @@
+"""Roll call over a video clip counts people, not their appearances in each frame"""
+import io
+
+import numpy as np
+
+from conftest import log_in_as
+from face_index import FaceEmbeddingIndex
+
+
+def test_clip_counts_faces_per_frame(attendance, client, make_admin, make_student, monkeypatch, tmp_path):
+    admin = make_admin(room_codes=['R1'])
+    make_student('S1')
+    log_in_as(client, admin=admin)
+
+    enrolled, stranger = np.eye(4, dtype=np.float32)[:2]
+    index = FaceEmbeddingIndex(str(tmp_path / 'face_index'), dim=4)
+    index.add('S1', enrolled)
+    monkeypatch.setattr(attendance, 'face_index', index)
+    monkeypatch.setattr(attendance, 'sync_face_index', lambda: None)
+
+    # Eight frames, each showing the enrolled student and the same stranger
+    frames = [np.zeros((20, 20, 3), dtype=np.uint8)] * 8
+    monkeypatch.setattr(attendance, 'read_roll_call_frames', lambda upload: frames)
+    monkeypatch.setattr(attendance.face_engine, 'detect_many',
+                        lambda images: [np.array([[0, 0, 10, 10], [10, 10, 20, 20]])] * len(images))
+    monkeypatch.setattr(attendance.embedding_engine, 'detect_many',
+                        lambda faces: [enrolled if i % 2 == 0 else stranger for i in range(len(faces))])
+
+    result = client.post('/roll_call/R1', data={'media': (io.BytesIO(b'clip'), 'clip.mp4')}).get_json()
+
+    assert result['success']
+    assert (result['frames'], result['max_faces_in_frame'], result['max_unmatched_in_frame']) == (8, 2, 1)
+    assert [student['student_id'] for student in result['students']] == ['S1']
+    assert attendance.AttendanceRecord.query.count() == 1
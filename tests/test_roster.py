@@ -0,0 +1,70 @@
+"""Roster streams hand their worker thread back and only carry presence changes"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import log_in_as
+from roster import RosterBroadcaster
+
+
+@pytest.fixture
+def short_streams(attendance, monkeypatch):
+    monkeypatch.setitem(attendance.app.config, 'ROSTER_KEEPALIVE', 0.01)
+    monkeypatch.setitem(attendance.app.config, 'ROSTER_STREAM_LIFETIME', 0.05)
+
+
+def test_stream_ends_after_its_lifetime_and_sets_a_retry(attendance, client, make_admin, short_streams):
+    admin = make_admin(room_codes=['R1'])
+    log_in_as(client, admin=admin)
+
+    response = client.get('/roster_stream')
+    assert response.get_data(as_text=True).startswith('retry: ')
+    response.close()
+
+    assert attendance.roster.subscriber_count() == 0
+
+
+def test_worker_turns_away_streams_beyond_its_limit(attendance, client, make_admin, monkeypatch):
+    admin = make_admin(room_codes=['R1'])
+    log_in_as(client, admin=admin)
+    monkeypatch.setattr(attendance, 'roster', RosterBroadcaster(max_subscribers=1))
+    held = attendance.roster.subscribe(admin.id, ['R1'])
+
+    response = client.get('/roster_stream')
+
+    assert response.get_data(as_text=True) == f"retry: {attendance.app.config['ROSTER_RECONNECT_DELAY'] * 1000}\n\n"
+    attendance.roster.unsubscribe(held)
+    assert attendance.roster.subscribe(admin.id, ['R1']) is not None
+
+
+def test_stream_reports_students_going_inactive(attendance, client, make_admin, make_student, short_streams,
+                                               monkeypatch):
+    admin = make_admin(room_codes=['R1'])
+    make_student('S1', 'R1')
+    log_in_as(client, admin=admin)
+
+    response = client.get('/roster_stream', buffered=False)
+    stream = iter(response.response)
+    assert b'event: snapshot' in next(stream)
+
+    # No heartbeat since the snapshot, which is now too long ago
+    monkeypatch.setitem(attendance.app.config, 'STUDENT_INACTIVE_AFTER', 0)
+    body = b''.join(stream).decode()
+    response.close()
+
+    assert 'event: inactive' in body
+
+
+def test_heartbeats_publish_active_only_after_inactivity(attendance, client, make_admin, make_student):
+    make_admin(room_codes=['R1'])
+    quiet_since = datetime.now() - timedelta(seconds=attendance.app.config['STUDENT_INACTIVE_AFTER'] + 60)
+    student = make_student('S1', 'R1', last_active_time=quiet_since)
+    log_in_as(client, student=student)
+    subscriber = attendance.roster.subscribe(1, ['R1'])
+    try:
+        for _ in range(3):
+            client.post('/update_activity')
+        assert subscriber.get_nowait()[0] == 'active'
+        assert subscriber.empty()
+    finally:
+        attendance.roster.unsubscribe(subscriber)
@@ -0,0 +1,57 @@
+"""Server-side session backends keep a session across requests"""
+import pytest
+from flask import Flask, session
+
+from session_store import MemorySessionInterface, SqlSessionInterface, _ServerSideSessionInterface
+
+
+def test_backends_must_implement_load_store_and_delete():
+    class Incomplete(_ServerSideSessionInterface):
+        def _load(self, sid, ttl):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.fixture(params=['memory', 'sql'])
+def session_app(request, attendance):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    if request.param == 'memory':
+        app.session_interface = MemorySessionInterface()
+    else:
+        with attendance.app.app_context():
+            engine = attendance.db.engine
+        app.session_interface = SqlSessionInterface(lambda: engine, attendance.WebSession.__table__)
+
+    @app.route('/set/<value>')
+    def set_value(value):
+        session['value'] = value
+        return ''
+
+    @app.route('/get')
+    def get_value():
+        return session.get('value', '')
+
+    @app.route('/clear')
+    def clear():
+        session.clear()
+        return ''
+
+    return app
+
+
+def test_session_survives_between_requests(session_app):
+    client = session_app.test_client()
+    client.get('/set/S1')
+    assert client.get('/get').get_data(as_text=True) == 'S1'
+
+    client.get('/clear')
+    assert client.get('/get').get_data(as_text=True) == ''
+
+
+def test_session_id_from_another_client_is_not_shared(session_app):
+    first, second = session_app.test_client(), session_app.test_client()
+    first.get('/set/S1')
+    assert second.get('/get').get_data(as_text=True) == ''